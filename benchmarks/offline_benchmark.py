@@ -0,0 +1,298 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep the run offline and its caches separate from the server's
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+_cache_dir = tempfile.mkdtemp(prefix="benchmark-cache-")
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(_cache_dir, "results.sqlite3"))
+os.environ.setdefault("CODE_TEMPLATES_PATH", os.path.join(_cache_dir, "code_templates.json"))
+
+from benchmarks.measure import peak_rss_mb, percentile
+from benchmarks.replay_llm import RECORDINGS_PATH, ReplayLLM
+from crew import crew_orchestrator
+from services.metrics import start_trace
+
+# Results of a run saved with --save-baseline; later runs are compared against it
+BASELINE_PATH = "benchmarks/baseline.json"
+
+# Allowed slowdown (p95) or throughput drop relative to the baseline
+REGRESSION_TOLERANCE = 0.2
+
+# analyze_crew is the /analyze endpoint with the intent router, result cache and
+# code templates switched off, so every request goes through the crew
+SCENARIOS = ["run_analysis", "analyze_endpoint", "analyze_crew"]
+
+# Answers that report a failure instead of an analysis; they come back with usage metrics
+ERROR_MARKERS = ("An error occurred:", "Error in crew execution:", "Error in generated code:")
+
+
+def result_text(result):
+    """Text of an answer: a CrewOutput, a string, or a CrewOutput as /analyze encodes it"""
+    if isinstance(result, dict):
+        return str(result.get("raw", ""))
+    return str(result)
+
+
+def check_answer(result):
+    """Raise for an answer that reports a failure, so the sample counts as an error"""
+    text = result_text(result)
+    if any(marker in text for marker in ERROR_MARKERS):
+        raise RuntimeError(text[:200])
+
+
+def summarise(samples, wall_seconds):
+    """Latency percentiles, throughput and a per-stage breakdown for one load level"""
+    latencies = [sample["ms"] for sample in samples if sample["error"] is None]
+    tokens = [sample["tokens"] for sample in samples if sample["error"] is None]
+    stages = {}
+    for sample in samples:
+        for span in sample["spans"]:
+            stages.setdefault(span["stage"], []).append(span["ms"])
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample["error"] is not None),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "mean_tokens": round(sum(tokens) / len(tokens), 1) if tokens else 0.0,
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "served_by": dict(Counter(sample["served_by"] for sample in samples)),
+        "stages": {
+            stage: {"count": len(values), "mean_ms": round(sum(values) / len(values), 1),
+                    "p95_ms": round(percentile(values, 95), 1)}
+            for stage, values in sorted(stages.items())
+        },
+    }
+
+
+def run_load(call, queries, concurrency, iterations):
+    """Send every query `iterations` times with `concurrency` requests in flight"""
+    def timed(query):
+        start_time = time.perf_counter()
+        try:
+            served_by, spans, tokens = call(query)
+            error = None
+        except Exception as e:
+            served_by, spans, tokens, error = "error", [], 0, f"{type(e).__name__}: {str(e)}"
+        return {"ms": (time.perf_counter() - start_time) * 1000, "served_by": served_by,
+                "spans": spans, "tokens": tokens, "error": error}
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, queries * iterations))
+    return summarise(samples, time.perf_counter() - start_time)
+
+
+def crew_caller(app_module, mode):
+    """Call run_analysis() directly, as run_cached_analysis() does on a cache miss"""
+    def call(query):
+        snapshot = app_module.dataset_store.current()
+        with start_trace() as trace:
+            result, metrics = crew_orchestrator.run_analysis(
+                query, app_module.LOADING_INSTRUCTIONS, snapshot.namespace(),
+                executor=app_module.run_generated_code,
+                dataset_context=app_module.prompt_context.context(snapshot), mode=mode
+            )
+        if not metrics:
+            raise RuntimeError(str(result))
+        check_answer(result)
+        return "crew", trace.to_dict()["spans"], metrics["total_tokens"]
+    return call
+
+
+def endpoint_caller(client):
+    """POST the query to /analyze and read the stage spans from its debug output"""
+    def call(query):
+        response = client.post("/analyze", json={"query": query, "debug": True})
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        body = response.json()
+        check_answer(body["result"])
+        return body["served_by"], body["debug"]["spans"], body["debug"]["usage_metrics"].get("total_tokens", 0)
+    return call
+
+
+class _NoCache:
+    def get(self, query, dataset_version):
+        return None
+
+    def put(self, *args, **kwargs):
+        pass
+
+
+@contextlib.contextmanager
+def crew_only(app_module):
+    """Switch off the intent router, result cache and code templates of main while inside"""
+    replaced = {"run_router": lambda *args, **kwargs: None, "run_template": lambda *args, **kwargs: None,
+                "result_cache": _NoCache()}
+    originals = {name: getattr(app_module, name) for name in replaced}
+    for name, value in replaced.items():
+        setattr(app_module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(app_module, name, value)
+
+
+def load_level(scenario, mode, concurrency):
+    # The two-agent mode keeps the unqualified names so older baselines still compare
+    return f"{scenario}@c{concurrency}" if mode == "agents" else f"{scenario}[{mode}]@c{concurrency}"
+
+
+def run_benchmark(scenarios, concurrency_levels, iterations, llm, quiet=True, modes=("agents",)):
+    # The LLM must be in place before the first crew is built
+    crew_orchestrator.use_llm(llm)
+    import main as app_module
+
+    queries = list(app_module.EXAMPLE_QUERIES)
+    results = {}
+    # CrewAI's verbose output would dominate the timings otherwise
+    silence = contextlib.redirect_stdout(open(os.devnull, "w")) if quiet else contextlib.nullcontext()
+    with silence:
+        if "run_analysis" in scenarios:
+            if not app_module.dataset_store.load():
+                raise RuntimeError("Failed to load datasets")
+            app_module.execution_pool.start()
+            for mode in modes:
+                crew_orchestrator.warm_up_crews(mode)
+                for concurrency in concurrency_levels:
+                    results[load_level("run_analysis", mode, concurrency)] = run_load(
+                        crew_caller(app_module, mode), queries, concurrency, iterations
+                    )
+        endpoint_scenarios = [scenario for scenario in ("analyze_endpoint", "analyze_crew") if scenario in scenarios]
+        if endpoint_scenarios:
+            from fastapi.testclient import TestClient
+            # Entering the client runs the startup hooks; leaving it shuts the pools down
+            with TestClient(app_module.app) as client:
+                for scenario in endpoint_scenarios:
+                    bypass = crew_only(app_module) if scenario == "analyze_crew" else contextlib.nullcontext()
+                    with bypass:
+                        for concurrency in concurrency_levels:
+                            results[f"{scenario}@c{concurrency}"] = run_load(
+                                endpoint_caller(client), queries, concurrency, iterations
+                            )
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """List the load levels whose p95 latency or throughput regressed past the tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']}/s -> {current['throughput_rps']}/s"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def compare_modes(results, modes):
+    """Latency and token savings of each mode against the two-agent path at the same load level
+
+    Savings are signed: negative values mean the mode was slower or used
+    more tokens than the two-agent path.
+    """
+    savings = {}
+    for name, summary in results.items():
+        if "[" in name or not name.startswith("run_analysis@"):
+            continue
+        concurrency = name.split("@", 1)[1]
+        for mode in modes:
+            other = results.get(f"run_analysis[{mode}]@{concurrency}")
+            if mode == "agents" or other is None:
+                continue
+            savings[f"{mode}@{concurrency}"] = {
+                "p50_ms_saved": round(summary["p50_ms"] - other["p50_ms"], 1),
+                "p95_ms_saved": round(summary["p95_ms"] - other["p95_ms"], 1),
+                "tokens_saved": round(summary["mean_tokens"] - other["mean_tokens"], 1),
+                "tokens_saved_pct": round(100 * (1 - other["mean_tokens"] / summary["mean_tokens"]), 1)
+                if summary["mean_tokens"] else 0.0,
+            }
+    return savings
+
+
+def _direction(saved, unit, better, worse):
+    """A signed saving as "12.5 ms faster" / "3.0 ms slower" (positive means saved)"""
+    return f"{abs(saved)} {unit} {better if saved >= 0 else worse}"
+
+
+def describe_savings(name, saved):
+    """One line of compare_modes() output, saying which way each difference goes"""
+    return (f"{name} vs agents: p50 {_direction(saved['p50_ms_saved'], 'ms', 'faster', 'slower')}, "
+            f"p95 {_direction(saved['p95_ms_saved'], 'ms', 'faster', 'slower')}, "
+            f"{_direction(saved['tokens_saved'], 'tokens', 'fewer', 'more')} per query "
+            f"({_direction(saved['tokens_saved_pct'], '%', 'fewer', 'more')})")
+
+
+def print_report(results):
+    print(f"{'load level':<30}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'tokens':>9}{'errors':>8}"
+          f"{'peak MB':>10}")
+    for name, summary in results.items():
+        print(f"{name:<30}{summary['p50_ms']:>10}{summary['p95_ms']:>10}{summary['p99_ms']:>10}"
+              f"{summary['throughput_rps']:>9}{summary['mean_tokens']:>9}{summary['errors']:>8}"
+              f"{str(summary['peak_rss_mb']):>10}")
+        print(f"    served by: {summary['served_by']}")
+        for stage, timing in summary["stages"].items():
+            print(f"    {stage:<30} mean {timing['mean_ms']:>9} ms   p95 {timing['p95_ms']:>9} ms   n={timing['count']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the analysis service with a replayed LLM")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--modes", nargs="+", choices=crew_orchestrator.ANALYSIS_MODES, default=["agents"],
+                        help="Analysis modes of the run_analysis scenario; more than one also reports savings")
+    parser.add_argument("--iterations", type=int, default=2, help="Rounds over the query corpus per load level")
+    parser.add_argument("--recordings", default=RECORDINGS_PATH)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated model time per LLM call")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="Show the crew's output")
+    args = parser.parse_args()
+
+    llm = ReplayLLM(args.recordings, latency_ms=args.llm_latency_ms)
+    results = run_benchmark(args.scenarios, args.concurrency, args.iterations, llm, quiet=not args.verbose,
+                            modes=args.modes)
+    print_report(results)
+    savings = compare_modes(results, args.modes)
+    for name, saved in savings.items():
+        print(describe_savings(name, saved))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n" + "!" * 60 + "\nPERFORMANCE REGRESSION against " + args.baseline)
+            for regression in regressions:
+                print(f"  {regression}")
+            print("!" * 60)
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
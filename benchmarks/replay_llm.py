@@ -0,0 +1,96 @@
+import json
+import time
+from types import SimpleNamespace
+
+try:
+    from crewai import BaseLLM
+except ImportError:  # older crewai releases
+    from crewai.llms.base_llm import BaseLLM
+
+# Completions replayed by ReplayLLM, keyed by query and agent role
+RECORDINGS_PATH = "benchmarks/recorded_completions.json"
+
+# Rough characters per token of English text and code, for the usage ReplayLLM reports
+CHARS_PER_TOKEN = 4
+
+
+def _message_text(message):
+    content = message.get("content", "") if isinstance(message, dict) else str(message)
+    return content if isinstance(content, str) else json.dumps(content)
+
+
+def estimate_tokens(text):
+    return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+
+class ReplayLLM(BaseLLM):
+    """Deterministic stand-in for the crew's LLM that replays recorded completions
+
+    The completion is chosen from the conversation alone: the query found in
+    the prompt, the agent role from the system prompt and the number of
+    assistant turns so far. That keeps it stateless, so one instance can be
+    shared by every pooled crew and concurrent request. "{observation}" in
+    a completion is replaced with the last tool observation, which lets a
+    final answer echo what the code actually printed. latency_ms adds a
+    fixed delay per call to stand in for model time. Each call reports
+    its prompt and completion tokens (estimated from their length) to the
+    agent's token callbacks, as a real model's usage would be, so token
+    counts and savings can be compared between runs.
+    """
+
+    def __init__(self, recordings_path=RECORDINGS_PATH, latency_ms=0.0):
+        super().__init__(model="replay")
+        with open(recordings_path, "r", encoding="utf-8") as f:
+            recordings = json.load(f)
+        self.queries = recordings["queries"]
+        self.default = recordings["default"]
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def _completions_for(self, transcript, role):
+        # Longest query first so one query that contains another still matches exactly
+        for query in sorted(self.queries, key=len, reverse=True):
+            if query in transcript:
+                return self.queries[query].get(role, self.default[role])
+        return self.default[role]
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        transcript = "\n".join(_message_text(message) for message in messages)
+        # CrewAI's system prompt starts with "You are <role>."
+        role = next((role for role in self.default if f"You are {role}." in transcript), "Code Generator")
+        step = sum(1 for message in messages if isinstance(message, dict) and message.get("role") == "assistant")
+        completions = self._completions_for(transcript, role)
+        if "Action Input:" not in transcript:
+            # An agent without tools (direct mode) can only give its final answer
+            completions = [completion for completion in completions if "Final Answer:" in completion] or completions
+        completion = completions[min(step, len(completions) - 1)]
+        if "{observation}" in completion:
+            observation = transcript.rsplit("Observation:", 1)[-1].strip() if "Observation:" in transcript else ""
+            completion = completion.replace("{observation}", observation)
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        self._report_usage(callbacks, estimate_tokens(transcript), estimate_tokens(completion))
+        return completion
+
+    @staticmethod
+    def _report_usage(callbacks, prompt_tokens, completion_tokens):
+        """Pass the call's usage to the token callbacks (CrewAI's TokenCalcHandler) like a litellm response"""
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                total_tokens=prompt_tokens + completion_tokens, prompt_tokens_details=None)
+        now = time.time()
+        for callback in callbacks or []:
+            if hasattr(callback, "log_success_event"):
+                callback.log_success_event({}, {"usage": usage}, now, now)
+
+    def supports_function_calling(self):
+        # Tool calls are replayed as ReAct text
+        return False
+
+    def supports_stop_words(self):
+        return False
+
+    def get_context_window_size(self):
+        return 128000
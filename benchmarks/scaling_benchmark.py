@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import time
+import pandas as pd
+
+from benchmarks.measure import peak_rss_mb
+from data.aggregate_cube import AggregateCube
+from data.columnar_cache import evict
+from data.loan_payment_join import LoanPaymentJoin
+from data.synthetic_data import write_datasets
+from services.currency_format import format_frame
+
+# Generated datasets are kept here and reused by later runs at the same scale
+SYNTHETIC_DIR = ".cache/synthetic"
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+
+
+def dataset_paths(n_loans, seed):
+    """Generate the datasets for this scale unless an earlier run already did"""
+    out_dir = os.path.join(SYNTHETIC_DIR, f"{n_loans}-{seed}")
+    loan_path = os.path.join(out_dir, "customer_summary.csv")
+    payment_path = os.path.join(out_dir, "payment_summary.csv")
+    if not (os.path.exists(loan_path) and os.path.exists(payment_path)):
+        start_time = time.perf_counter()
+        write_datasets(out_dir, n_loans, seed)
+        print(f"Generated {n_loans:,} loans in {time.perf_counter() - start_time:.1f}s")
+    return loan_path, payment_path
+
+
+def scalar_inr(amount):
+    """The per-value formatter format_inr() replaced, kept as the reference it is timed against"""
+    amount = float(amount)
+    if amount != amount:
+        return None
+    integer_part = int(amount)
+    decimal_part = int(round((amount - integer_part) * 100))
+    s = str(integer_part)
+    result = s[-3:]
+    s = s[:-3]
+    while s:
+        result = s[-2:] + "," + result
+        s = s[:-2]
+    return f"₹{result}.{decimal_part:02d}" if decimal_part else f"₹{result}"
+
+
+def best_of(function, repeat):
+    """Fastest of `repeat` runs in seconds, plus the last return value"""
+    timings = []
+    value = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        value = function()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), value
+
+
+# The join and group-by patterns the generated analysis code uses
+QUERY_PATTERNS = {
+    "groupby_type_branch": lambda loan_df, payment_df: loan_df.groupby(
+        ["CustomerType", "BranchName"], observed=True
+    )["LoanAmount"].agg(["count", "sum", "mean"]),
+    "mean_by_scheme": lambda loan_df, payment_df: loan_df.groupby("SchemeName", observed=True)["LoanAmount"].mean(),
+    "crosstab_status_branch": lambda loan_df, payment_df: pd.crosstab(loan_df["BranchName"], loan_df["LoanStatus"]),
+    "payments_per_loan": lambda loan_df, payment_df: payment_df.groupby("LoanId", observed=True).size(),
+    "merge_then_groupby": lambda loan_df, payment_df: loan_df.merge(payment_df, on="LoanId").groupby(
+        "BranchName", observed=True
+    )["TransactionAmount"].sum(),
+    "join_layer_build": lambda loan_df, payment_df: LoanPaymentJoin.from_frames(loan_df, payment_df),
+    "cube_build": lambda loan_df, payment_df: AggregateCube.from_frame(loan_df),
+    "format_amounts": lambda loan_df, payment_df: format_frame(loan_df[["LoanAmount", "OutstandingAmount"]]),
+    "format_amounts_scalar": lambda loan_df, payment_df: loan_df[["LoanAmount", "OutstandingAmount"]].apply(
+        lambda column: column.map(scalar_inr)
+    ),
+}
+
+
+def benchmark_scale(n_loans, seed, repeat, load_datasets, get_dataset_info):
+    loan_path, payment_path = dataset_paths(n_loans, seed)
+    timings = {}
+
+    # Cold: parse the CSVs (and write the columnar cache); warm: read the cache
+    evict(loan_path)
+    evict(payment_path)
+    start_time = time.perf_counter()
+    load_datasets(loan_path, payment_path)
+    timings["load_datasets_csv"] = time.perf_counter() - start_time
+    timings["load_datasets_cached"], (loan_df, payment_df) = best_of(
+        lambda: load_datasets(loan_path, payment_path), repeat
+    )
+    if loan_df is None:
+        raise RuntimeError(f"Failed to load the datasets for {n_loans:,} loans")
+
+    timings["get_dataset_info"], _ = best_of(
+        lambda: (get_dataset_info(loan_df), get_dataset_info(payment_df)), repeat
+    )
+    for name, pattern in QUERY_PATTERNS.items():
+        timings[name], _ = best_of(lambda: pattern(loan_df, payment_df), repeat)
+    cube = AggregateCube.from_frame(loan_df)
+    timings["cube_rollup_branch"], _ = best_of(lambda: cube.rollup(["BranchName"]), repeat)
+
+    return {
+        "loans": len(loan_df),
+        "payments": len(payment_df),
+        "frames_mb": round(
+            (loan_df.memory_usage(deep=True).sum() + payment_df.memory_usage(deep=True).sum()) / 1024 ** 2, 1
+        ),
+        "peak_rss_mb": peak_rss_mb(),
+        "seconds": {name: round(seconds, 4) for name, seconds in timings.items()},
+        "format_speedup": round(timings["format_amounts_scalar"] / timings["format_amounts"], 1),
+    }
+
+
+def print_report(results):
+    scales = list(results)
+    operations = list(results[scales[0]]["seconds"])
+    print(f"{'seconds':<26}" + "".join(f"{scale + ' loans':>18}" for scale in scales))
+    for operation in operations:
+        print(f"{operation:<26}" + "".join(f"{results[scale]['seconds'][operation]:>18}" for scale in scales))
+    for label, key in (("payments", "payments"), ("frames MB", "frames_mb"), ("peak RSS MB", "peak_rss_mb"),
+                       ("format speedup (x)", "format_speedup")):
+        print(f"{label:<26}" + "".join(f"{str(results[scale][key]):>18}" for scale in scales))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time loading, profiling and query patterns on generated datasets")
+    parser.add_argument("--scales", nargs="+", type=int, default=DEFAULT_SCALES, help="Numbers of loans")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest is reported")
+    parser.add_argument("--output", help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    from main import get_dataset_info, load_datasets
+    results = {}
+    for n_loans in sorted(args.scales):
+        results[f"{n_loans:,}"] = benchmark_scale(n_loans, args.seed, args.repeat, load_datasets, get_dataset_info)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
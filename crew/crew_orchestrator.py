@@ -1,12 +1,59 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from crewai import Crew, Agent, Task
 from textwrap import dedent
 from crewai_tools import CodeInterpreterTool
+from tools.dataset_code_interpreter import DatasetCodeInterpreterTool, describe_outcome
+from crew.crew_pool import USAGE_FIELDS, CrewPool, PooledCrew
+from services.execution_pool import ExecutionResult, execute_code
+from services.generated_code import extract_code, run_with_repair
+from services.event_stream import StreamGate, current_stream, emit, emit_step, emit_task, streaming
+from services.metrics import record_stage, record_tokens, span
+
+# "agents": the Code Executor agent runs the generated code through the tool;
+# "direct": the code is pulled from the generation output and run locally
+ANALYSIS_MODES = ["agents", "direct"]
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "agents")
+
+# Extra generation rounds in direct mode when the generated code still raises after local repair
+MAX_REPAIR_ATTEMPTS = int(os.getenv("MAX_REPAIR_ATTEMPTS", "1"))
+
+# Programs generated in parallel in direct mode; the first one that runs wins
+CANDIDATE_PROGRAMS = int(os.getenv("CANDIDATE_PROGRAMS", "1"))
+
+# Error of a candidate stopped because another one already won
+CANDIDATE_CANCELLED = "Cancelled: another candidate finished first"
 
 # Initialize the tool
-code_interpreter = CodeInterpreterTool(code_execution_mode="unsafe")  
+code_interpreter = CodeInterpreterTool(unsafe_mode=True)
+
+# LLM for the pooled crews; None uses CrewAI's default model from the environment
+crew_llm = None
 
-def create_analysis_crew():
-    """Create and configure the analysis crew with all necessary agents and tasks"""
+def use_llm(llm):
+    """Build pooled crews with the given LLM (e.g. a local stand-in); call before warm-up"""
+    global crew_llm
+    crew_llm = llm
+
+def create_analysis_crew(namespace=None, on_code_success=None, executor=None, interpreter=None, llm=None,
+                         mode="agents"):
+    """Create and configure the analysis crew with all necessary agents and tasks
+
+    In direct mode the crew is the Code Generator alone, without tools, so
+    generation is a single model call.
+    """
+    # Only pass llm when set so agents otherwise keep CrewAI's default
+    llm_options = {"llm": llm} if llm is not None else {}
+    # Run generated code against the preloaded DataFrames when a namespace is given
+    if interpreter is None and namespace is not None:
+        interpreter = DatasetCodeInterpreterTool(
+            unsafe_mode=True, namespace=namespace, on_success=on_code_success, executor=executor
+        )
+    elif interpreter is None:
+        interpreter = code_interpreter
     # Data Retriever Agent (commented for future use)
     # data_retriever = Agent(
     #     role='Data Retriever',
@@ -34,9 +81,12 @@ def create_analysis_crew():
         """),
         verbose=True,
         allow_delegation=False,
-        tools=[code_interpreter]
+        # Streams each thought, tool call and answer to /analyze/stream clients
+        step_callback=emit_step,
+        tools=[interpreter] if mode != "direct" else [],
+        **llm_options
     )
-  
+
     # Code Executor Agent
     code_executor = Agent(
         role='Code Executor',
@@ -49,7 +99,10 @@ def create_analysis_crew():
         """),
         verbose=True,
         allow_delegation=False,
-        tools=[code_interpreter]
+        # Streams each thought, tool call and answer to /analyze/stream clients
+        step_callback=emit_step,
+        tools=[interpreter],
+        **llm_options
     )
     # Response Formatter Agent (commented out for now)
     # response_formatter = Agent(
@@ -90,32 +143,40 @@ def create_analysis_crew():
     # Code Generation Task
     code_generation_task = Task(
         description="""
-        Based on the provided user_query and loading_instructions:
+        Based on the provided user_query, loading_instructions and dataset_context:
         User Query: {user_query}
         Loading Instructions: {loading_instructions}
-        
+        Dataset Context (every column with its dtype, range or values):
+        {dataset_context}
+
         You are only allowed to use the following Python libraries for code generation and execution:
         - pandas
         - numpy
         - matplotlib
         - seaborn
         - scikit-learn
-        
+
         Do NOT use any other libraries. If a required library is not in this list, do not use it.
-        
-        IMPORTANT: After loading the DataFrames, you MUST always programmatically inspect their columns and schema (e.g., using df.columns, df.info(), df.head()) before referencing any columns. Never assume or guess column names. Always dynamically adapt your code to the actual DataFrame structure.
-        
+
+        The loan data is already loaded as the pandas DataFrame `loan_df` and the payment data as `payment_df`.
+        They exist in the execution namespace before your code runs. Do NOT read any CSV files; use these DataFrames directly.
+
+        IMPORTANT: The Dataset Context lists the actual columns, dtypes and values of the DataFrames. Use exactly those column names and do NOT spend a step calling df.info(), df.head() or df.columns to rediscover them. Never guess a column that is not listed.
+
         When you output code, ensure it is a valid, plain Python string (not JSON, not double-escaped, and with single backslashes for newlines). The code should be directly executable and not wrapped or escaped multiple times. Do not use quadruple or double backslashes for newlines.
-        
-        1. Perform exploratory data analysis (EDA) to understand the data and the user's query intent.
+
+        1. Work out the user's query intent and the columns it needs from the Dataset Context.
         2. Generate efficient Python code that performs a deep analysis addressing the user's query.
         3. Your code should:
-           - Load the data using the provided loading_instructions
-           - Dynamically inspect the DataFrame(s) to determine available columns and types
+           - Use the preloaded loan_df and payment_df DataFrames described in the loading_instructions
+           - Reference only the columns and values listed in the Dataset Context
            - Filter and preprocess the data as needed to address the query
            - Apply appropriate statistical methods, aggregations, and calculations
            - Create relevant visualizations if helpful (using matplotlib or seaborn)
            - Format all monetary values with the Indian Rupee symbol (₹)
+           - Leave the final answer table (a DataFrame or Series) in a variable named `result`, with amounts
+             kept as numbers (format them only when printing); it is the table returned to the client, and
+             other frames your code creates are discarded
         4. Make sure the code:
            - Is clean, well-structured, and commented
            - Handles potential errors gracefully
@@ -126,7 +187,7 @@ def create_analysis_crew():
         """,
         agent=code_generator,
         expected_output="A dictionary with keys 'code' (the generated Python code as a string) and 'filtered_df' (the relevant filtered dataframe(s)).",
-        input_variables=["user_query", "loading_instructions"]
+        input_variables=["user_query", "loading_instructions", "dataset_context"]
     )
     # Code Execution Task
     execution_task = Task(
@@ -171,6 +232,8 @@ def create_analysis_crew():
     # code_generation_task.context = [retrieval_task]  # For future use
     execution_task.context = [code_generation_task]
     # formatting_task.context = [execution_task]  # For future use
+    if mode == "direct":
+        return Crew(agents=[code_generator], tasks=[code_generation_task], verbose=True)
     # Create and return the crew with the correct task order
     return Crew(
         agents=[code_generator, code_executor],
@@ -178,22 +241,233 @@ def create_analysis_crew():
         verbose=True
     )
 
-def run_analysis(user_query, loading_instructions):
-    """Run the analysis using the crew and return both result and usage metrics"""
-    crew = create_analysis_crew()
-    try:
-        # Pass user_query and loading_instructions as input to kickoff
-        result = crew.kickoff(inputs={
-            "user_query": user_query,
-            "loading_instructions": loading_instructions
-        })
-        usage_metrics = crew.usage_metrics
-        metrics = {
-            "total_tokens": int(getattr(usage_metrics, 'total_tokens', 0)),
-            "prompt_tokens": int(getattr(usage_metrics, 'prompt_tokens', 0)),
-            "completion_tokens": int(getattr(usage_metrics, 'completion_tokens', 0)),
-            "successful_requests": int(getattr(usage_metrics, 'successful_requests', 0))
-        }
-        return result, metrics
-    except Exception as e:
-        return f"Error in crew execution: {str(e)}", {}
+def create_pooled_crew(mode="agents"):
+    """Build a reusable crew whose interpreter tool is re-bound for each request"""
+    interpreter = DatasetCodeInterpreterTool(unsafe_mode=True)
+    return PooledCrew(create_analysis_crew(interpreter=interpreter, llm=crew_llm, mode=mode), interpreter)
+
+# Stage names for the crew's tasks, in execution order
+TASK_STAGES = ["task:code_generation", "task:code_execution"]
+
+# Token stage under which the prompt tokens saved by the dataset description are reported
+CONTEXT_SAVINGS_STAGE = "dataset_context_saved"
+
+# Warm crews reused across requests; per-request values go through kickoff(inputs=...)
+crew_pool = CrewPool(create_pooled_crew)
+direct_crew_pool = CrewPool(lambda: create_pooled_crew("direct"))
+crew_pools = {"agents": crew_pool, "direct": direct_crew_pool}
+
+def warm_up_crews(mode=None):
+    """Pre-build the pooled crews of a mode (ANALYSIS_MODE by default) so the first requests do not pay for it"""
+    crew_pools[mode or ANALYSIS_MODE].warm_up()
+
+# Stands in for the dataset description when the caller has none
+NO_DATASET_CONTEXT = "Not available; check loan_df.dtypes once before referencing columns."
+
+def _track_tasks(pooled):
+    """Task callback recording each task's time and token usage as a stage, plus its state"""
+    # Time and token usage of each task, measured between task completions
+    task_state = {"started": None, "usage": None, "completed": 0}
+
+    def on_task_done(task_output):
+        now = time.perf_counter()
+        usage = pooled.usage_totals()
+        stage = TASK_STAGES[min(task_state["completed"], len(TASK_STAGES) - 1)]
+        record_stage(stage, now - task_state["started"])
+        record_tokens(stage, {field: usage[field] - task_state["usage"][field] for field in USAGE_FIELDS})
+        emit_task(task_output, stage)
+        task_state.update(started=now, usage=usage, completed=task_state["completed"] + 1)
+
+    def start():
+        task_state.update(started=time.perf_counter(), usage=pooled.usage_totals(), completed=0)
+
+    return on_task_done, start
+
+def run_analysis(user_query, loading_instructions, namespace=None, on_code_success=None, executor=None,
+                 dataset_context=None, mode=None, candidates=None, on_execution=None):
+    """Run the analysis using the crew and return both result and usage metrics
+
+    dataset_context is a DatasetContext describing the frames; the prompt
+    tokens it saves are recorded as the CONTEXT_SAVINGS_STAGE token stage,
+    in the same fields as the crew's usage metrics, and returned in the
+    metrics as context_tokens and context_tokens_saved. mode is one of
+    ANALYSIS_MODES (ANALYSIS_MODE by default); in direct mode candidates
+    programs (CANDIDATE_PROGRAMS by default) are generated in parallel.
+    on_execution is called with each successful ExecutionResult that is part
+    of the answer; executor itself should have no effect on the request.
+    """
+    mode = mode or ANALYSIS_MODE
+    if mode not in crew_pools:
+        raise ValueError(f"Unknown analysis mode {mode!r}; expected one of {ANALYSIS_MODES}")
+    if mode == "direct":
+        return _run_direct(user_query, loading_instructions, namespace, on_code_success, executor, dataset_context,
+                           candidates or CANDIDATE_PROGRAMS, on_execution)
+    if executor is not None and on_execution is not None:
+        run_code = executor
+
+        def executor(code):
+            execution = run_code(code)
+            if execution.ok:
+                on_execution(execution)
+            return execution
+    setup_start = time.perf_counter()
+    with crew_pool.checkout() as pooled:
+        on_task_done, start_tasks = _track_tasks(pooled)
+        pooled.bind(namespace, on_code_success, executor, on_task_done)
+        crew_setup_seconds = time.perf_counter() - setup_start
+        crew_setup_ms = round(crew_setup_seconds * 1000, 2)
+        record_stage("crew_construction", crew_setup_seconds)
+        start_tasks()
+        try:
+            # Pass user_query and loading_instructions as input to kickoff
+            result = pooled.crew.kickoff(inputs=_kickoff_inputs(user_query, loading_instructions, dataset_context))
+            metrics = pooled.usage_since_last_run()
+            metrics["crew_setup_ms"] = crew_setup_ms
+            metrics["mode"] = mode
+            _record_context_savings(dataset_context, metrics)
+            return result, metrics
+        except Exception as e:
+            # Do not hand a crew with half-finished task state to the next request
+            pooled.broken = True
+            return f"Error in crew execution: {str(e)}", {}
+
+def _record_context_savings(dataset_context, metrics):
+    """Tokens the dataset description cost and saved this query, as a token stage and in metrics"""
+    if dataset_context is not None:
+        record_tokens(CONTEXT_SAVINGS_STAGE, dataset_context.usage_metrics())
+        metrics.update(context_tokens=dataset_context.tokens, context_tokens_saved=dataset_context.tokens_saved)
+
+def _kickoff_inputs(user_query, loading_instructions, dataset_context):
+    return {
+        "user_query": user_query,
+        "loading_instructions": loading_instructions,
+        "dataset_context": dataset_context.text if dataset_context is not None else NO_DATASET_CONTEXT
+    }
+
+def repair_query(user_query, code, error):
+    """The query for a repair round: the original request plus the failing code and its error"""
+    return "\n".join([
+        user_query,
+        "",
+        "The code generated for this query failed with:",
+        error,
+        "Failing code:",
+        "```python",
+        code,
+        "```",
+        "Return corrected code that avoids this error.",
+    ])
+
+def candidate_query(user_query, index):
+    """The query for the index-th parallel candidate; each after the first is nudged to differ"""
+    if index == 0:
+        return user_query
+    return f"{user_query}\n\n(Independent attempt {index + 1}: write your own solution, not a copy of a typical one.)"
+
+def _generate_and_run(user_query, loading_instructions, namespace, executor, dataset_context, cancelled=None):
+    """One candidate: generate code with one model call, run it with local repair, ask the model again on errors
+
+    Returns (outcome or None, code, error, metrics). Once cancelled (a
+    threading.Event) is set, no further model call or execution is started.
+    """
+    setup_start = time.perf_counter()
+    with direct_crew_pool.checkout() as pooled:
+        on_task_done, start_tasks = _track_tasks(pooled)
+        pooled.bind(namespace, None, executor, on_task_done)
+        crew_setup_seconds = time.perf_counter() - setup_start
+        record_stage("crew_construction", crew_setup_seconds)
+        metrics = {field: 0 for field in USAGE_FIELDS}
+        query, code, outcome, attempt, local_fixes = user_query, None, None, 0, []
+        try:
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    outcome, error = None, CANDIDATE_CANCELLED
+                    break
+                start_tasks()
+                output = pooled.crew.kickoff(inputs=_kickoff_inputs(query, loading_instructions, dataset_context))
+                # Summed per kickoff: some crewai versions reset usage on each one
+                for field, value in pooled.usage_since_last_run().items():
+                    metrics[field] += value
+                code = extract_code(output)
+                if code is None:
+                    error = "No Python code found in the generated answer"
+                else:
+                    outcome, code, fixes = run_with_repair(code, executor, namespace)
+                    local_fixes += fixes
+                    error = outcome.error
+                if error is None or attempt >= MAX_REPAIR_ATTEMPTS:
+                    break
+                attempt += 1
+                emit("repair_requested", attempt=attempt, error=error)
+                query = repair_query(user_query, code or str(output), error)
+        except Exception as e:
+            pooled.broken = True
+            return None, code, f"Error in crew execution: {str(e)}", metrics
+    metrics.update(crew_setup_ms=round(crew_setup_seconds * 1000, 2), repair_attempts=attempt,
+                   local_fixes=local_fixes)
+    return outcome, code, error, metrics
+
+def _run_direct(user_query, loading_instructions, namespace, on_code_success, executor, dataset_context,
+                candidates=1, on_execution=None):
+    """Direct mode: generate candidates programs in parallel and keep the first one that runs
+
+    Each candidate keeps its outcome to itself; only the winner's is passed
+    to on_execution. Losers are cancelled: they start no further model call
+    or execution and their events stop reaching the request's stream.
+    """
+    if executor is None:
+        # No execution pool: run in-process on a copy of the namespace
+        def executor(code):
+            with span("code_execution"):
+                return execute_code(code, dict(namespace or {}))
+
+    cancelled = threading.Event()
+
+    def candidate_executor(code):
+        if cancelled.is_set():
+            return ExecutionResult(error=CANDIDATE_CANCELLED)
+        return executor(code)
+
+    def attempt(index, gate=None):
+        with streaming(gate if gate is not None else current_stream()):
+            return _generate_and_run(
+                candidate_query(user_query, index), loading_instructions, namespace, candidate_executor,
+                dataset_context, cancelled
+            )
+
+    if candidates <= 1:
+        finished = [attempt(0)]
+    else:
+        gates = [StreamGate(current_stream()) for _ in range(candidates)]
+        # Each candidate runs in a copy of this context so its stages land in the request's trace
+        pool = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="candidate")
+        pending = {pool.submit(contextvars.copy_context().run, attempt, index, gates[index])
+                   for index in range(candidates)}
+        finished = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            finished += [future.result() for future in done]
+            if any(error is None for _, _, error, _ in finished):
+                break
+        # Losers stop at their next step and return their crews to the pool in the background
+        cancelled.set()
+        for gate in gates:
+            gate.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    winner = next((candidate for candidate in finished if candidate[2] is None), finished[-1])
+    outcome, code, error, metrics = winner
+    if error is not None:
+        if error.startswith("Error in crew execution"):
+            return error, {}
+        return f"Error in generated code: {error}", {}
+    if on_execution is not None:
+        on_execution(outcome)
+    if on_code_success is not None:
+        on_code_success(code)
+    # Tokens of every candidate that finished, not only the winner's
+    for field in USAGE_FIELDS:
+        metrics[field] = sum(candidate[3].get(field, 0) for candidate in finished)
+    metrics.update(mode="direct", candidates=candidates, execution_ms=outcome.duration_ms)
+    _record_context_savings(dataset_context, metrics)
+    return describe_outcome(outcome), metrics
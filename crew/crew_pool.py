@@ -0,0 +1,146 @@
+import contextlib
+import os
+import queue
+import threading
+import time
+
+# Number of pre-built crews; match the number of concurrent analysis workers
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", os.getenv("ANALYSIS_MAX_WORKERS", "4")))
+
+USAGE_FIELDS = ["total_tokens", "prompt_tokens", "completion_tokens", "successful_requests"]
+
+
+class PooledCrew:
+    """A pre-built crew plus the interpreter tool its agents share"""
+
+    def __init__(self, crew, interpreter):
+        self.crew = crew
+        self.interpreter = interpreter
+        self.broken = False
+        # Agents keep counting tokens across kickoffs, so remember the last totals
+        self._last_usage = {field: 0 for field in USAGE_FIELDS}
+
+    def bind(self, namespace=None, on_success=None, executor=None, task_callback=None):
+        """Point the interpreter tool and task callbacks at the current request"""
+        self.interpreter.namespace = namespace or {}
+        self.interpreter.on_success = on_success
+        self.interpreter.executor = executor
+        # Crew.task_callback is only copied onto tasks when the crew is built
+        for task in self.crew.tasks:
+            task.callback = task_callback
+
+    def usage_totals(self):
+        """Cumulative token usage of the crew's agents"""
+        if hasattr(self.crew, "calculate_usage_metrics"):
+            usage_metrics = self.crew.calculate_usage_metrics()
+        else:
+            usage_metrics = self.crew.usage_metrics
+        return {field: int(getattr(usage_metrics, field, 0) or 0) for field in USAGE_FIELDS}
+
+    def usage_since_last_run(self):
+        """Token usage of the latest kickoff only"""
+        current = self.usage_totals()
+        if any(current[field] < self._last_usage[field] for field in USAGE_FIELDS):
+            # This crewai version resets usage per kickoff
+            delta = dict(current)
+        else:
+            delta = {field: current[field] - self._last_usage[field] for field in USAGE_FIELDS}
+        self._last_usage = current
+        return delta
+
+
+class CrewPool:
+    """Pool of pre-built analysis crews reused across requests
+
+    Building the agents, tasks and crew happens at warm-up instead of on
+    every request. Each crew is checked out by one request at a time, so
+    concurrent requests never share a crew's task state; when all crews
+    are busy a new one is built until the pool reaches its size, after
+    which requests wait for a crew to be returned.
+    """
+
+    def __init__(self, factory, size=CREW_POOL_SIZE):
+        # factory returns a new PooledCrew
+        self._factory = factory
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.builds = 0
+        self.build_ms_total = 0.0
+        self.checkouts = 0
+        self.wait_ms_total = 0.0
+
+    def _build(self):
+        start_time = time.perf_counter()
+        pooled = self._factory()
+        with self._lock:
+            self.builds += 1
+            self.build_ms_total += (time.perf_counter() - start_time) * 1000
+        return pooled
+
+    def warm_up(self):
+        """Build crews until the pool is full"""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._build())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_build = self._created < self.size
+            if can_build:
+                self._created += 1
+        if not can_build:
+            return self._idle.get()
+        try:
+            return self._build()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """Borrow a crew for one request; crews marked broken are replaced"""
+        start_time = time.perf_counter()
+        pooled = self._acquire()
+        with self._lock:
+            self.checkouts += 1
+            self.wait_ms_total += (time.perf_counter() - start_time) * 1000
+        try:
+            yield pooled
+        finally:
+            pooled.bind()
+            if pooled.broken:
+                # Replace it so requests waiting on the pool are not starved
+                try:
+                    self._idle.put(self._build())
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+            else:
+                self._idle.put(pooled)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "avg_checkout_wait_ms": round(self.wait_ms_total / self.checkouts, 2) if self.checkouts else 0.0,
+                "builds": self.builds,
+                "avg_build_ms": round(self.build_ms_total / self.builds, 2) if self.builds else 0.0,
+            }
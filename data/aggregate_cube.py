@@ -0,0 +1,89 @@
+import pandas as pd
+
+# Loan dimensions the generated code and fast paths group by
+CUBE_DIMENSIONS = ["BranchName", "SchemeName", "CustomerType", "BorrowerType", "LoanStatus", "NPA"]
+
+# Loan measures kept as additive sums and counts
+CUBE_MEASURES = ["LoanAmount", "OutstandingAmount"]
+
+
+def _aggregate(df, dimensions, measures):
+    """Additive cells (row count, per-measure sum and non-null count) for each dimension combination"""
+    grouped = df.groupby(dimensions, observed=True, dropna=False, sort=False)
+    cells = grouped.size().to_frame("count")
+    for measure in measures:
+        cells[f"sum_{measure}"] = grouped[measure].sum()
+        cells[f"count_{measure}"] = grouped[measure].count()
+    return cells.reset_index()
+
+
+class AggregateCube:
+    """Precomputed loan aggregates that roll up to any subset of the dimensions
+
+    Only additive values (counts and sums) are stored, so any rollup is a
+    group-by over the cube cells rather than over the loan rows, and new
+    rows are folded in by aggregating just those rows and merging cells.
+    Cubes are immutable; append() returns a new cube.
+    """
+
+    def __init__(self, cells, dimensions, measures):
+        self.cells = cells
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+
+    @classmethod
+    def from_frame(cls, df, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES):
+        dimensions = [column for column in dimensions if column in df.columns]
+        measures = [column for column in measures if column in df.columns]
+        return cls(_aggregate(df, dimensions, measures), dimensions, measures)
+
+    @property
+    def value_columns(self):
+        columns = ["count"]
+        for measure in self.measures:
+            columns += [f"sum_{measure}", f"count_{measure}"]
+        return columns
+
+    def append(self, rows):
+        """Return a new cube including the given new loan rows"""
+        if rows is None or len(rows) == 0:
+            return self
+        new_cells = _aggregate(rows, self.dimensions, self.measures)
+        merged = pd.concat([self.cells, new_cells], ignore_index=True)
+        cells = merged.groupby(self.dimensions, observed=True, dropna=False, sort=False)[self.value_columns].sum()
+        return AggregateCube(cells.reset_index(), self.dimensions, self.measures)
+
+    def covers(self, dimensions=(), measures=(), filters=None):
+        """True if a rollup over these columns can be answered from the cube"""
+        return (set(dimensions) | set(filters or {})) <= set(self.dimensions) and set(measures) <= set(self.measures)
+
+    def rollup(self, dimensions=(), filters=None):
+        """Aggregate the cube to the given dimensions
+
+        filters maps dimension names to a value or a list of values. Returns
+        a DataFrame with the dimensions plus count, sum_<measure> and
+        mean_<measure> for every measure.
+        """
+        dimensions = list(dimensions)
+        unknown = set(dimensions) | set(filters or {})
+        unknown -= set(self.dimensions)
+        if unknown:
+            raise KeyError(f"Not cube dimensions: {sorted(unknown)}")
+
+        cells = self.cells
+        for column, value in (filters or {}).items():
+            if isinstance(value, (list, tuple, set)):
+                cells = cells[cells[column].isin(list(value))]
+            else:
+                # Nullable columns (e.g. NPA) compare as <NA> for missing cells
+                cells = cells[(cells[column] == value).fillna(False).astype(bool)]
+
+        if dimensions:
+            result = cells.groupby(dimensions, observed=True, dropna=False)[self.value_columns].sum().reset_index()
+        else:
+            result = cells[self.value_columns].sum().to_frame().T
+
+        for measure in self.measures:
+            counts = result.pop(f"count_{measure}")
+            result[f"mean_{measure}"] = result[f"sum_{measure}"] / counts.where(counts > 0)
+        return result
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import pandas as pd
+
+# Directory holding the Feather copies of the CSV sources
+CACHE_DIR = ".cache/datasets"
+
+# Bump when the on-disk layout changes so stale caches are rebuilt
+CACHE_FORMAT_VERSION = 1
+
+
+def _source_signature(csv_path, read_options):
+    """Describe the CSV file and read options the cached copy was built from"""
+    stat = os.stat(csv_path)
+    options = hashlib.sha1(repr(sorted(read_options.items())).encode("utf-8")).hexdigest()
+    return {
+        "format_version": CACHE_FORMAT_VERSION,
+        "source": str(Path(csv_path).resolve()),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "read_options": options,
+    }
+
+
+def _cache_paths(csv_path, cache_dir):
+    # Same-named CSVs in different directories (e.g. generated datasets) get separate entries
+    source = hashlib.sha1(str(Path(csv_path).resolve()).encode("utf-8")).hexdigest()[:10]
+    stem = f"{Path(csv_path).stem}-{source}"
+    return Path(cache_dir) / f"{stem}.feather", Path(cache_dir) / f"{stem}.meta.json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(df, data_path, meta_path, signature):
+    """Write the Feather file and its metadata atomically"""
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_data = data_path.with_suffix(".feather.tmp")
+    tmp_meta = meta_path.with_suffix(".json.tmp")
+    df.reset_index(drop=True).to_feather(tmp_data)
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(signature, f)
+    # Data first, metadata last: a crash in between leaves a stale signature
+    # that simply triggers another rebuild
+    os.replace(tmp_data, data_path)
+    os.replace(tmp_meta, meta_path)
+
+
+def read_csv_cached(csv_path, cache_dir=CACHE_DIR, **read_options):
+    """Read a CSV through a Feather cache that is rebuilt when the source changes
+
+    The cache is reused while the CSV's mtime and size and the read options
+    are unchanged. Any failure to read or write the cache falls back to
+    parsing the CSV so the cache can never block loading.
+    """
+    data_path, meta_path = _cache_paths(csv_path, cache_dir)
+    signature = _source_signature(csv_path, read_options)
+
+    if _read_meta(meta_path) == signature and data_path.exists():
+        try:
+            return pd.read_feather(data_path)
+        except Exception as e:
+            print(f"Ignoring unreadable dataset cache {data_path}: {str(e)}")
+
+    df = pd.read_csv(csv_path, **read_options)
+    try:
+        _write_cache(df, data_path, meta_path, signature)
+    except Exception as e:
+        # e.g. pyarrow missing or a read-only checkout
+        print(f"Could not write dataset cache {data_path}: {str(e)}")
+    return df
+
+
+def iter_cached_batches(csv_path, chunk_rows, columns=None, cache_dir=CACHE_DIR, **read_options):
+    """Iterate the cached copy of a CSV in chunks, or return None if there is no current copy
+
+    The Feather file is memory-mapped and read one Arrow record batch at a
+    time, so the whole table is never materialised.
+    """
+    data_path, meta_path = _cache_paths(csv_path, cache_dir)
+    try:
+        if _read_meta(meta_path) != _source_signature(csv_path, read_options) or not data_path.exists():
+            return None
+        import pyarrow as pa
+        reader = pa.ipc.open_file(pa.memory_map(str(data_path), "r"))
+    except Exception:
+        return None
+
+    def batches():
+        pending, rows = [], 0
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            if columns is not None:
+                batch = batch.select(columns)
+            pending.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_rows:
+                yield pa.Table.from_batches(pending).to_pandas()
+                pending, rows = [], 0
+        if pending:
+            yield pa.Table.from_batches(pending).to_pandas()
+
+    return batches()
+
+
+def evict(csv_path, cache_dir=CACHE_DIR):
+    """Drop the cached copy of one CSV so the next read parses it again"""
+    for path in _cache_paths(csv_path, cache_dir):
+        if path.exists():
+            path.unlink()
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """Remove all cached dataset files"""
+    cache_path = Path(cache_dir)
+    if not cache_path.exists():
+        return
+    for path in cache_path.iterdir():
+        if path.is_file():
+            path.unlink()
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from data.out_of_core import ChunkedTable, DistinctSketch
+
+# Columns with at most this many distinct values have them listed in the profile
+MAX_LISTED_VALUES = 10
+
+# Columns with more distinct values than this get an approximate count
+EXACT_DISTINCT_LIMIT = 100_000
+
+STATISTICS = ["min", "max", "mean", "median", "std"]
+
+
+def _python_value(value):
+    """Plain Python scalars so profiles serialise to JSON"""
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _date_columns(columns):
+    # Same heuristic the original get_dataset_info() used
+    return [column for column in columns if "date" in column.lower() or "time" in column.lower()]
+
+
+def _distinct(series):
+    """(distinct count, whether it is approximate, the values if there are few of them)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Distinct non-missing codes, without materialising the values
+        codes = series.cat.codes.to_numpy()
+        present = np.flatnonzero(np.bincount(codes[codes >= 0], minlength=len(series.cat.categories)))
+        values = series.cat.categories[present] if len(present) <= MAX_LISTED_VALUES else None
+        return len(present), False, values
+    non_null = series.dropna()
+    if len(non_null) > EXACT_DISTINCT_LIMIT:
+        estimate = DistinctSketch().update(non_null).estimate()
+        if estimate > 2 * MAX_LISTED_VALUES:
+            return estimate, True, None
+    values = pd.unique(non_null)
+    return len(values), False, values if len(values) <= MAX_LISTED_VALUES else None
+
+
+def profile_frame(df):
+    """Profile a DataFrame in one vectorised pass per statistic
+
+    Returns the keys get_dataset_info() always returned (rows, columns,
+    numeric/categorical/date columns, missing values, column types,
+    statistics, unique values) plus distinct_counts, where counts above
+    EXACT_DISTINCT_LIMIT rows are HyperLogLog estimates.
+    """
+    numeric_columns = df.select_dtypes(include=["number"]).columns.tolist()
+    categorical_columns = df.select_dtypes(include=["object", "category"]).columns.tolist()
+    statistics = {}
+    if numeric_columns and len(df):
+        table = df[numeric_columns].agg(STATISTICS)
+        statistics = {
+            column: {name: float(value) for name, value in table[column].items()}
+            for column in numeric_columns
+        }
+    distinct_counts, unique_values = {}, {}
+    for column in categorical_columns:
+        count, approximate, values = _distinct(df[column])
+        distinct_counts[column] = {"count": int(count), "approximate": approximate}
+        if values is not None:
+            unique_values[column] = [_python_value(value) for value in values]
+    return {
+        "rows": len(df),
+        "columns": list(df.columns),
+        "numeric_columns": numeric_columns,
+        "categorical_columns": categorical_columns,
+        "date_columns": _date_columns(df.columns),
+        "missing_values": {column: int(count) for column, count in df.isna().sum().items()},
+        "column_types": {column: str(dtype) for column, dtype in df.dtypes.items()},
+        "statistics": statistics,
+        "unique_values": unique_values,
+        "distinct_counts": distinct_counts,
+    }
+
+
+def profile_chunked(table):
+    """The same profile streamed over a ChunkedTable
+
+    Column kinds come from the leading rows; statistics use the mergeable
+    aggregation engine, so the median is approximate.
+    """
+    sample = table.head()
+    numeric_columns = sample.select_dtypes(include=["number"]).columns.tolist()
+    categorical_columns = sample.select_dtypes(include=["object", "category"]).columns.tolist()
+    aggregations = {"rows": (table.columns[0], "size")}
+    for column in table.columns:
+        aggregations[f"count|{column}"] = (column, "count")
+    for column in numeric_columns:
+        for name in STATISTICS:
+            aggregations[f"{name}|{column}"] = (column, name)
+    for column in categorical_columns:
+        aggregations[f"nunique|{column}"] = (column, "nunique")
+    totals = table.aggregate(aggregations).iloc[0] if len(sample) else pd.Series(0, index=list(aggregations))
+    rows = int(totals["rows"])
+
+    unique_values = {}
+    listed = [column for column in categorical_columns if totals[f"nunique|{column}"] <= MAX_LISTED_VALUES]
+    for chunk in table.chunks(columns=listed) if listed else []:
+        for column in listed:
+            unique_values.setdefault(column, set()).update(chunk[column].dropna().unique().tolist())
+    return {
+        "rows": rows,
+        "columns": list(table.columns),
+        "numeric_columns": numeric_columns,
+        "categorical_columns": categorical_columns,
+        "date_columns": _date_columns(table.columns),
+        "missing_values": {column: rows - int(totals[f"count|{column}"]) for column in table.columns},
+        "column_types": {column: str(dtype) for column, dtype in sample.dtypes.items()},
+        "statistics": {
+            column: {name: float(totals[f"{name}|{column}"]) for name in STATISTICS}
+            for column in numeric_columns
+        },
+        "unique_values": {column: sorted((_python_value(value) for value in values), key=str)
+                          for column, values in unique_values.items()},
+        "distinct_counts": {column: {"count": int(totals[f"nunique|{column}"]), "approximate": True}
+                            for column in categorical_columns},
+    }
+
+
+def profile_source(source):
+    """Profile a DataFrame or a ChunkedTable"""
+    if isinstance(source, ChunkedTable):
+        return profile_chunked(source)
+    return profile_frame(source)
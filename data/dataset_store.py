@@ -0,0 +1,374 @@
+import hashlib
+import os
+import threading
+import uuid
+import weakref
+import numpy as np
+import pandas as pd
+from data.aggregate_cube import AggregateCube
+from data.dataset_profile import profile_source
+from data.loan_payment_join import AGGREGATED_PAYMENT_COLUMNS, LoanPaymentJoin
+from data.out_of_core import ChunkedAggregation, ChunkedTable
+from data.schema_dtypes import CUSTOMER_SUMMARY_TABLE, PAYMENT_SUMMARY_TABLE, align_loan_key
+
+# Seconds between checks of the source files for changes (0 disables the watcher)
+DATASET_WATCH_INTERVAL_SECONDS = float(os.getenv("DATASET_WATCH_INTERVAL_SECONDS", "5"))
+
+
+def source_fingerprint(paths):
+    """Short hash of the size and mtime of each source file"""
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+        except OSError:
+            digest.update(f"{path}:missing;".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def concat_rows(base, rows):
+    """Append rows to a frame, widening categoricals instead of degrading them to object"""
+    base = base.copy(deep=False)
+    rows = rows.copy()
+    for column in base.columns:
+        dtype = base[column].dtype
+        if not isinstance(dtype, pd.CategoricalDtype) or column not in rows.columns:
+            continue
+        new_values = pd.Index(rows[column].dropna().astype(object).unique()).difference(dtype.categories)
+        categories = dtype.categories.append(new_values) if len(new_values) else dtype.categories
+        base[column] = base[column].cat.set_categories(categories)
+        rows[column] = rows[column].astype(pd.CategoricalDtype(categories))
+    return pd.concat([base, rows], ignore_index=True)
+
+
+class DatasetSnapshot:
+    """One immutable version of the datasets and everything derived from them
+
+    A request holds on to the snapshot it started with, so a reload or an
+    append that lands mid-request never changes the frames under it.
+    """
+
+    def __init__(self, version, loan_df, payment_df, loan_cube, loan_payments, append_state=None,
+                 source_version=None):
+        self.version = version
+        # Fingerprint of the source files this snapshot reflects; differs from
+        # version only after rows were appended by hand
+        self.source_version = source_version or version
+        self.loan_df = loan_df
+        self.payment_df = payment_df
+        # Precomputed aggregates over the loan dimensions
+        self.loan_cube = loan_cube
+        # LoanId-indexed payments and per-loan payment aggregates
+        self.loan_payments = loan_payments
+        # (byte offset read up to, digest of the bytes before it, fingerprint of
+        # the other sources) for appending new payment rows; None forces a reload
+        self.append_state = append_state
+        # Built on first use and shared by every request on this version
+        self._profile = None
+        self._profile_lock = threading.Lock()
+
+    @property
+    def chunked(self):
+        return isinstance(self.payment_df, ChunkedTable)
+
+    def sample_frames(self):
+        """(loan_df, payment_df) with a leading sample standing in for a streamed payment table"""
+        if self.chunked:
+            return self.loan_df, self.payment_df.head()
+        return self.loan_df, self.payment_df
+
+    def profile(self):
+        """Column types, statistics and distinct values of both tables, computed once per snapshot"""
+        if self._profile is None:
+            with self._profile_lock:
+                if self._profile is None:
+                    self._profile = {
+                        CUSTOMER_SUMMARY_TABLE: profile_source(self.loan_df),
+                        PAYMENT_SUMMARY_TABLE: profile_source(self.payment_df),
+                    }
+        return self._profile
+
+    def namespace(self):
+        """Build the globals used when executing generated analysis code"""
+        # Shallow copies so generated code can add, drop or rename columns
+        # without changing the shared frames for later queries
+        namespace = {
+            "pd": pd,
+            "np": np,
+            "loan_df": self.loan_df.copy(deep=False),
+            "loan_cube": self.loan_cube,
+            "loan_payment_summary": self.loan_payments.loan_payment_summary.copy(deep=False),
+            "loans_with_payments": self.loan_payments.loans_with_payments.copy(deep=False),
+            "ChunkedAggregation": ChunkedAggregation,
+        }
+        if self.chunked:
+            namespace["payment_table"] = self.payment_df
+        else:
+            namespace["payment_df"] = self.payment_df.copy(deep=False)
+            namespace["payments_by_loan"] = self.loan_payments.payments_by_loan.copy(deep=False)
+        return namespace
+
+
+def _offset_marker(path, offset, window=4096):
+    """Digest of the first bytes and of the bytes just before offset, to tell an append from a rewrite
+
+    A rewrite usually changes the header or the early rows, or truncates
+    the file; reading only these two windows keeps the check cheap
+    however large the file is.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        digest.update(f.read(min(offset, window)))
+        f.seek(max(0, offset - window))
+        digest.update(f.read(min(offset, window)))
+    return digest.hexdigest()
+
+
+class DatasetStore:
+    """Keep the loan and payment DataFrames in memory for the lifetime of the process
+
+    The loaded data is an immutable DatasetSnapshot. Reloads and appends
+    build a new snapshot and swap it in with a single assignment, so readers
+    never see a half-built version; snapshots still used by a request stay
+    reachable through snapshot(version) until the request finishes.
+
+    In out-of-core mode the loader returns a ChunkedTable instead of
+    payment_df; payments are then streamed and only their per-loan
+    aggregates are held in memory.
+    """
+
+    def __init__(self, loader, source_paths=(), payment_path=None, read_payment_rows=None):
+        # loader is a zero-argument callable returning (loan_df, payment_df);
+        # read_payment_rows(offset) returns (rows appended to payment_path
+        # after that byte offset, offset after the last complete row)
+        self._loader = loader
+        self._source_paths = list(source_paths)
+        self._payment_path = payment_path
+        self._read_payment_rows = read_payment_rows
+        # Serialises snapshot builds; readers never take it
+        self._lock = threading.Lock()
+        self._current = None
+        self._snapshots = weakref.WeakValueDictionary()
+
+    # Attributes of the current snapshot
+    @property
+    def loan_df(self):
+        return self._current.loan_df if self._current else None
+
+    @property
+    def payment_df(self):
+        return self._current.payment_df if self._current else None
+
+    @property
+    def loan_cube(self):
+        return self._current.loan_cube if self._current else None
+
+    @property
+    def loan_payments(self):
+        return self._current.loan_payments if self._current else None
+
+    @property
+    def version(self):
+        return self._current.version if self._current else None
+
+    @property
+    def chunked(self):
+        return self._current is not None and self._current.chunked
+
+    @property
+    def is_loaded(self):
+        return self._current is not None
+
+    def _swap(self, snapshot):
+        self._snapshots[snapshot.version] = snapshot
+        self._current = snapshot
+
+    def current(self):
+        """The current snapshot, loading the datasets on first use"""
+        if self._current is None:
+            self.load()
+        if self._current is None:
+            raise RuntimeError("Datasets are not loaded")
+        return self._current
+
+    def snapshot(self, version=None):
+        """The snapshot with this version while anything still uses it (the current one for None)"""
+        if version is None:
+            return self.current()
+        return self._snapshots.get(version)
+
+    def live_versions(self):
+        """Versions of every snapshot still referenced"""
+        return set(self._snapshots.keys())
+
+    def _other_sources(self):
+        return [path for path in self._source_paths if path != self._payment_path]
+
+    def _append_state(self, offset=None, others=None):
+        if self._payment_path is None or self._read_payment_rows is None:
+            return None
+        try:
+            offset = os.path.getsize(self._payment_path) if offset is None else offset
+            others = source_fingerprint(self._other_sources()) if others is None else others
+            return offset, _offset_marker(self._payment_path, offset), others
+        except OSError:
+            return None
+
+    def load(self):
+        """Load (or reload) both datasets into a new snapshot, returning True on success"""
+        with self._lock:
+            # Fingerprint before reading so a write during the load is seen as stale next time
+            version = source_fingerprint(self._source_paths)
+            append_state = self._append_state()
+            loan_df, payment_df = self._loader()
+            if loan_df is None or payment_df is None:
+                return False
+            if append_state != self._append_state():
+                # Rows written during the load may or may not have been read
+                append_state = None
+            if isinstance(payment_df, ChunkedTable):
+                loan_payments = LoanPaymentJoin.from_chunks(loan_df, payment_df.chunks(AGGREGATED_PAYMENT_COLUMNS))
+            else:
+                loan_payments = LoanPaymentJoin.from_frames(loan_df, payment_df)
+            self._swap(DatasetSnapshot(
+                version, loan_df, payment_df, AggregateCube.from_frame(loan_df), loan_payments, append_state
+            ))
+            return True
+
+    def append(self, loan_rows=None, payment_rows=None):
+        """Add new rows as a new snapshot, refreshing derived aggregates incrementally"""
+        with self._lock:
+            self._append(loan_rows, payment_rows, version=None, append_state=None)
+
+    def _append(self, loan_rows, payment_rows, version, append_state):
+        # Called with the lock held
+        base = self._current
+        if base is None:
+            raise RuntimeError("Datasets are not loaded")
+        loan_df, payment_df, loan_cube = base.loan_df, base.payment_df, base.loan_cube
+        if loan_rows is not None and len(loan_rows):
+            loan_df = concat_rows(loan_df, loan_rows)
+            loan_cube = loan_cube.append(loan_rows)
+        if base.chunked:
+            # The streamed source already holds the rows; fold them into the aggregates
+            loan_payments = base.loan_payments.append(loan_df, payment_rows)
+        else:
+            if payment_rows is not None and len(payment_rows):
+                payment_df = concat_rows(payment_df, payment_rows)
+            # New loan ids must get the same codes in both frames; align on
+            # shallow copies so the base snapshot's frames are left untouched
+            loan_df, payment_df = align_loan_key(loan_df.copy(deep=False), payment_df.copy(deep=False))
+            # Pass the appended payment rows with their aligned dtypes
+            new_payments = payment_df.iloc[len(base.payment_df):]
+            loan_payments = base.loan_payments.append(loan_df, new_payments)
+        if version is None:
+            # Rows appended by hand: a new version for caches, the same sources
+            version, source_version = f"{base.source_version}+{uuid.uuid4().hex[:8]}", base.source_version
+            append_state = base.append_state
+        else:
+            source_version = version
+        self._swap(DatasetSnapshot(
+            version, loan_df, payment_df, loan_cube, loan_payments, append_state, source_version
+        ))
+
+    def _appended_only(self, base):
+        """True when the payment source only grew past the rows base has read"""
+        if base.append_state is None:
+            return False
+        offset, marker, others = base.append_state
+        try:
+            return (
+                source_fingerprint(self._other_sources()) == others
+                and os.path.getsize(self._payment_path) >= offset
+                and _offset_marker(self._payment_path, offset) == marker
+            )
+        except OSError:
+            return False
+
+    def get(self):
+        """Return (loan_df, payment_df), loading them on first use"""
+        if not self.is_loaded:
+            self.load()
+        return self.loan_df, self.payment_df
+
+    def sample_frames(self):
+        """(loan_df, payment_df) with a leading sample standing in for a streamed payment table"""
+        return self.current().sample_frames()
+
+    def is_stale(self):
+        """True when the source files changed since the current snapshot was built"""
+        return self._current is None or self._current.source_version != source_fingerprint(self._source_paths)
+
+    def refresh_if_stale(self):
+        """Bring the data up to date with the source files; returns the current version
+
+        Rows appended to the payment source are read and appended on their
+        own; any other change rebuilds the snapshot from scratch.
+        """
+        if not self.is_loaded:
+            self.load()
+            return self.version
+        if not self.is_stale():
+            return self.version
+        with self._lock:
+            base = self._current
+            version = source_fingerprint(self._source_paths)
+            if version == base.source_version:
+                # Another thread refreshed while this one waited for the lock
+                return version
+            if self._appended_only(base):
+                offset, _, others = base.append_state
+                payment_rows, end_offset = self._read_payment_rows(offset)
+                self._append(None, payment_rows, version, self._append_state(end_offset, others))
+                return self.version
+        self.load()
+        return self.version
+
+    def profile(self):
+        """Profile of the current snapshot"""
+        return self.current().profile()
+
+    def namespace(self):
+        """Build the globals used when executing generated analysis code"""
+        return self.current().namespace()
+
+
+class DatasetWatcher:
+    """Poll the dataset sources and swap in a new snapshot when they change
+
+    Runs on a background thread so requests never wait for a reload; they
+    keep using the snapshot they started with until they finish.
+    """
+
+    def __init__(self, store, interval=DATASET_WATCH_INTERVAL_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                previous = self.store.version
+                if self.store.refresh_if_stale() != previous:
+                    print(f"Dataset snapshot {previous} replaced by {self.store.version}")
+            except Exception as e:
+                # Keep serving the current snapshot; the next poll tries again
+                print(f"Dataset refresh failed: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
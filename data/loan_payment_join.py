@@ -0,0 +1,130 @@
+import pandas as pd
+
+LOAN_KEY = "LoanId"
+
+# Payment columns the per-loan aggregates are computed from
+AGGREGATED_PAYMENT_COLUMNS = [LOAN_KEY, "ReceiptId", "TransactionType", "PaymentMode", "TransactionAmount"]
+
+
+def _column_label(prefix, value):
+    return f"{prefix}_{str(value).replace(' ', '_')}"
+
+
+def _per_loan_aggregates(payment_df):
+    """Mergeable per-loan payment aggregates: sums, counts and first/last receipt"""
+    grouped = payment_df.groupby(LOAN_KEY, observed=True)
+    summary = pd.DataFrame({
+        "transaction_count": grouped.size(),
+        "total_amount": grouped["TransactionAmount"].sum(),
+        "first_receipt": grouped["ReceiptId"].min(),
+        "last_receipt": grouped["ReceiptId"].max(),
+    })
+    for column, prefix in (("TransactionType", "type"), ("PaymentMode", "mode")):
+        totals = (
+            payment_df.groupby([LOAN_KEY, column], observed=True)["TransactionAmount"].sum()
+            .unstack(column, fill_value=0)
+        )
+        totals.columns = [_column_label(prefix, value) for value in totals.columns]
+        summary = summary.join(totals)
+    return summary
+
+
+def _widen_index(frame, categories):
+    """Give a LoanId-indexed frame the (wider) categories of the appended data
+
+    Concatenating categorical indexes with different categories would
+    silently turn them into object indexes.
+    """
+    if not isinstance(frame.index, pd.CategoricalIndex):
+        return frame
+    frame = frame.copy(deep=False)
+    frame.index = frame.index.set_categories(categories)
+    return frame
+
+
+def _merge_aggregates(existing, new):
+    """Combine two per-loan aggregate frames without touching the payment rows"""
+    combined = pd.concat([existing, new])
+    functions = {column: "sum" for column in combined.columns}
+    functions["first_receipt"] = "min"
+    functions["last_receipt"] = "max"
+    merged = combined.groupby(level=0, observed=True).agg(functions)
+    sum_columns = [column for column, function in functions.items() if function == "sum"]
+    merged[sum_columns] = merged[sum_columns].fillna(0)
+    return merged
+
+
+class LoanPaymentJoin:
+    """Prebuilt loan-to-payment join layer
+
+    payments_by_loan is payment_df indexed and sorted by LoanId, so one
+    loan's payments (or a range of loans) is an index lookup; it is None
+    when the payments are streamed in chunks (from_chunks()).
+    loan_payment_summary holds per-loan payment aggregates indexed by
+    LoanId, and loans_with_payments is loan_df with those aggregates
+    already joined on. All three are immutable; append() returns a new join.
+    """
+
+    def __init__(self, payments_by_loan, loan_payment_summary, loans_with_payments):
+        self.payments_by_loan = payments_by_loan
+        self.loan_payment_summary = loan_payment_summary
+        self.loans_with_payments = loans_with_payments
+
+    @staticmethod
+    def _join_loans(loan_df, summary):
+        joined = loan_df.join(summary, on=LOAN_KEY)
+        # Loans without payments have zero totals; their receipts stay missing
+        value_columns = [column for column in summary.columns if column not in ("first_receipt", "last_receipt")]
+        joined[value_columns] = joined[value_columns].fillna(0)
+        return joined
+
+    @classmethod
+    def from_frames(cls, loan_df, payment_df):
+        payments_by_loan = payment_df.set_index(LOAN_KEY).sort_index(kind="stable")
+        summary = _per_loan_aggregates(payment_df)
+        return cls(payments_by_loan, summary, cls._join_loans(loan_df, summary))
+
+    @classmethod
+    def from_chunks(cls, loan_df, payment_chunks):
+        """Build the per-loan aggregates from streamed payment chunks
+
+        Only the aggregates (one row per loan) are kept, so memory does not
+        grow with the payment history.
+        """
+        summary = None
+        for chunk in payment_chunks:
+            aggregates = _per_loan_aggregates(chunk)
+            summary = aggregates if summary is None else _merge_aggregates(summary, aggregates)
+        if summary is None:
+            summary = pd.DataFrame(columns=["transaction_count", "total_amount", "first_receipt", "last_receipt"])
+        return cls(None, summary, cls._join_loans(loan_df, summary))
+
+    def append(self, loan_df, payment_rows=None):
+        """Return a new join for the (already appended) loan_df and new payment rows
+
+        Only the new payment rows are aggregated; their totals are merged into
+        the existing per-loan aggregates.
+        """
+        payments_by_loan = self.payments_by_loan
+        summary = self.loan_payment_summary
+        if isinstance(loan_df[LOAN_KEY].dtype, pd.CategoricalDtype):
+            categories = loan_df[LOAN_KEY].cat.categories
+            payments_by_loan = _widen_index(payments_by_loan, categories)
+            summary = _widen_index(summary, categories)
+        if payment_rows is not None and len(payment_rows):
+            if payments_by_loan is not None:
+                new_rows = payment_rows.set_index(LOAN_KEY)
+                payments_by_loan = pd.concat([payments_by_loan, new_rows]).sort_index(kind="stable")
+            summary = _merge_aggregates(summary, _per_loan_aggregates(payment_rows))
+        return LoanPaymentJoin(payments_by_loan, summary, self._join_loans(loan_df, summary))
+
+    def payments_for(self, loan_ids):
+        """All payment rows for one loan id or a list of loan ids"""
+        payments = self.payments_by_loan
+        if payments is None:
+            raise RuntimeError("Payments are streamed in chunks; use payment_table instead")
+        if isinstance(loan_ids, (list, tuple, set, pd.Index, pd.Series)):
+            return payments.loc[payments.index.isin(list(loan_ids))]
+        if loan_ids not in payments.index:
+            return payments.iloc[0:0]
+        return payments.loc[[loan_ids]]
@@ -0,0 +1,302 @@
+import math
+import os
+import numpy as np
+import pandas as pd
+from data.schema_dtypes import iter_typed_chunks, load_schema
+
+# Rows per chunk when streaming a table
+DATASET_CHUNK_ROWS = int(os.getenv("DATASET_CHUNK_ROWS", "250000"))
+
+# Relative error of QuantileSketch and register bits of DistinctSketch
+QUANTILE_RELATIVE_ACCURACY = 0.01
+DISTINCT_PRECISION = 14
+
+# Functions ChunkedAggregation computes exactly from per-chunk partials
+EXACT_FUNCTIONS = {"size", "count", "sum", "mean", "std", "min", "max"}
+
+
+class QuantileSketch:
+    """Mergeable approximate quantiles with bounded relative error
+
+    Values are counted in logarithmic buckets (as in DDSketch), so any
+    quantile is within relative_accuracy of the true value and two sketches
+    merge by adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=QUANTILE_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive = pd.Series(dtype="int64")
+        self.negative = pd.Series(dtype="int64")
+        self.zeros = 0
+        self.count = 0
+
+    def _buckets(self, magnitudes):
+        return pd.Series(np.ceil(np.log(magnitudes) / self._log_gamma).astype("int64")).value_counts()
+
+    def update(self, values):
+        values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(dtype="float64")
+        if not len(values):
+            return self
+        self.positive = self.positive.add(self._buckets(values[values > 0]), fill_value=0).astype("int64")
+        self.negative = self.negative.add(self._buckets(-values[values < 0]), fill_value=0).astype("int64")
+        self.zeros += int((values == 0).sum())
+        self.count += len(values)
+        return self
+
+    def merge(self, other):
+        self.positive = self.positive.add(other.positive, fill_value=0).astype("int64")
+        self.negative = self.negative.add(other.negative, fill_value=0).astype("int64")
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def _value(self, bucket):
+        return 2 * self._gamma ** bucket / (self._gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return np.nan
+        rank = q * (self.count - 1)
+        # Ascending order: most negative (largest magnitude bucket) first
+        negative = self.negative.sort_index(ascending=False)
+        seen = 0
+        for bucket, count in negative.items():
+            seen += count
+            if seen > rank:
+                return -self._value(bucket)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for bucket, count in self.positive.sort_index().items():
+            seen += count
+            if seen > rank:
+                return self._value(bucket)
+        return self._value(self.positive.index.max())
+
+
+class DistinctSketch:
+    """Mergeable approximate distinct count (HyperLogLog)
+
+    Values are hashed with pandas' stable object hashing, so the same value
+    always lands in the same register whichever chunk or worker sees it.
+    Typical error is about 1.04 / sqrt(2 ** precision), under 1% by default.
+    """
+
+    def __init__(self, precision=DISTINCT_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype="uint8")
+
+    def update(self, values):
+        values = pd.Series(values).dropna()
+        if not len(values):
+            return self
+        hashes = pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy(dtype="uint64")
+        index = (hashes >> np.uint64(64 - self.precision)).astype("int64")
+        remaining_bits = 64 - self.precision
+        rest = hashes & np.uint64((1 << remaining_bits) - 1)
+        # Position of the first set bit in the remaining bits
+        bit_length = np.zeros(len(rest), dtype="int64")
+        nonzero = rest > 0
+        bit_length[nonzero] = np.floor(np.log2(rest[nonzero].astype("float64"))).astype("int64") + 1
+        rank = (remaining_bits - bit_length + 1).astype("uint8")
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype("float64")))
+        empty = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and empty:
+            # Linear counting is more accurate for small cardinalities
+            return int(round(m * math.log(m / empty)))
+        return int(round(raw))
+
+
+def _parse_function(function):
+    """Split an aggregation name into (kind, quantile): "median" and "p95" are quantiles"""
+    if function in EXACT_FUNCTIONS or function == "nunique":
+        return function, None
+    if function == "median":
+        return "quantile", 0.5
+    if function.startswith("p") and function[1:].replace(".", "", 1).isdigit():
+        return "quantile", float(function[1:]) / 100
+    raise ValueError(f"Unsupported aggregation {function!r}")
+
+
+class ChunkedAggregation:
+    """Group-by aggregation over a stream of chunks with mergeable state
+
+    aggregations maps output names to (column, function) pairs like pandas
+    named aggregation. size, count, sum, mean, std, min and max are exact and
+    kept as per-group partials; median/pNN (approximate quantiles) and
+    nunique (approximate distinct counts) keep a sketch per group. Two
+    aggregations over disjoint chunks combine with merge(), so chunks can
+    be processed by separate workers.
+    """
+
+    def __init__(self, aggregations, by=()):
+        self.by = [by] if isinstance(by, str) else list(by)
+        self.aggregations = {name: (column, *_parse_function(function))
+                             for name, (column, function) in aggregations.items()}
+        self._partials = None
+        self._sketches = {}
+        self.rows = 0
+
+    def _partial(self, chunk):
+        """Per-group partials (size and each needed count/sum/sumsq/min/max) of one chunk"""
+        needed = set()
+        for column, kind, _ in self.aggregations.values():
+            if kind == "mean":
+                needed |= {("count", column), ("sum", column)}
+            elif kind == "std":
+                needed |= {("count", column), ("sum", column), ("sumsq", column)}
+            elif kind in EXACT_FUNCTIONS - {"size"}:
+                needed.add((kind, column))
+        # Without keys every row falls in one group
+        keys = [chunk[column] for column in self.by] if self.by else pd.Series(0, index=chunk.index)
+        partial = chunk.groupby(keys, observed=True, sort=False).size().to_frame("__size__")
+        for kind, column in sorted(needed):
+            values = chunk[column]
+            if kind in ("min", "max") and isinstance(values.dtype, pd.CategoricalDtype):
+                # Unordered categoricals have no min/max; compare the values instead
+                values = values.astype(object)
+            if kind == "sumsq":
+                partial[f"{kind}:{column}"] = (values.astype("float64") ** 2).groupby(keys, observed=True, sort=False).sum()
+                continue
+            partial[f"{kind}:{column}"] = values.groupby(keys, observed=True, sort=False).agg(kind)
+        return partial
+
+    @staticmethod
+    def _combine(partials):
+        combined = pd.concat(partials)
+        # Counts and sums add up; minima and maxima combine with themselves
+        functions = {column: column.split(":", 1)[0] if ":" in column else "sum" for column in combined.columns}
+        functions = {column: "sum" if function in ("count", "sumsq") else function for column, function in functions.items()}
+        return combined.groupby(level=list(range(combined.index.nlevels)), observed=True, sort=False).agg(functions)
+
+    def update(self, chunk):
+        """Fold one chunk into the aggregation"""
+        if not len(chunk):
+            return self
+        self.rows += len(chunk)
+        partial = self._partial(chunk)
+        self._partials = partial if self._partials is None else self._combine([self._partials, partial])
+        sketched = {name: spec for name, spec in self.aggregations.items() if spec[1] in ("quantile", "nunique")}
+        if sketched:
+            groups = chunk.groupby(self.by, observed=True, sort=False) if self.by else [(0, chunk)]
+            for key, group in groups:
+                if isinstance(key, tuple) and len(self.by) == 1:
+                    key = key[0]
+                for name, (column, kind, _) in sketched.items():
+                    sketch = self._sketches.setdefault((key, name), QuantileSketch() if kind == "quantile" else DistinctSketch())
+                    sketch.update(group[column])
+        return self
+
+    def merge(self, other):
+        """Fold in an aggregation computed over other chunks"""
+        if other._partials is not None:
+            self._partials = other._partials if self._partials is None else self._combine([self._partials, other._partials])
+        for key, sketch in other._sketches.items():
+            if key in self._sketches:
+                self._sketches[key].merge(sketch)
+            else:
+                self._sketches[key] = sketch
+        self.rows += other.rows
+        return self
+
+    def result(self):
+        """DataFrame of the aggregations, indexed by the group keys (one row without keys)"""
+        if self._partials is None:
+            return pd.DataFrame(columns=list(self.aggregations))
+        partials = self._partials
+        table = pd.DataFrame(index=partials.index)
+        for name, (column, kind, q) in self.aggregations.items():
+            if kind == "size":
+                table[name] = partials["__size__"]
+            elif kind == "mean":
+                table[name] = partials[f"sum:{column}"] / partials[f"count:{column}"].where(partials[f"count:{column}"] > 0)
+            elif kind == "std":
+                # Sample standard deviation from the count, sum and sum of squares
+                count = partials[f"count:{column}"]
+                variance = (partials[f"sumsq:{column}"] - partials[f"sum:{column}"] ** 2 / count.where(count > 0)) \
+                    / (count - 1).where(count > 1)
+                table[name] = np.sqrt(variance.clip(lower=0))
+            elif kind in EXACT_FUNCTIONS:
+                table[name] = partials[f"{kind}:{column}"]
+            else:
+                values = []
+                for key in partials.index:
+                    sketch = self._sketches.get((key, name))
+                    if sketch is None:
+                        values.append(np.nan)
+                    elif kind == "quantile":
+                        values.append(sketch.quantile(q))
+                    else:
+                        values.append(sketch.estimate())
+                table[name] = values
+        if self.by:
+            table.index.names = self.by
+        else:
+            table = table.reset_index(drop=True)
+        return table
+
+
+class ChunkedTable:
+    """A CSV source read in chunks instead of being held in memory
+
+    chunks() streams typed DataFrames (from the columnar cache when it is
+    current) and aggregate() runs a ChunkedAggregation over them, so memory
+    stays bounded by the chunk size however large the table grows.
+    """
+
+    def __init__(self, csv_path, table_name, schema=None, chunk_rows=DATASET_CHUNK_ROWS, **read_options):
+        self.csv_path = csv_path
+        self.table_name = table_name
+        self.schema = schema or load_schema()
+        self.chunk_rows = chunk_rows
+        self.read_options = read_options
+        self.columns = pd.read_csv(csv_path, nrows=0, **read_options).columns.tolist()
+
+    def chunks(self, columns=None, filters=None, chunk_rows=None):
+        """Yield typed chunks, optionally only some columns and rows matching filters
+
+        filters maps a column to a value or a list of values.
+        """
+        filters = filters or {}
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + [column for column in filters if column not in columns]))
+        for chunk in iter_typed_chunks(self.csv_path, self.table_name, chunk_rows or self.chunk_rows, columns,
+                                       self.schema, **self.read_options):
+            for column, value in filters.items():
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                chunk = chunk[chunk[column].isin(values).fillna(False)]
+            yield chunk
+
+    def head(self, n=1000):
+        """The first rows, with the table's columns and dtypes"""
+        return next(self.chunks(chunk_rows=n), pd.DataFrame(columns=self.columns)).head(n)
+
+    def aggregate(self, aggregations, by=(), filters=None, transform=None):
+        """Run a ChunkedAggregation over the table and return its result
+
+        transform, if given, is applied to each chunk first (e.g. to add a
+        derived column to aggregate).
+        """
+        aggregation = ChunkedAggregation(aggregations, by)
+        columns = None
+        if transform is None:
+            by_columns = [by] if isinstance(by, str) else list(by)
+            columns = list(dict.fromkeys(by_columns + [column for column, _ in aggregations.values()]))
+        for chunk in self.chunks(columns, filters):
+            aggregation.update(transform(chunk) if transform is not None else chunk)
+        return aggregation.result()
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks(columns=self.columns[:1]))
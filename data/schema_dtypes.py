@@ -0,0 +1,214 @@
+import io
+import json
+import pandas as pd
+from pandas.api.types import union_categoricals
+from data.columnar_cache import iter_cached_batches, read_csv_cached
+
+# Schema describing both views
+SCHEMA_PATH = "schema/views_schema.json"
+
+# Schema table backing each CSV source
+CUSTOMER_SUMMARY_TABLE = "Loan_Customer_Summary"
+PAYMENT_SUMMARY_TABLE = "Loan_Payment_Summary"
+
+# Key shared by both tables, stored as categoricals with one set of codes
+LOAN_KEY = "LoanId"
+
+# Low-cardinality grouping columns the schema does not enumerate
+EXTRA_CATEGORICAL_COLUMNS = ["SchemeName", "CustomerName", "JewellerName"]
+
+# Free text and identifiers, and date columns without a format in the schema:
+# kept as Arrow-backed strings, a fraction of the size of Python objects
+TEXT_DTYPE = "string[pyarrow]"
+
+BOOLEAN_VALUES = {"true", "false"}
+
+
+def load_schema(schema_path=SCHEMA_PATH):
+    """Load the views schema from disk"""
+    with open(schema_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _column_dtype(column_spec):
+    """Map one schema column description to a read_csv dtype (None to infer)"""
+    column_type = column_spec.get("type", "")
+    possible_values = column_spec.get("possible values")
+    if possible_values:
+        if {str(value).lower() for value in possible_values} <= BOOLEAN_VALUES:
+            return "boolean"
+        return "category"
+    if column_type == "datetime":
+        return "datetime"
+    if column_type == "varchar":
+        return TEXT_DTYPE
+    # Integers and decimals are left to pandas, which infers int64/float64
+    return None
+
+
+def compile_read_options(table_schema, csv_columns, categorical=()):
+    """Compile a schema table into read_csv dtype, parse_dates and date_format options
+
+    Schema column names are matched case-insensitively against the CSV
+    header (the schema says JewellerID, the CSV JewellerId) and columns
+    missing from the CSV are skipped. Datetime columns are parsed only
+    with an explicit "format" in the schema; without one they are kept as
+    strings, since inferring a format per value is slow, warns, and turns
+    the bundled "54:41.0" fragments into nothing useful.
+    """
+    by_lower = {column.lower(): column for column in csv_columns}
+    dtype = {}
+    parse_dates = []
+    date_format = {}
+    for name, spec in table_schema.get("columns", {}).items():
+        column = by_lower.get(name.lower())
+        if column is None:
+            continue
+        column_dtype = "category" if column == LOAN_KEY else _column_dtype(spec)
+        if column_dtype == "datetime" and spec.get("format"):
+            parse_dates.append(column)
+            date_format[column] = spec["format"]
+        elif column_dtype == "datetime":
+            dtype[column] = TEXT_DTYPE
+        elif column_dtype is not None:
+            dtype[column] = column_dtype
+    for column in csv_columns:
+        # Same heuristic as get_dataset_info() for date columns the schema omits
+        if "date" in column.lower() and column not in parse_dates:
+            dtype.setdefault(column, TEXT_DTYPE)
+    for column in categorical:
+        if column in csv_columns:
+            dtype[column] = "category"
+    options = {"dtype": dtype, "parse_dates": parse_dates}
+    if date_format:
+        options["date_format"] = date_format
+    return options
+
+
+def read_typed_csv(csv_path, table_name, schema=None, **read_options):
+    """Read a CSV with dtypes compiled from its schema table
+
+    Columns that do not parse as datetimes are kept as strings. If the typed
+    read fails (e.g. a boolean column gains an unexpected value) the file is
+    read with inferred dtypes instead so loading never breaks.
+    """
+    schema = schema or load_schema()
+    typed_options = _typed_options(csv_path, schema[table_name], read_options)
+    try:
+        df = read_csv_cached(csv_path, **typed_options, **read_options)
+    except (ValueError, TypeError) as e:
+        print(f"Falling back to inferred dtypes for {csv_path}: {str(e)}")
+        return read_csv_cached(csv_path, **read_options)
+    return _restore_numeric_categories(df, schema[table_name])
+
+
+def _typed_options(csv_path, table_schema, read_options):
+    header = pd.read_csv(csv_path, nrows=0, **read_options).columns.tolist()
+    return compile_read_options(table_schema, header, EXTRA_CATEGORICAL_COLUMNS)
+
+
+def iter_typed_chunks(csv_path, table_name, chunk_rows, columns=None, schema=None, **read_options):
+    """Yield a CSV as typed DataFrames of at most chunk_rows rows
+
+    Reads record batches from the columnar cache when it is current and
+    streams the CSV otherwise, so only one chunk is in memory at a time.
+    Categorical columns get their categories per chunk.
+    """
+    schema = schema or load_schema()
+    typed_options = _typed_options(csv_path, schema[table_name], read_options)
+    chunks = iter_cached_batches(csv_path, chunk_rows, columns, **typed_options, **read_options)
+    if chunks is None:
+        if columns is not None:
+            # read_csv rejects dtype/parse_dates entries for columns it does not read
+            typed_options = {
+                "dtype": {column: dtype for column, dtype in typed_options["dtype"].items() if column in columns},
+                "parse_dates": [column for column in typed_options["parse_dates"] if column in columns],
+                **({"date_format": {column: value for column, value in typed_options["date_format"].items()
+                                    if column in columns}} if "date_format" in typed_options else {}),
+            }
+        chunks = pd.read_csv(csv_path, chunksize=chunk_rows, usecols=columns, **typed_options, **read_options)
+    for chunk in chunks:
+        yield _restore_numeric_categories(chunk, schema[table_name])
+
+
+def read_appended_rows(csv_path, table_name, offset, schema=None, **read_options):
+    """Read the typed rows written to a CSV after byte offset
+
+    Returns (rows, end_offset) where end_offset is just past the last
+    complete line, so a row still being written is picked up next time.
+    """
+    schema = schema or load_schema()
+    with open(csv_path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    header = pd.read_csv(csv_path, nrows=0, **read_options).columns.tolist()
+    typed_options = compile_read_options(schema[table_name], header, EXTRA_CATEGORICAL_COLUMNS)
+    # The tail has no header (and no byte order mark)
+    options = {key: value for key, value in read_options.items() if key != "encoding"}
+    rows = pd.read_csv(io.BytesIO(data[:end]), header=None, names=header, encoding="utf-8",
+                       **typed_options, **options) if end else pd.DataFrame(columns=header)
+    return _restore_numeric_categories(rows, schema[table_name]), offset + end
+
+
+def _restore_numeric_categories(df, table_schema):
+    """Turn the string categories read_csv produces back into numbers
+
+    dtype='category' always parses categories as strings, which would break
+    comparisons such as CustomerType == 1 in generated code.
+    """
+    numeric_types = {"integer", "decimal"}
+    by_lower = {name.lower(): spec for name, spec in table_schema.get("columns", {}).items()}
+    for column in df.columns:
+        spec = by_lower.get(column.lower(), {})
+        if spec.get("type") in numeric_types and isinstance(df[column].dtype, pd.CategoricalDtype):
+            try:
+                numeric = pd.to_numeric(df[column].cat.categories)
+            except (ValueError, TypeError):
+                continue
+            df[column] = df[column].cat.rename_categories(numeric)
+    return df
+
+
+def align_loan_key(loan_df, payment_df, key=LOAN_KEY):
+    """Give the loan key the same categories in both frames
+
+    With identical categories the integer codes match across frames, so
+    merges and lookups on the key stay categorical instead of falling back
+    to object comparisons.
+    """
+    if not (isinstance(loan_df[key].dtype, pd.CategoricalDtype)
+            and isinstance(payment_df[key].dtype, pd.CategoricalDtype)):
+        return loan_df, payment_df
+    categories = union_categoricals([loan_df[key], payment_df[key]], ignore_order=True).categories
+    loan_df[key] = loan_df[key].cat.set_categories(categories)
+    payment_df[key] = payment_df[key].cat.set_categories(categories)
+    return loan_df, payment_df
+
+
+def memory_report(untyped_df, typed_df):
+    """Per-column memory in bytes before and after applying schema dtypes"""
+    before = untyped_df.memory_usage(deep=True, index=False)
+    after = typed_df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "dtype_before": untyped_df.dtypes.astype(str),
+        "dtype_after": typed_df.dtypes.astype(str),
+        "bytes_before": before,
+        "bytes_after": after,
+    })
+    report["ratio"] = (report["bytes_before"] / report["bytes_after"]).round(2)
+    report.loc["TOTAL"] = ["", "", before.sum(), after.sum(), round(before.sum() / after.sum(), 2)]
+    return report
+
+
+if __name__ == "__main__":
+    # Print the memory saved by the compiled dtypes for both sources
+    schema = load_schema()
+    for csv_path, table_name, options in [
+        ("csv/customer_summary.csv", CUSTOMER_SUMMARY_TABLE, {}),
+        ("csv/payment_summary.csv", PAYMENT_SUMMARY_TABLE, {"encoding": "utf-8-sig"}),
+    ]:
+        untyped = pd.read_csv(csv_path, **options)
+        typed = read_typed_csv(csv_path, table_name, schema, **options)
+        print(f"\n{csv_path}")
+        print(memory_report(untyped, typed).to_string())
@@ -0,0 +1,214 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from data.schema_dtypes import CUSTOMER_SUMMARY_TABLE, PAYMENT_SUMMARY_TABLE, load_schema
+
+# Column order of the real CSV exports
+LOAN_COLUMNS = [
+    "CustomerId", "CustomerType", "CustomerName", "JewellerId", "JewellerName", "BorrowerType", "LoanId",
+    "ReferenceNo", "BranchId", "BranchName", "SchemeId", "SchemeName", "LoanDisbursementDate",
+    "LoanMaturityDate", "LoanStatus", "AuctionStatus", "LoanAmount", "OutstandingAmount", "NPA",
+]
+PAYMENT_COLUMNS = ["ReceiptId", "LoanId", "TransactionType", "PaymentMode", "TransactionAmount", "NPA"]
+
+# Loan export the scheme catalogue is read from; the schema does not enumerate schemes
+SCHEME_SOURCE_PATH = "csv/customer_summary.csv"
+
+# Rows generated (and written) at a time, which bounds memory at any scale
+CHUNK_LOANS = 500_000
+
+# The value retail customers carry in the Express-only columns
+NOT_EXPRESS = "Not a Express Customer!"
+
+
+def _enumerated(table_schema, column):
+    return table_schema["columns"][column]["possible values"]
+
+
+def _skewed_weights(count, skew):
+    """Zipf-like weights: the first value is the most common"""
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    return weights / weights.sum()
+
+
+def _skewed_choice(rng, values, size, skew=1.0):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=_skewed_weights(len(values), skew))]
+
+
+def _numbered(prefix, numbers, width):
+    return np.char.add(prefix, np.char.zfill(numbers.astype(str), width)).astype(object)
+
+
+def _loan_ids(start, count, width=7):
+    """Fixed-width base-36 ids, unique across chunks"""
+    numbers = np.arange(start, start + count)
+    digits = (numbers[:, None] // 36 ** np.arange(width - 1, -1, -1)) % 36
+    alphabet = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    return np.ascontiguousarray(alphabet[digits]).view(f"<U{width}").ravel().astype(object)
+
+
+def load_schemes(schema=None, source_path=SCHEME_SOURCE_PATH):
+    """Scheme names and ids to generate, most used first
+
+    Taken from the schema when it enumerates SchemeName, and otherwise from
+    the real loan export, so every scheme the router and cube see in real
+    data (including rare ones) is generated too.
+    """
+    schema = schema or load_schema()
+    pairs = pd.read_csv(source_path, usecols=["SchemeId", "SchemeName"]).dropna()
+    schemes = {name: int(scheme_id) for scheme_id, name in pairs.value_counts().index}
+    enumerated = schema[CUSTOMER_SUMMARY_TABLE]["columns"].get("SchemeName", {}).get("possible values")
+    for name in enumerated or []:
+        # Schemes listed in the schema but not yet used get fresh ids
+        schemes.setdefault(name, max(schemes.values(), default=0) + 1)
+    return schemes
+
+
+def _cover_all(index, values_count):
+    """Make the first rows take each value once, so small datasets still have every category"""
+    covered = min(values_count, len(index))
+    index[:covered] = np.arange(covered)
+    return index
+
+
+def generate_loans(rng, start, count, schema, schemes):
+    """Loan rows start..start+count for the customer summary; schemes maps scheme names to ids"""
+    table = schema[CUSTOMER_SUMMARY_TABLE]
+    branches = _enumerated(table, "BranchName")
+    branch_index = rng.choice(len(branches), size=count, p=_skewed_weights(len(branches), 0.8))
+    scheme_names = list(schemes)
+    scheme_index = rng.choice(len(scheme_names), size=count, p=_skewed_weights(len(scheme_names), 1.3))
+    if start == 0:
+        branch_index = _cover_all(branch_index, len(branches))
+        scheme_index = _cover_all(scheme_index, len(scheme_names))
+    customer_type = rng.choice(_enumerated(table, "CustomerType"), size=count)
+    express = customer_type != 1
+
+    # Express customers come through a jeweller, with a skewed jeweller pool
+    jeweller_id = np.where(express, rng.zipf(1.6, size=count) % 25000 + 1, 0)
+    borrower_types = [value for value in _enumerated(table, "BorrowerType") if value != NOT_EXPRESS]
+    borrower_type = np.where(
+        express & (rng.random(count) < 0.22), _skewed_choice(rng, borrower_types, count, 0.5), NOT_EXPRESS
+    )
+    jeweller_name = np.where(express, _numbered("JEWELLER_", jeweller_id, 5), NOT_EXPRESS)
+
+    # Loan sizes are roughly log-normal around ₹30,000
+    loan_amount = np.maximum(1000, np.round(rng.lognormal(np.log(30000), 0.9, size=count), -1))
+    outstanding = np.round(loan_amount * rng.uniform(0.2, 1.3, size=count), 0)
+    disbursed = pd.Timestamp("2023-04-01") + pd.to_timedelta(rng.integers(0, 730 * 86400, size=count), unit="s")
+    sequence = np.arange(start, start + count)
+    branch_names = np.asarray(branches, dtype=object)[branch_index]
+
+    return pd.DataFrame({
+        "CustomerId": rng.integers(1, max(2, (start + count) // 2), size=count),
+        "CustomerType": customer_type,
+        "CustomerName": _numbered("CUSTOMER_", sequence, 8),
+        "JewellerId": jeweller_id,
+        "JewellerName": jeweller_name,
+        "BorrowerType": borrower_type,
+        "LoanId": _loan_ids(start, count),
+        "ReferenceNo": branch_names + _numbered("2425-", sequence, 8),
+        "BranchId": branch_index + 1,
+        "BranchName": branch_names,
+        "SchemeId": np.asarray([schemes[name] for name in scheme_names])[scheme_index],
+        "SchemeName": np.asarray(scheme_names, dtype=object)[scheme_index],
+        "LoanDisbursementDate": disbursed,
+        "LoanMaturityDate": disbursed + pd.Timedelta(days=365),
+        "LoanStatus": rng.choice(_enumerated(table, "LoanStatus"), size=count),
+        "AuctionStatus": rng.choice(_enumerated(table, "AuctionStatus"), size=count),
+        "LoanAmount": loan_amount,
+        "OutstandingAmount": outstanding,
+        "NPA": rng.choice(_enumerated(table, "NPA"), size=count),
+    }, columns=LOAN_COLUMNS)
+
+
+def generate_payments(rng, loans, first_receipt, schema, skew=2.6, max_per_loan=60, unpaid_share=0.001):
+    """Payment rows for the given loans
+
+    Transactions per loan follow a Zipf distribution (most loans have one
+    or two, a few have dozens). Each loan's first transaction is its
+    disbursement; a small share of loans has no payments at all.
+    """
+    table = schema[PAYMENT_SUMMARY_TABLE]
+    per_loan = np.minimum(rng.zipf(skew, size=len(loans)), max_per_loan)
+    per_loan[rng.random(len(loans)) < unpaid_share] = 0
+    loan_index = np.repeat(np.arange(len(loans)), per_loan)
+    count = len(loan_index)
+    # Position of each row within its loan's transactions
+    position = np.arange(count) - np.repeat(np.cumsum(per_loan) - per_loan, per_loan)
+
+    later_types = [value for value in _enumerated(table, "TransactionType") if value != "Disbursement"]
+    transaction_type = np.where(position == 0, "Disbursement", _skewed_choice(rng, later_types, count, 0.3))
+    loan_amount = loans["LoanAmount"].to_numpy()[loan_index]
+    transaction_amount = np.where(
+        position == 0, loan_amount, np.round(loan_amount * rng.uniform(0.02, 0.5, size=count), 2)
+    )
+    return pd.DataFrame({
+        "ReceiptId": np.arange(first_receipt, first_receipt + count),
+        "LoanId": loans["LoanId"].to_numpy()[loan_index],
+        "TransactionType": transaction_type,
+        "PaymentMode": _skewed_choice(rng, _enumerated(table, "PaymentMode"), count, 0.9),
+        "TransactionAmount": transaction_amount,
+        "NPA": rng.choice(_enumerated(table, "NPA"), size=count),
+    }, columns=PAYMENT_COLUMNS)
+
+
+def generate_chunks(n_loans, seed=0, chunk_loans=CHUNK_LOANS, schema=None, **payment_options):
+    """Yield (loan_df, payment_df) chunks for n_loans loans
+
+    Each chunk has its own random stream derived from the seed, so the
+    output is reproducible for a given seed and chunk size.
+    """
+    schema = schema or load_schema()
+    schemes = load_schemes(schema)
+    next_receipt = 1
+    for chunk_index, start in enumerate(range(0, n_loans, chunk_loans)):
+        rng = np.random.default_rng([seed, chunk_index])
+        loans = generate_loans(rng, start, min(chunk_loans, n_loans - start), schema, schemes)
+        payments = generate_payments(rng, loans, next_receipt, schema, **payment_options)
+        next_receipt += len(payments)
+        yield loans, payments
+
+
+def generate_datasets(n_loans, seed=0, schema=None, **payment_options):
+    """Generate both datasets in memory"""
+    chunks = list(generate_chunks(n_loans, seed, schema=schema, **payment_options))
+    loan_df = pd.concat([loans for loans, _ in chunks], ignore_index=True)
+    payment_df = pd.concat([payments for _, payments in chunks], ignore_index=True)
+    return loan_df, payment_df
+
+
+def write_datasets(out_dir, n_loans, seed=0, chunk_loans=CHUNK_LOANS, **payment_options):
+    """Stream generated datasets to customer_summary.csv and payment_summary.csv in out_dir
+
+    Returns the two paths and the row counts. The payment file starts
+    with a UTF-8 BOM like the real export.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    loan_path = os.path.join(out_dir, "customer_summary.csv")
+    payment_path = os.path.join(out_dir, "payment_summary.csv")
+    loan_rows = payment_rows = 0
+    with open(loan_path, "w", newline="", encoding="utf-8") as loan_file, \
+            open(payment_path, "w", newline="", encoding="utf-8-sig") as payment_file:
+        for chunk_index, (loans, payments) in enumerate(
+            generate_chunks(n_loans, seed, chunk_loans, **payment_options)
+        ):
+            loans.to_csv(loan_file, index=False, header=chunk_index == 0, date_format="%Y-%m-%d %H:%M:%S")
+            payments.to_csv(payment_file, index=False, header=chunk_index == 0)
+            loan_rows += len(loans)
+            payment_rows += len(payments)
+    return {"loan_path": loan_path, "payment_path": payment_path,
+            "loan_rows": loan_rows, "payment_rows": payment_rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate schema-consistent loan and payment CSVs")
+    parser.add_argument("--loans", type=int, default=100_000)
+    parser.add_argument("--out", default="csv/synthetic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--payment-skew", type=float, default=2.6, help="Zipf exponent of transactions per loan")
+    args = parser.parse_args()
+    written = write_datasets(args.out, args.loans, args.seed, skew=args.payment_skew)
+    print(f"{written['loan_rows']:,} loans -> {written['loan_path']}")
+    print(f"{written['payment_rows']:,} payments -> {written['payment_path']}")
@@ -1,14 +1,35 @@
 import os
-import sys
+import re
+import time
 import pandas as pd
 import json
+import matplotlib
+# Headless backend, set before pyplot loads; the forked execution workers inherit it
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from pathlib import Path
 from dotenv import load_dotenv
-from io import StringIO
-import contextlib
 import locale
-from crew.crew_orchestrator import run_analysis
+from crew.crew_orchestrator import crew_pool, run_analysis, warm_up_crews
+from data.dataset_profile import profile_frame
+from data.dataset_store import DatasetStore, DatasetWatcher
+from data.out_of_core import ChunkedTable
+from services.result_cache import ResultCache
+from services.code_templates import TemplateLibrary, build_vocabulary
+from services.intent_router import IntentRouter
+from services.charts import CHART_FORMATS, ChartRenderer
+from services.currency_format import format_frame, format_inr
+from services.event_stream import MAX_EVENT_TEXT_CHARS, EventStream, emit, format_sse, streaming
+from services.execution_pool import ExecutionPool
+from services.prompt_context import PromptContextBuilder
+from services.result_store import RESULT_PAGE_ROWS, AnalysisResult, ResultStore, result_id_for
+from services.result_formats import (
+    ARROW_STREAM_MEDIA_TYPE, JSON_MEDIA_TYPE, PARQUET_MEDIA_TYPE, arrow_stream, json_bytes, negotiate, parquet_bytes, to_arrow
+)
+from services.metrics import REQUEST_SECONDS, record_stage, render_prometheus, span, start_trace
+from data.schema_dtypes import (
+    CUSTOMER_SUMMARY_TABLE, PAYMENT_SUMMARY_TABLE, align_loan_key, load_schema, read_appended_rows, read_typed_csv
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,147 +38,55 @@ load_dotenv()
 CUSTOMER_SUMMARY_PATH = "csv/customer_summary.csv"
 PAYMENT_SUMMARY_PATH = "csv/payment_summary.csv"
 
+# "memory" loads both tables; "chunked" streams the payment table out of core
+DATASET_MODE = os.getenv("DATASET_MODE", "memory")
+
 # Set Indian locale for number formatting (if available)
 try:
     locale.setlocale(locale.LC_MONETARY, 'en_IN')
 except:
     pass  # Fall back to default if Indian locale not available
 
-# Create a capture context for capturing print output
-@contextlib.contextmanager
-def capture_output():
-    new_out, new_err = StringIO(), StringIO()
-    old_out, old_err = sys.stdout, sys.stderr
-    try:
-        sys.stdout, sys.stderr = new_out, new_err
-        yield sys.stdout, sys.stderr
-    finally:
-        sys.stdout, sys.stderr = old_out, old_err
-
-# Note: This function is currently unused but kept for potential future use
 def format_indian_currency(amount):
-    """Format amount in Indian currency format (₹xx,xx,xxx.xx)"""
-    try:
-        # Convert to float first
-        amount = float(amount)
-        
-        # Get integer and decimal parts
-        integer_part = int(amount)
-        decimal_part = int(round((amount - integer_part) * 100))
-        
-        # Format the integer part with commas for Indian format
-        s = str(integer_part)
-        result = s[-3:]
-        s = s[:-3]
-        
-        # Add commas for thousands and beyond
-        i = 0
-        while s:
-            if i % 2 == 0:
-                result = s[-2:] + "," + result if len(s[-2:]) == 2 else s[-1:] + "," + result
-            else:
-                result = s[-2:] + "," + result if len(s[-2:]) == 2 else s[-1:] + "," + result
-            s = s[:-2]
-            i += 1
-        
-        # Remove leading comma if present
-        if result.startswith(","):
-            result = result[1:]
-            
-        # Add decimal part and ₹ symbol
-        if decimal_part:
-            return f"₹{result}.{decimal_part:02d}"
-        else:
-            return f"₹{result}"
-    except:
-        return f"₹{amount}"  # Fallback for any errors
+    """Format amount in Indian currency format (₹xx,xx,xxx.xx)
 
-def execute_analysis_code(code_str):
-    """Execute the analysis code and capture both results and printed output"""
-    try:
-        # Create a local namespace for execution
-        local_vars = {}
-        
-        # Capture printed output during execution
-        with capture_output() as (out, err):
-            # Execute the code
-            exec(code_str, globals(), local_vars)
-        
-        # Get the printed output
-        output = out.getvalue()
-        
-        # Get the dataframe or series results
-        results = {}
-        for var_name, var_value in local_vars.items():
-            if isinstance(var_value, (pd.DataFrame, pd.Series)):
-                results[var_name] = var_value
-        
-        # If there are no dataframe/series results but there is printed output,
-        # return the printed output as the main result
-        if not results and output:
-            return {"output": output}
-        
-        # Otherwise return both results and output
-        results["output"] = output
-        return results
-    except Exception as e:
-        return {"error": str(e)}
+    Scalar wrapper over format_inr(); format whole columns with format_inr()
+    or format_frame() instead of calling this per value.
+    """
+    formatted = format_inr([amount])[0]
+    return formatted if formatted is not None else f"₹{amount}"
+
+def run_generated_code(code_str, version=None):
+    """Run generated code on the execution pool, timed as the code_execution stage"""
+    emit("code", code=code_str)
+    with span("code_execution"):
+        execution = execution_pool.run(code_str, version=version)
+    emit("execution", ok=execution.ok, error=execution.error, output=execution.output[:MAX_EVENT_TEXT_CHARS],
+         duration_ms=execution.duration_ms)
+    if execution.figures:
+        # Drawn in the background; the pickled figures are not needed after this
+        chart_ids = chart_renderer.submit(execution.figures)
+        execution.figures = [{"id": chart_id} for chart_id in chart_ids]
+        emit("charts", chart_ids=chart_ids)
+    return execution
+
+def execute_analysis_code(code_str, version=None):
+    """Execute the analysis code in an isolated worker and capture both results and printed output"""
+    return run_generated_code(code_str, version).to_dict()
 
 def get_dataset_info(df):
-    """Get dynamic information about the dataset"""
-    info = {}
+    """Get dynamic information about the dataset
+
+    Requests should use dataset_store.profile(), which is computed once per
+    dataset version; this profiles an arbitrary frame on demand.
+    """
     try:
-        # Basic info
-        info['rows'] = len(df)
-        info['columns'] = list(df.columns)
-        
-        # Numeric columns
-        info['numeric_columns'] = df.select_dtypes(include=['number']).columns.tolist()
-        
-        # Categorical columns
-        info['categorical_columns'] = df.select_dtypes(include=['object', 'category']).columns.tolist()
-        
-        # Date columns (heuristic)
-        date_columns = []
-        for col in df.columns:
-            if 'date' in col.lower() or 'time' in col.lower():
-                date_columns.append(col)
-        info['date_columns'] = date_columns
-        
-        # Missing values
-        info['missing_values'] = df.isnull().sum().to_dict()
-        
-        # Column types
-        info['column_types'] = {col: str(dtype) for col, dtype in df.dtypes.items()}
-        
-        # Sample statistics for numeric columns
-        info['statistics'] = {}
-        for col in info['numeric_columns']:
-            try:
-                info['statistics'][col] = {
-                    'min': float(df[col].min()),
-                    'max': float(df[col].max()),
-                    'mean': float(df[col].mean()),
-                    'median': float(df[col].median()),
-                    'std': float(df[col].std())
-                }
-            except:
-                pass  # Skip columns that can't be summarized
-                
-        # Unique values for categorical columns (if not too many)
-        info['unique_values'] = {}
-        for col in info['categorical_columns']:
-            try:
-                unique_vals = df[col].unique().tolist()
-                if len(unique_vals) <= 10:  # Only if there aren't too many unique values
-                    info['unique_values'][col] = unique_vals
-            except:
-                pass
-    
+        return profile_frame(df)
     except Exception as e:
-        info['error'] = str(e)
-    
-    return info
+        return {'error': str(e)}
+
+# A $ sign in front of an amount
+DOLLAR_AMOUNT_PATTERN = re.compile(r"\$(?=\s?\d)")
 
 def format_output(result):
     """Format the analysis results in a concise, report-style format"""
@@ -170,65 +99,307 @@ def format_output(result):
     formatted_result = formatted_result.replace("## Task:", "")
     formatted_result = formatted_result.replace("## Thought:", "")
     
-    # Fix any $ symbols to ₹
-    formatted_result = formatted_result.replace("$", "₹")
+    # Fix $ amounts to ₹, leaving other uses of $ alone
+    formatted_result = DOLLAR_AMOUNT_PATTERN.sub("₹", formatted_result)
     
     return formatted_result
 
-def load_datasets():
+def load_datasets(customer_summary_path=CUSTOMER_SUMMARY_PATH, payment_summary_path=PAYMENT_SUMMARY_PATH):
     """Load all required datasets"""
     try:
-        # Load main loan data
-        loan_df = pd.read_csv(CUSTOMER_SUMMARY_PATH)
+        # Column dtypes are compiled from the views schema
+        schema = load_schema()
+        
+        # Load main loan data (served from the columnar cache when unchanged)
+        loan_df = read_typed_csv(customer_summary_path, CUSTOMER_SUMMARY_TABLE, schema)
+        
+        if DATASET_MODE == "chunked":
+            # Payments are streamed in chunks instead of being held in memory
+            return loan_df, ChunkedTable(payment_summary_path, PAYMENT_SUMMARY_TABLE, schema, encoding="utf-8-sig")
         
-        # Load payment data
-        payment_df = pd.read_csv(PAYMENT_SUMMARY_PATH)
+        # Load payment data (the file starts with a UTF-8 BOM)
+        payment_df = read_typed_csv(payment_summary_path, PAYMENT_SUMMARY_TABLE, schema, encoding="utf-8-sig")
         
-        return loan_df, payment_df
+        # Share LoanId codes between the frames so joins stay categorical
+        return align_loan_key(loan_df, payment_df)
     except Exception as e:
         print(f"Error loading datasets: {str(e)}")
         return None, None
 
+def read_new_payments(offset):
+    """Payment rows appended to the payment CSV after a byte offset"""
+    return read_appended_rows(PAYMENT_SUMMARY_PATH, PAYMENT_SUMMARY_TABLE, offset, encoding="utf-8-sig")
+
+# Shared in-process store so each query reuses the already parsed DataFrames
+dataset_store = DatasetStore(
+    load_datasets, [CUSTOMER_SUMMARY_PATH, PAYMENT_SUMMARY_PATH],
+    payment_path=PAYMENT_SUMMARY_PATH, read_payment_rows=read_new_payments
+)
+
+# Swaps in a new snapshot in the background when the CSVs change
+dataset_watcher = DatasetWatcher(dataset_store)
+
+def execution_namespace(version=None):
+    """Globals for generated code: this module's names plus the frames of a dataset version"""
+    snapshot = dataset_store.snapshot(version) or dataset_store.current()
+    return {**globals(), **snapshot.namespace()}
+
+# Pre-forked workers running generated code; re-forked for dataset versions they do not hold
+execution_pool = ExecutionPool(
+    execution_namespace, version=lambda: dataset_store.version, live_versions=dataset_store.live_versions
+)
+
+# Loading instructions passed to the crew; the frames are injected, not re-read
+LOADING_INSTRUCTIONS = """
+    loan_df and payment_df are already loaded as pandas DataFrames
+    (loan_df from customer_summary.csv, payment_df from payment_summary.csv).
+    Use them directly; do not call pd.read_csv.
+    Enumerated columns (e.g. BranchName, SchemeName, PaymentMode) and LoanId are
+    categoricals, and NPA/AuctionStatus are nullable booleans (compare with True/False).
+    loan_cube holds precomputed loan aggregates: loan_cube.rollup(dimensions, filters=None)
+    groups by any subset of BranchName, SchemeName, CustomerType, BorrowerType, LoanStatus
+    and NPA (filters maps a dimension to a value or list) and returns count, sum_LoanAmount,
+    mean_LoanAmount, sum_OutstandingAmount and mean_OutstandingAmount. Prefer it over
+    grouping loan_df for those sums, counts and means.
+    For loan-to-payment questions do not merge the frames yourself:
+    - payments_by_loan is payment_df indexed and sorted by LoanId (payments_by_loan.loc[[loan_id]])
+    - loan_payment_summary is indexed by LoanId with transaction_count, total_amount,
+      first_receipt, last_receipt, type_<TransactionType> and mode_<PaymentMode> totals
+    - loans_with_payments is loan_df with the loan_payment_summary columns already joined on
+    For rupee amounts call format_inr(series, abbreviate=False) (lakh/crore grouping, ₹ prefix,
+    "12.35 L"/"1.20 Cr" when abbreviated) or format_frame(df) on the final table; do not
+    format values one at a time with apply or loops.
+    """
+
+# Replaces the payment_df parts of LOADING_INSTRUCTIONS in out-of-core mode
+CHUNKED_LOADING_INSTRUCTIONS = """
+    The payment data is too large to load: payment_df and payments_by_loan do NOT exist.
+    Use payment_table, which streams payment_summary.csv in chunks:
+    - payment_table.aggregate({"name": (column, function)}, by=[columns], filters={column: value})
+      returns a DataFrame; functions are size, count, sum, mean, min, max, median,
+      p90/p95/p99 (approximate quantiles) and nunique (approximate distinct count)
+    - for anything else loop over payment_table.chunks(columns=[...]) and combine the
+      per-chunk results; never concatenate all chunks into one DataFrame
+    loan_payment_summary and loans_with_payments are still available as described.
+    """
+
+if DATASET_MODE == "chunked":
+    LOADING_INSTRUCTIONS = LOADING_INSTRUCTIONS.replace(
+        "loan_df and payment_df are already loaded as pandas DataFrames\n"
+        "    (loan_df from customer_summary.csv, payment_df from payment_summary.csv).",
+        "loan_df is already loaded as a pandas DataFrame (from customer_summary.csv)."
+    ).replace(
+        "    - payments_by_loan is payment_df indexed and sorted by LoanId (payments_by_loan.loc[[loan_id]])\n", ""
+    ) + CHUNKED_LOADING_INSTRUCTIONS
+
+# Persistent cache of crew results keyed on the query and dataset version
+result_cache = ResultCache()
+
+# Successful generated code, parameterised and keyed on query shape
+template_library = TemplateLibrary()
+
+# Compact schema-and-profile description given to the Code Generator, one per snapshot
+prompt_context = PromptContextBuilder()
+
+# Recent answers split into parts, with their tables paged out on request
+result_store = ResultStore()
+
+# Figures from executed code, drawn off the request path into a content-addressed cache
+chart_renderer = ChartRenderer()
+
+# Usage metrics reported for queries answered without the crew
+NO_LLM_METRICS = {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0, "successful_requests": 0}
+
+# Router over the latest snapshot's frames, rebuilt when the dataset version changes
+_intent_router = (None, None)
+
+def get_intent_router(snapshot):
+    """Return the intent router for a dataset snapshot"""
+    global _intent_router
+    version, router = _intent_router
+    if router is None or version != snapshot.version:
+        router = IntentRouter(load_schema(), {
+            CUSTOMER_SUMMARY_TABLE: snapshot.loan_df,
+            PAYMENT_SUMMARY_TABLE: snapshot.payment_df,
+        }, cube=snapshot.loan_cube)
+        _intent_router = (snapshot.version, router)
+    return router
+
+def run_router(user_query, snapshot, tables=None):
+    """Answer the query with a local pandas fast path; returns the result text or None
+
+    The answer's table is also put in tables when given.
+    """
+    try:
+        answer = get_intent_router(snapshot).answer(user_query)
+    except Exception as e:
+        # A fast path must never fail a query the crew could still answer
+        print(f"Intent router failed, falling back to the crew: {str(e)}")
+        return None
+    if answer is None:
+        return None
+    title, table = answer
+    if tables is not None:
+        tables["result"] = table
+    return f"{title}\n\n{table.to_string(index=False)}"
+
+def render_execution(execution):
+    """Render execute_analysis_code() results as the plain text the crew would return"""
+    parts = [execution.get("output", "")]
+    if "result" in execution:
+        parts.append(str(execution["result"]))
+    return "\n".join(part for part in parts if part)
+
+def run_template(user_query, vocabulary, version=None, tables=None, charts=None):
+    """Run a stored template matching the query; returns the result text or None
+
+    The frames and chart ids the code produced are also put in tables and
+    charts when given.
+    """
+    matched = template_library.match(user_query, vocabulary)
+    if matched is None:
+        return None
+    shape, code = matched
+    execution = execute_analysis_code(code, version)
+    template_library.record_result(shape, "error" not in execution)
+    if "error" in execution:
+        return None
+    if tables is not None:
+        tables.update((name, value) for name, value in execution.items() if isinstance(value, (pd.DataFrame, pd.Series)))
+    if charts is not None:
+        charts.extend(execution.get("charts", []))
+    return render_execution(execution)
+
+def current_snapshot():
+    """The dataset snapshot a new request should use"""
+    if not dataset_watcher.running:
+        # Without the background watcher, pick up changed CSVs on the request path
+        dataset_store.refresh_if_stale()
+    return dataset_store.current()
+
+def run_cached_analysis(user_query, snapshot=None):
+    """Serve a query from the intent router, the result cache, a code template or the crew
+
+    Every step uses the same dataset snapshot, even if a newer one is
+    swapped in meanwhile. Returns (result, metrics, served_by) where
+    served_by names the path used. The answer is also kept in result_store,
+    split into parts, under result_id_for(user_query, snapshot.version).
+    """
+    snapshot = snapshot or current_snapshot()
+    tables, charts = {}, []
+    result, metrics, served_by = serve_analysis(user_query, snapshot, tables, charts)
+    result_id = result_id_for(user_query, snapshot.version)
+    # A cache hit keeps the tables stored when the answer was computed
+    if metrics and (served_by != "cache" or result_store.get(result_id) is None):
+        result_store.put(AnalysisResult(result_id, result, tables, charts))
+    return result, metrics, served_by
+
+def serve_analysis(user_query, snapshot, tables, charts):
+    """The steps of run_cached_analysis(); frames and chart ids behind the answer are put in tables and charts"""
+    # A new version also retires the cache entries of older ones
+    dataset_version = snapshot.version
+    
+    # Plain aggregations are answered locally without any LLM call
+    with span("intent_router"):
+        result = run_router(user_query, snapshot, tables)
+    if result is not None:
+        return result, dict(NO_LLM_METRICS), "router"
+    
+    with span("result_cache"):
+        cached = result_cache.get(user_query, dataset_version)
+    if cached is not None:
+        result, metrics = cached
+        return result, metrics, "cache"
+    
+    with span("code_template"):
+        vocabulary = build_vocabulary(*snapshot.sample_frames())
+        result = run_template(user_query, vocabulary, dataset_version, tables, charts)
+    if result is not None:
+        metrics = dict(NO_LLM_METRICS)
+        result_cache.put(user_query, dataset_version, result, metrics)
+        return result, metrics, "template"
+    
+    # The last code the interpreter ran successfully is the final analysis code
+    successful_code = []
+
+    def executor(code):
+        return run_generated_code(code, dataset_version)
+
+    def on_execution(execution):
+        # The tables and charts of the last successful run that is part of the answer
+        tables.clear()
+        tables.update(execution.tables)
+        charts[:] = [figure["id"] for figure in execution.figures]
+
+    emit("crew_started", query=user_query)
+    result, metrics = run_analysis(
+        user_query, LOADING_INSTRUCTIONS, snapshot.namespace(), successful_code.append,
+        executor=executor, dataset_context=prompt_context.context(snapshot), on_execution=on_execution
+    )
+    # Failed runs return an error string and no metrics; never cache those
+    if metrics:
+        result_cache.put(user_query, dataset_version, result, metrics)
+        if successful_code:
+            template_library.harvest(user_query, successful_code[-1], vocabulary)
+    return result, metrics, "crew"
+
+# Example queries shown by main(); also the benchmark query corpus
+EXAMPLE_QUERIES = [
+    "Analyze loan distribution by customer type and branch",
+    "Find the average loan amount by scheme",
+    "Compare loan status patterns by branch",
+    "Identify NPA patterns across different branches",
+    "Analyze relationships between loan details and payment behavior",
+]
+
 def main():
     # Load datasets
-    loan_df, payment_df = load_datasets()
-    if loan_df is None or payment_df is None:
+    if not dataset_store.load():
         print("Failed to load datasets. Exiting...")
         return
     
     # Show example queries
     print("\nExample queries you can try:")
-    print("1. Analyze loan distribution by customer type and branch")
-    print("2. Find the average loan amount by scheme")
-    print("3. Compare loan status patterns by branch")
-    print("4. Identify NPA patterns across different branches") 
-    print("5. Analyze relationships between loan details and payment behavior")
+    for number, example_query in enumerate(EXAMPLE_QUERIES, 1):
+        print(f"{number}. {example_query}")
     
     # Get user query
     user_query = input("\nEnter your analysis query: ")
     
-    # Create loading instructions
-    loading_instructions = f"""
-    loan_df = pd.read_csv('{CUSTOMER_SUMMARY_PATH}')
-    payment_df = pd.read_csv('{PAYMENT_SUMMARY_PATH}')
-    """
-    
-    # Run the analysis using the crew orchestrator
-    result = run_analysis(user_query, loading_instructions)
+    # Run the analysis using the crew orchestrator (or the result cache)
+    result, metrics, served_by = run_cached_analysis(user_query)
     print("\nAnalysis Results:")
     print(result)
 
 # --- FastAPI Implementation ---
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 import uvicorn
-import re
+import asyncio
+from services.job_queue import JobQueue, QueueFullError
 
 app = FastAPI()
 
 class QueryRequest(BaseModel):
     query: str
+    # Include the per-stage timings and token counts in the response
+    debug: bool = False
+    # Return the answer as parts with the first page of each table instead of one string
+    structured: bool = False
+    # Table sent when the client accepts Arrow or Parquet; "result" or the first table by default
+    table: Optional[str] = None
+
+@app.middleware("http")
+async def mark_request_start(request: Request, call_next):
+    # Lets handlers measure how long request parsing and validation took
+    request.state.received_at = time.perf_counter()
+    return await call_next(request)
+
+def parsing_seconds(http_request):
+    received_at = getattr(http_request.state, "received_at", None)
+    return time.perf_counter() - received_at if received_at is not None else None
 
 def wrap_result(result, user_query):
     # Try to extract html, summary, and insights from the result
@@ -258,35 +429,278 @@ def wrap_result(result, user_query):
         }
     }
 
+def analyze_query(user_query, debug=False, parse_seconds=None, structured=False, stream=None):
+    """Run one analysis and build the /analyze response body
+
+    Progress events are sent to stream (an EventStream) when given.
+    """
+    start_time = time.perf_counter()
+    with start_trace() as trace, streaming(stream):
+        if parse_seconds is not None:
+            record_stage("request_parsing", parse_seconds)
+        # Pin the snapshot so the response reports the version it was computed from
+        snapshot = current_snapshot()
+        result, metrics, served_by = run_cached_analysis(user_query, snapshot)
+        with span("response_formatting"):
+            # Comment out the current response formatting logic
+            # wrapped = wrap_result(result, user_query)
+            # return {"result": wrapped}
+            # Return the raw output from the Code Executor
+            response = {
+                "result": result,
+                "served_by": served_by,
+                "dataset_version": snapshot.version,
+            }
+            stored = result_store.get(result_id_for(user_query, snapshot.version)) if metrics else None
+            if stored is not None:
+                response["result_id"] = stored.result_id
+                if structured:
+                    response["result"] = stored.overview()
+    elapsed = time.perf_counter() - start_time
+    REQUEST_SECONDS.observe(elapsed, served_by=served_by)
+    response["elapsed_ms"] = round(elapsed * 1000, 1)
+    if debug:
+        response["debug"] = {**trace.to_dict(), "usage_metrics": metrics}
+    return response
+
+# Bounded worker pool so long crew runs never block the event loop
+analysis_jobs = JobQueue(analyze_query)
+
+def error_response(status_code, error):
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "result": {
+                "status": "error",
+                "error": error,
+                "formatted_data": None
+            }
+        }
+    )
+
+@app.on_event("startup")
+def load_dataset_store():
+    # Parse the CSVs once per process instead of once per query
+    if not dataset_store.load():
+        print("Failed to load datasets at startup; they will be retried on first query")
+        return
+    # Profile once here rather than on the first query that needs it
+    dataset_store.profile()
+    # Fork the execution workers now so they share the loaded frames
+    execution_pool.start()
+    # Swap in new snapshots when the CSVs change instead of restarting the server
+    dataset_watcher.start()
+
+@app.on_event("startup")
+def warm_crew_pool():
+    # Build the reusable crews before the first request needs one
+    try:
+        warm_up_crews()
+    except Exception as e:
+        print(f"Crew warm-up failed; crews will be built on demand: {str(e)}")
+
 @app.get("/")
 def read_root():
     return {"message": "Gold Loan Analytics API is running."}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return {"results": result_cache.stats(), "templates": template_library.stats(), "stored_results": result_store.stats(),
+            "charts": chart_renderer.stats()}
+
+@app.get("/dataset/profile")
+def dataset_profile():
+    snapshot = dataset_store.current()
+    return {"version": snapshot.version, "tables": snapshot.profile()}
+
+def stored_result(result_id):
+    result = result_store.get(result_id)
+    if result is None:
+        raise LookupError(f"Unknown or expired result {result_id}")
+    return result
+
+def json_response(body, http_request, status_code=200):
+    """JSON body, gzipped when the client accepts it"""
+    data, encoding = json_bytes(body, http_request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=data, status_code=status_code, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+def table_response(result, name, result_format, rows=None):
+    """A stored result table as an Arrow IPC stream or a Parquet file
+
+    Numbers go out in their binary form rather than as text; the result
+    id, table name and the answer's other tables travel in headers.
+    """
+    rows = result.tables[name] if rows is None else rows
+    table = to_arrow(rows, {"result_id": result.result_id, "table": name})
+    headers = {
+        "Vary": "Accept",
+        "X-Result-Id": result.result_id,
+        "X-Table-Name": name,
+        "X-Tables": ",".join(result.tables),
+        "X-Total-Rows": str(len(result.tables[name])),
+    }
+    if result_format == "arrow":
+        return StreamingResponse(arrow_stream(table), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+    return Response(content=parquet_bytes(table), media_type=PARQUET_MEDIA_TYPE,
+                    headers={**headers, "Content-Disposition": f'attachment; filename="{name}.parquet"'})
+
+def negotiated_response(body, http_request, table=None):
+    """An /analyze body as JSON, or its answer's table as Arrow or Parquet when the Accept header asks
+
+    Answers without tables (or not stored) fall back to JSON.
+    """
+    result_format = negotiate(http_request.headers.get("accept"))
+    stored = result_store.get(body.get("result_id")) if result_format != "json" and body.get("result_id") else None
+    if stored is not None:
+        try:
+            name = stored.primary_table(table)
+        except KeyError:
+            return error_response(404, f"Result {stored.result_id} has no table {table}")
+        if name is not None:
+            return table_response(stored, name, result_format)
+    return json_response(body, http_request)
+
+@app.get("/results/{result_id}")
+def result_overview(result_id: str, page_rows: int = RESULT_PAGE_ROWS, formatted: bool = False):
+    """Summary, insights, chart ids and the first page of each table of a stored answer"""
+    try:
+        return stored_result(result_id).overview(page_rows, formatted)
+    except LookupError as e:
+        return error_response(404, str(e))
+
+@app.get("/results/{result_id}/tables/{name}")
+def result_table_page(result_id: str, name: str, http_request: Request, cursor: str = None, limit: int = None,
+                      formatted: bool = False, format: str = None):
+    """One page of a result table; follow next_cursor for the rest
+
+    With Accept (or format) set to Arrow or Parquet the rows from the
+    cursor are sent in one binary response, all of them unless limited.
+    """
+    try:
+        result_format = negotiate(http_request.headers.get("accept"), format)
+        result = stored_result(result_id)
+        if result_format == "json":
+            return json_response(result.page(name, cursor, limit or RESULT_PAGE_ROWS, formatted), http_request)
+        return table_response(result, name, result_format, result.rows(name, cursor, limit))
+    except LookupError as e:
+        return error_response(404, str(e))
+    except ValueError as e:
+        return error_response(400, str(e))
+
+@app.get("/results/{result_id}/text")
+def result_text(result_id: str):
+    try:
+        return PlainTextResponse(stored_result(result_id).text)
+    except LookupError as e:
+        return error_response(404, str(e))
+
+@app.get("/charts/{chart_id}")
+def chart(chart_id: str, format: str = "png"):
+    """A rendered chart by id, waiting for its render if it is still in progress"""
+    try:
+        data = chart_renderer.get(chart_id, format)
+    except ValueError as e:
+        return error_response(400, str(e))
+    if data is None:
+        return error_response(404, f"Unknown chart {chart_id}")
+    # Content-addressed, so the bytes behind an id never change
+    return Response(content=data, media_type=CHART_FORMATS[format],
+                    headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.on_event("shutdown")
+def stop_analysis_jobs():
+    dataset_watcher.stop()
+    analysis_jobs.shutdown()
+    execution_pool.shutdown()
+    chart_renderer.shutdown()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Per-stage latency and token histograms in the Prometheus text format"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/analyze")
-async def analyze(request: QueryRequest):
-    user_query = request.query
-    loading_instructions = f"""
-    loan_df = pd.read_csv('{CUSTOMER_SUMMARY_PATH}')
-    payment_df = pd.read_csv('{PAYMENT_SUMMARY_PATH}')
+async def analyze(request: QueryRequest, http_request: Request):
+    # Run on the worker pool and wait without blocking other requests
+    try:
+        job = analysis_jobs.submit(
+            request.query, request.debug, parsing_seconds(http_request), request.structured
+        )
+    except QueueFullError as e:
+        return error_response(429, str(e))
+    await asyncio.wrap_future(job.future)
+    if job.status == "failed":
+        return error_response(500, job.error)
+    # Converting a large table is CPU work; keep it off the event loop
+    return await asyncio.to_thread(negotiated_response, job.result, http_request, request.table)
+
+@app.post("/analyze/stream")
+async def analyze_stream(request: QueryRequest, http_request: Request):
+    """Run an analysis and stream its progress as server-sent events
+
+    Events: accepted, crew_started, tool_call, code, execution, local_repair,
+    repair_requested, tool_result, agent_finish, task_completed, then result
+    (the /analyze response body) or error.
     """
+    stream = EventStream(asyncio.get_running_loop())
     try:
-        result, metrics = run_analysis(user_query, loading_instructions)
-        # Comment out the current response formatting logic
-        # wrapped = wrap_result(result, user_query)
-        # return {"result": wrapped}
-        # Return the raw output from the Code Executor
-        return {"result": result}
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={
-                "result": {
-                    "status": "error",
-                    "error": str(e),
-                    "formatted_data": None
-                }
-            }
+        job = analysis_jobs.submit(
+            request.query, request.debug, parsing_seconds(http_request), request.structured, stream
+        )
+    except QueueFullError as e:
+        return error_response(429, str(e))
+    job.future.add_done_callback(lambda future: stream.close())
+
+    async def events():
+        # Sent at once so the client sees the request was taken before any model call
+        yield format_sse("accepted", {"job_id": job.id, "query": request.query})
+        async for event in stream.sse():
+            yield event
+        await asyncio.wrap_future(job.future)
+        if job.status == "failed":
+            yield format_sse("error", {"error": job.error})
+        else:
+            yield format_sse("result", job.result)
+
+    # No proxy buffering, or the events would arrive all at once at the end
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: QueryRequest, http_request: Request):
+    """Queue an analysis and return its job id for polling"""
+    try:
+        job = analysis_jobs.submit(
+            request.query, request.debug, parsing_seconds(http_request), request.structured
         )
+    except QueueFullError as e:
+        return error_response(429, str(e))
+    return job.to_dict()
+
+@app.get("/jobs/stats")
+def job_stats():
+    return {"jobs": analysis_jobs.stats(), "crews": crew_pool.stats()}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return error_response(404, f"Unknown job {job_id}")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str, http_request: Request, table: str = None):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return error_response(404, f"Unknown job {job_id}")
+    if not job.done:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    if job.status == "failed":
+        return error_response(500, job.error)
+    return negotiated_response({"job_id": job.id, **job.result}, http_request, table)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
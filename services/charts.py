@@ -0,0 +1,249 @@
+import hashlib
+import io
+import os
+import pickle
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Rendered figures, one file per content hash and format
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", ".cache/charts")
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+# Charts kept on disk; the least recently used, and any unused for the TTL, are deleted
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "500"))
+CHART_CACHE_TTL_SECONDS = int(os.getenv("CHART_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Formats rendered for every figure, with their media types
+CHART_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+CHART_DPI = 100
+
+
+def _update_array(digest, values):
+    try:
+        array = np.ascontiguousarray(np.asarray(values, dtype="float64"))
+        digest.update(str(array.shape).encode("utf-8"))
+        digest.update(array.tobytes())
+    except (TypeError, ValueError):
+        digest.update(repr(values).encode("utf-8"))
+
+
+def figure_digest(figure):
+    """Hash of what a figure draws: its size and every axis' data, labels, limits and texts
+
+    Two runs that plot the same data the same way get the same digest,
+    whatever objects or ids they went through.
+    """
+    digest = hashlib.sha1()
+    digest.update(repr(tuple(figure.get_size_inches())).encode("utf-8"))
+    for text in figure.texts:
+        digest.update(text.get_text().encode("utf-8"))
+    for axes in figure.axes:
+        digest.update(repr((axes.get_title(), axes.get_xlabel(), axes.get_ylabel(),
+                            axes.get_xlim(), axes.get_ylim(), axes.get_xscale(), axes.get_yscale())).encode("utf-8"))
+        for label in axes.get_xticklabels() + axes.get_yticklabels():
+            digest.update(label.get_text().encode("utf-8"))
+        for line in axes.get_lines():
+            _update_array(digest, line.get_xydata())
+            digest.update(repr((line.get_color(), line.get_linestyle(), line.get_marker(), line.get_label()))
+                          .encode("utf-8"))
+        for patch in axes.patches:
+            _update_array(digest, patch.get_path().vertices)
+            # Bars and wedges share one unit path; their placement is in the patch transform
+            _update_array(digest, patch.get_patch_transform().get_matrix())
+            digest.update(repr(patch.get_facecolor()).encode("utf-8"))
+        for collection in axes.collections:
+            _update_array(digest, collection.get_offsets())
+            array = collection.get_array()
+            if array is not None:
+                _update_array(digest, array)
+        for image in axes.images:
+            _update_array(digest, image.get_array())
+        for text in axes.texts:
+            digest.update(text.get_text().encode("utf-8"))
+        legend = axes.get_legend()
+        if legend is not None:
+            for text in legend.get_texts():
+                digest.update(text.get_text().encode("utf-8"))
+    return digest.hexdigest()[:20]
+
+
+def capture_figures():
+    """Detach the figures the executed code left open in pyplot
+
+    Returns [{"id": digest, "figure": pickled Figure}] and closes them, so
+    no pyplot state carries over to the next execution. Called in the
+    execution worker; nothing is drawn here.
+    """
+    if "matplotlib.pyplot" not in sys.modules:
+        return []
+    plt = sys.modules["matplotlib.pyplot"]
+    figures = []
+    for number in plt.get_fignums():
+        figure = plt.figure(number)
+        # Closing first drops the pyplot manager, so unpickling never touches pyplot
+        plt.close(figure)
+        try:
+            figures.append({"id": figure_digest(figure), "figure": pickle.dumps(figure)})
+        except Exception as e:
+            print(f"Could not capture figure {number}: {str(e)}")
+    plt.close("all")
+    return figures
+
+
+def render_figure(figure_bytes, chart_format):
+    """Draw a pickled figure headless with the object-oriented backends (no pyplot)"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.backends.backend_svg import FigureCanvasSVG
+    figure = pickle.loads(figure_bytes)
+    canvas = FigureCanvasAgg(figure) if chart_format == "png" else FigureCanvasSVG(figure)
+    buffer = io.BytesIO()
+    canvas.print_figure(buffer, format=chart_format, dpi=CHART_DPI, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    """Render captured figures on a thread pool into a content-addressed cache
+
+    Figures are keyed on figure_digest(), so a chart already drawn (by any
+    request, or before a restart) is never drawn again. Each render uses
+    its own figure and canvas, never pyplot's global state. A file's
+    mtime records when the chart was last used; after each render the
+    cache is trimmed to max_entries charts and unused ones past the TTL
+    are deleted, as the result cache does.
+    """
+
+    def __init__(self, cache_dir=CHART_CACHE_DIR, max_workers=CHART_RENDER_WORKERS,
+                 max_entries=CHART_CACHE_MAX_ENTRIES, ttl_seconds=CHART_CACHE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chart")
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self.rendered = 0
+        self.cache_hits = 0
+        self.evicted = 0
+        # Clear what expired while the server was down
+        self.evict()
+
+    def _path(self, chart_id, chart_format):
+        return os.path.join(self.cache_dir, f"{chart_id}.{chart_format}")
+
+    def _cached(self, chart_id):
+        return all(os.path.exists(self._path(chart_id, chart_format)) for chart_format in CHART_FORMATS)
+
+    def _touch(self, chart_id):
+        """Mark a chart as just used, so eviction keeps it"""
+        for chart_format in CHART_FORMATS:
+            try:
+                os.utime(self._path(chart_id, chart_format))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """Delete charts unused for the TTL, then the least recently used beyond max_entries"""
+        with self._evict_lock:
+            try:
+                names = os.listdir(self.cache_dir)
+            except FileNotFoundError:
+                return 0
+            last_used = {}
+            for name in names:
+                chart_id, _, chart_format = name.partition(".")
+                if chart_format not in CHART_FORMATS:
+                    continue
+                try:
+                    mtime = os.path.getmtime(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                last_used[chart_id] = max(last_used.get(chart_id, 0.0), mtime)
+            with self._lock:
+                pending = set(self._pending)
+            # A chart being rendered is about to be used: it counts as the newest and is never deleted
+            for chart_id in pending & set(last_used):
+                last_used[chart_id] = float("inf")
+            by_recency = sorted(last_used, key=last_used.get, reverse=True)
+            cutoff = time.time() - self.ttl_seconds
+            stale = [chart_id for chart_id in by_recency[:self.max_entries] if last_used[chart_id] < cutoff]
+            stale += [chart_id for chart_id in by_recency[self.max_entries:] if chart_id not in pending]
+            for chart_id in stale:
+                for chart_format in CHART_FORMATS:
+                    try:
+                        os.remove(self._path(chart_id, chart_format))
+                    except FileNotFoundError:
+                        pass
+            with self._lock:
+                self.evicted += len(stale)
+            return len(stale)
+
+    def _render(self, chart_id, figure_bytes):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for chart_format in CHART_FORMATS:
+            path = self._path(chart_id, chart_format)
+            if os.path.exists(path):
+                continue
+            data = render_figure(figure_bytes, chart_format)
+            # Write then rename so readers never see a partial file
+            partial = f"{path}.{threading.get_ident()}.tmp"
+            with open(partial, "wb") as f:
+                f.write(data)
+            os.replace(partial, path)
+        with self._lock:
+            self.rendered += 1
+        self.evict()
+
+    def submit(self, figures):
+        """Schedule rendering of captured figures; returns their chart ids at once"""
+        chart_ids = []
+        for captured in figures:
+            chart_id = captured["id"]
+            chart_ids.append(chart_id)
+            with self._lock:
+                if chart_id in self._pending:
+                    continue
+                if self._cached(chart_id):
+                    self.cache_hits += 1
+                    self._touch(chart_id)
+                    continue
+                future = self._executor.submit(self._render, chart_id, captured["figure"])
+                self._pending[chart_id] = future
+            future.add_done_callback(lambda _, chart_id=chart_id: self._done(chart_id))
+        return chart_ids
+
+    def _done(self, chart_id):
+        with self._lock:
+            future = self._pending.pop(chart_id, None)
+        if future is not None and future.exception() is not None:
+            print(f"Rendering chart {chart_id} failed: {str(future.exception())}")
+
+    def get(self, chart_id, chart_format="png", timeout=30):
+        """Rendered bytes of a chart, waiting for a render in progress; None if unknown"""
+        if chart_format not in CHART_FORMATS:
+            raise ValueError(f"Unsupported chart format {chart_format!r}; expected one of {list(CHART_FORMATS)}")
+        with self._lock:
+            future = self._pending.get(chart_id)
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception:
+                # A failed or slow render leaves no file; reported as missing below
+                pass
+        try:
+            with open(self._path(chart_id, chart_format), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Never rendered, or evicted
+            return None
+        self._touch(chart_id)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {"rendered": self.rendered, "cache_hits": self.cache_hits, "evicted": self.evicted,
+                    "pending": len(self._pending)}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,291 @@
+import ast
+import io
+import json
+import os
+import re
+import threading
+import time
+import tokenize
+from pathlib import Path
+import pandas as pd
+from services.result_cache import PROJECT_DIR, normalize_query
+
+# Where harvested templates are kept between restarts; a relative
+# CODE_TEMPLATES_PATH is taken from the project directory, not the cwd
+DEFAULT_CODE_TEMPLATES_PATH = ".cache/code_templates.json"
+
+# Templates that fail this many times in a row are dropped
+MAX_TEMPLATE_FAILURES = 2
+
+# Categorical columns with more values than this are not treated as query literals
+MAX_VOCABULARY_VALUES = 100
+
+# Columns whose values are identifiers rather than things users filter by
+EXCLUDED_VOCABULARY_COLUMNS = {"LoanId"}
+
+NUMBER_PATTERN = re.compile(r"(?<![\w.])\d{1,3}(?:,\d{2,3})+(?:\.\d+)?(?![\w.])|(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+
+
+def build_vocabulary(*frames):
+    """Collect the string values of low-cardinality categorical columns
+
+    These are the literals (branch codes, scheme names, payment modes, ...)
+    that are lifted out of queries and code as template parameters.
+    """
+    vocabulary = {}
+    for df in frames:
+        for column in df.columns:
+            if column in EXCLUDED_VOCABULARY_COLUMNS or not isinstance(df[column].dtype, pd.CategoricalDtype):
+                continue
+            categories = df[column].cat.categories
+            if len(categories) > MAX_VOCABULARY_VALUES:
+                continue
+            values = [value for value in categories if isinstance(value, str)]
+            if values:
+                vocabulary.setdefault(column, set()).update(values)
+    return {column: sorted(values) for column, values in vocabulary.items()}
+
+
+def _placeholder(name):
+    return f"__tpl_{name}__"
+
+
+def extract_parameters(query, vocabulary):
+    """Split a query into its shape and the literals it mentions
+
+    Returns (shape, params) where shape is the normalised query with each
+    literal replaced by a parameter name and params maps those names to the
+    literal values. Parameters of the same kind are numbered in the order
+    they appear in the query.
+    """
+    spans = []
+
+    def is_free(start, end):
+        return all(end <= s_start or start >= s_end for s_start, s_end, _, _ in spans)
+
+    # Longest values first so "ADJUST IN" wins over a shorter overlapping value
+    candidates = sorted(
+        ((value, column) for column, values in vocabulary.items() for value in values),
+        key=lambda item: -len(item[0]),
+    )
+    for value, column in candidates:
+        pattern = re.compile(rf"(?<!\w){re.escape(value)}(?!\w)", re.IGNORECASE)
+        for match in pattern.finditer(query):
+            if is_free(match.start(), match.end()):
+                spans.append((match.start(), match.end(), column.lower(), value))
+    for match in NUMBER_PATTERN.finditer(query):
+        if is_free(match.start(), match.end()):
+            text = match.group(0).replace(",", "")
+            value = float(text) if "." in text else int(text)
+            spans.append((match.start(), match.end(), "number", value))
+
+    params = {}
+    counters = {}
+    pieces = []
+    position = 0
+    for start, end, kind, value in sorted(spans):
+        index = counters.get(kind, 0)
+        counters[kind] = index + 1
+        name = f"{kind}_{index}"
+        params[name] = value
+        pieces.append(query[position:start])
+        pieces.append(f" param_{name} ")
+        position = end
+    pieces.append(query[position:])
+    return normalize_query("".join(pieces)), params
+
+
+def _literal_value(token):
+    """Value of a STRING or NUMBER token, or None if it is not a plain literal"""
+    try:
+        value = ast.literal_eval(token.string)
+    except (ValueError, SyntaxError):
+        return None
+    return value if isinstance(value, (str, int, float)) and not isinstance(value, bool) else None
+
+
+# Methods whose numeric arguments are thresholds, like the right side of a comparison
+FILTER_METHODS = {"between", "gt", "ge", "lt", "le", "eq", "ne", "clip"}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _numbers_only_in_filters(code, params):
+    """Whether each numeric parameter occurs exactly once in the code, as a comparison or filter operand
+
+    A number like 10 may also be a head(10), a round(x, 2) or a figsize;
+    rewriting those would change unrelated code when the template is reused.
+    """
+    numbers = [value for value in params.values() if _is_number(value)]
+    if not numbers:
+        return True
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    for value in numbers:
+        constants = [node for node in ast.walk(tree)
+                     if isinstance(node, ast.Constant) and _is_number(node.value) and node.value == value]
+        if len(constants) != 1:
+            return False
+        parent = parents.get(constants[0])
+        while isinstance(parent, ast.UnaryOp):
+            parent = parents.get(parent)
+        in_filter = isinstance(parent, ast.Compare) or (
+            isinstance(parent, ast.Call) and isinstance(parent.func, ast.Attribute) and parent.func.attr in FILTER_METHODS
+        )
+        if not in_filter:
+            return False
+    return True
+
+
+def parameterise_code(code, params):
+    """Replace every literal equal to a parameter value with its placeholder
+
+    Returns the template code, or None if a parameter never appears in the
+    code (the template would silently ignore new values for it), two
+    parameters share a value (the mapping would be ambiguous) or a number
+    is not used once as a filter threshold (see _numbers_only_in_filters).
+    """
+    if not _numbers_only_in_filters(code, params):
+        return None
+    by_value = {}
+    for name, value in params.items():
+        key = (type(value) is str, value)
+        if key in by_value:
+            return None
+        by_value[key] = name
+
+    line_offsets = [0]
+    for line in code.splitlines(keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    replacements = []
+    used = set()
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type not in (tokenize.STRING, tokenize.NUMBER):
+                continue
+            value = _literal_value(token)
+            if value is None:
+                continue
+            name = by_value.get((type(value) is str, value))
+            if name is None:
+                continue
+            start = line_offsets[token.start[0] - 1] + token.start[1]
+            end = line_offsets[token.end[0] - 1] + token.end[1]
+            replacements.append((start, end, _placeholder(name)))
+            used.add(name)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+
+    if used != set(params):
+        return None
+    for start, end, placeholder in reversed(replacements):
+        code = code[:start] + placeholder + code[end:]
+    return code
+
+
+def instantiate(template_code, params):
+    """Fill a template's placeholders with Python literals for the given values"""
+    code = template_code
+    for name, value in params.items():
+        code = code.replace(_placeholder(name), repr(value))
+    return code
+
+
+def code_templates_path():
+    """The configured template file, read when the library is first used so .env settings apply"""
+    path = Path(os.getenv("CODE_TEMPLATES_PATH", DEFAULT_CODE_TEMPLATES_PATH))
+    return path if path.is_absolute() else PROJECT_DIR / path
+
+
+class TemplateLibrary:
+    """Library of successful generated code keyed on query shape
+
+    A query like "NPA patterns in MH branch" has the shape
+    "npa patterns in param_branchname_0 branch"; any later query with the
+    same shape reuses the stored code with its own branch code filled in.
+    """
+
+    def __init__(self, path=None, max_failures=MAX_TEMPLATE_FAILURES):
+        # The file is read on first use, so creating the library touches no files
+        self.path = Path(path) if path else None
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._loaded = None
+
+    @property
+    def _templates(self):
+        """The stored templates, loaded on first use; called with the lock held"""
+        if self._loaded is None:
+            if self.path is None:
+                self.path = code_templates_path()
+            self._loaded = self._read()
+        return self._loaded
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._templates, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def match(self, query, vocabulary):
+        """Return (shape, code) for a stored template matching the query, or None"""
+        shape, params = extract_parameters(query, vocabulary)
+        with self._lock:
+            template = self._templates.get(shape)
+        if template is None or set(template["params"]) != set(params):
+            return None
+        return shape, instantiate(template["code"], params)
+
+    def harvest(self, query, code, vocabulary):
+        """Store successful code as a template for the query's shape; True if stored"""
+        shape, params = extract_parameters(query, vocabulary)
+        template_code = parameterise_code(code, params)
+        if template_code is None:
+            return False
+        with self._lock:
+            self._templates[shape] = {
+                "code": template_code,
+                "params": sorted(params),
+                "example_query": query,
+                "created_at": time.time(),
+                "uses": 0,
+                "failures": 0,
+            }
+            self._write()
+        return True
+
+    def record_result(self, shape, success):
+        """Track template outcomes, dropping templates that keep failing"""
+        with self._lock:
+            template = self._templates.get(shape)
+            if template is None:
+                return
+            if success:
+                template["uses"] += 1
+                template["failures"] = 0
+            else:
+                template["failures"] += 1
+                if template["failures"] >= self.max_failures:
+                    del self._templates[shape]
+            self._write()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "templates": len(self._templates),
+                "uses": sum(template["uses"] for template in self._templates.values()),
+            }
@@ -0,0 +1,156 @@
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from data.schema_dtypes import load_schema
+
+RUPEE = "₹"
+
+# (threshold, suffix) of the abbreviated form, largest first
+ABBREVIATIONS = [(10 ** 7, " Cr"), (10 ** 5, " L")]
+
+# Derived columns (sum_LoanAmount, total_amount, TransactionAmount_mean, ...) are monetary too
+MONETARY_NAME_PATTERN = re.compile(r"amount|outstanding|principal|balance", re.IGNORECASE)
+
+# Ratios and counts derived from monetary columns are not amounts
+NON_MONETARY_NAME_PATTERN = re.compile(r"count|ratio|share|pct|percent|rate", re.IGNORECASE)
+
+
+# A zero-padded int64 has 19 digits: eight two-digit groups, then the last three
+_PADDED_DIGITS = 19
+_GROUP_BOUNDS = [(start, start + 2) for start in range(0, 16, 2)] + [(16, 19)]
+
+
+def _digits(integers, width=0):
+    """Non-negative int64s as an Arrow string array, left-padded with zeros to width"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    text = pc.cast(pa.array(integers, type=pa.int64()), pa.string())
+    return pc.ascii_lpad(text, width, "0") if width else text
+
+
+def _group_indian(integers):
+    """Lakh/crore digit grouping (12,34,56,789) of non-negative int64s as an Arrow string array
+
+    Every value is padded to the full int64 width, so the groups sit at the
+    same byte offsets in every value: they are sliced out and joined with
+    commas, then the leading zeros and commas are trimmed. Each step is one
+    Arrow compute kernel over the whole column.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    padded = pc.cast(_digits(integers, _PADDED_DIGITS), pa.binary())
+    groups = [pc.binary_slice(padded, start, stop) for start, stop in _GROUP_BOUNDS]
+    grouped = pc.cast(pc.binary_join_element_wise(*groups, b","), pa.string())
+    trimmed = pc.ascii_ltrim(grouped, characters="0,")
+    # Zero trims away entirely
+    return pc.if_else(pc.equal(pc.binary_length(trimmed), 0), "0", trimmed)
+
+
+@lru_cache(maxsize=None)
+def _fraction_texts(decimals, suffix="", keep_zero=False):
+    """Arrow lookup table of every fraction ".01" ... ".99" (for decimals=2) followed by suffix
+
+    Fractions are taken from it by value instead of being formatted; a zero
+    fraction is left out unless keep_zero.
+    """
+    import pyarrow as pa
+    texts = [f".{fraction:0{decimals}d}{suffix}" for fraction in range(10 ** decimals)]
+    if not keep_zero:
+        texts[0] = suffix
+    return pa.array(texts, type=pa.string())
+
+
+def format_inr(values, decimals=2, abbreviate=False):
+    """Format numbers as rupees with Indian grouping, vectorised over a whole column
+
+    Decimals are shown only when non-zero, as format_indian_currency() always
+    did. With abbreviate, amounts of a lakh or more become e.g. "₹12.35 L" and
+    "₹1.20 Cr". Missing values stay missing. Returns a Series aligned with
+    values when given a Series. Digits are split with integer arithmetic in
+    NumPy; the strings are built with pyarrow.compute kernels, the sign and
+    the fraction looked up from small tables, and joined once at the end.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    index = values.index if isinstance(values, pd.Series) else None
+    numbers = pd.to_numeric(pd.Series(values, index=index), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    missing = ~np.isfinite(numbers)
+    magnitudes = np.abs(np.where(missing, 0.0, numbers))
+
+    scale = 10 ** decimals
+    scaled = np.round(magnitudes * scale).astype("int64")
+    integers, fractions = scaled // scale, scaled % scale
+    integer_text = _group_indian(integers)
+    fraction_text = pc.take(_fraction_texts(decimals), fractions) if decimals else ""
+
+    if abbreviate:
+        for threshold, suffix in reversed(ABBREVIATIONS):
+            short = magnitudes >= threshold
+            # Always two decimals; halves round up (1,48,500 is 1.49 L)
+            hundredths = np.floor(magnitudes / (threshold // 100) + 0.5).astype("int64")
+            integer_text = pc.if_else(short, _digits(hundredths // 100), integer_text)
+            abbreviated = pc.take(_fraction_texts(2, suffix, keep_zero=True), hundredths % 100)
+            fraction_text = pc.if_else(short, abbreviated, fraction_text)
+
+    # A missing value gets a missing prefix, which the join carries through
+    signs = pa.array((numbers < 0).astype("int8"), mask=missing)
+    prefix = pc.take(pa.array([RUPEE, f"-{RUPEE}"]), signs)
+    formatted = pc.binary_join_element_wise(prefix, integer_text, fraction_text, "").to_pandas()
+    if index is not None:
+        formatted.index = index
+    formatted.name = getattr(values, "name", None)
+    return formatted
+
+
+def monetary_columns(schema=None):
+    """Names of the decimal amount columns described in the views schema"""
+    schema = schema or load_schema()
+    return {
+        column
+        for table in schema.values()
+        for column, spec in table.get("columns", {}).items()
+        if spec.get("type") == "decimal"
+    }
+
+
+_schema_monetary_columns = None
+
+
+def is_monetary(column, numeric=True, schema_columns=None):
+    """Whether a result column holds rupee amounts, judged by its name against the schema"""
+    global _schema_monetary_columns
+    if not numeric:
+        return False
+    if schema_columns is None:
+        if _schema_monetary_columns is None:
+            _schema_monetary_columns = {name.lower() for name in monetary_columns()}
+        schema_columns = _schema_monetary_columns
+    name = "_".join(str(part) for part in column) if isinstance(column, tuple) else str(column)
+    if NON_MONETARY_NAME_PATTERN.search(name):
+        return False
+    lowered = name.lower()
+    return any(base in lowered for base in schema_columns) or bool(MONETARY_NAME_PATTERN.search(name))
+
+
+def format_frame(df, columns=None, decimals=2, abbreviate=False):
+    """Copy of a DataFrame (or Series) with its monetary columns formatted as rupees
+
+    columns defaults to every numeric column is_monetary() recognises;
+    other columns are left as they are.
+    """
+    if isinstance(df, pd.Series):
+        if columns is None and not is_monetary(df.name, pd.api.types.is_numeric_dtype(df)):
+            return df
+        return format_inr(df, decimals, abbreviate)
+    if columns is None:
+        columns = [
+            column for column in df.columns
+            if is_monetary(column, pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column]))
+        ]
+    if not columns:
+        return df
+    formatted = df.copy(deep=False)
+    for column in columns:
+        formatted[column] = format_inr(df[column], decimals, abbreviate)
+    return formatted
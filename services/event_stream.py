@@ -0,0 +1,145 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import time
+
+# Longest text (code, output, thoughts) carried by one event
+MAX_EVENT_TEXT_CHARS = 4000
+
+# Seconds of silence after which a keep-alive comment is sent
+KEEPALIVE_SECONDS = 15
+
+# Events buffered for a slow client before older progress events are dropped
+MAX_BUFFERED_EVENTS = 1000
+
+
+def _clip(text):
+    text = str(text)
+    return text if len(text) <= MAX_EVENT_TEXT_CHARS else text[:MAX_EVENT_TEXT_CHARS] + "..."
+
+
+def format_sse(event, data, event_id=None):
+    """One server-sent event in wire format"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    payload = json.dumps(data, default=str)
+    lines.extend(f"data: {line}" for line in payload.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+class EventStream:
+    """Progress events of one request, passed from the worker thread to an async response
+
+    emit() may be called from any thread; events are handed to the event
+    loop with call_soon_threadsafe and read back by iterating the stream.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, loop, max_buffered=MAX_BUFFERED_EVENTS):
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self.max_buffered = max_buffered
+        self.dropped = 0
+        self.started_at = time.perf_counter()
+        self._next_id = 0
+
+    def _put(self, item):
+        if item is not self._CLOSED and self._queue.qsize() >= self.max_buffered:
+            self.dropped += 1
+            return
+        self._queue.put_nowait(item)
+
+    def emit(self, event, data):
+        data = dict(data, elapsed_ms=round((time.perf_counter() - self.started_at) * 1000, 1))
+        try:
+            self._loop.call_soon_threadsafe(self._put, (event, data))
+        except RuntimeError:
+            # The loop is gone (client disconnected and the server shut down)
+            pass
+
+    def close(self):
+        try:
+            self._loop.call_soon_threadsafe(self._put, self._CLOSED)
+        except RuntimeError:
+            pass
+
+    async def sse(self):
+        """Yield the events as SSE text until the stream is closed, with keep-alives in between"""
+        while True:
+            try:
+                item = await asyncio.wait_for(self._queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if item is self._CLOSED:
+                return
+            event, data = item
+            self._next_id += 1
+            yield format_sse(event, data, self._next_id)
+
+
+class StreamGate:
+    """Passes events on to a stream until closed
+
+    Lets a request silence work it started in the background (e.g. losing
+    parallel candidates) once that work no longer belongs to the answer.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.open = True
+
+    def emit(self, event, data):
+        if self.open and self.stream is not None:
+            self.stream.emit(event, data)
+
+    def close(self):
+        self.open = False
+
+
+_current_stream = contextvars.ContextVar("event_stream", default=None)
+
+
+def current_stream():
+    return _current_stream.get()
+
+
+@contextlib.contextmanager
+def streaming(stream):
+    """Send the events emitted by this request (in this thread) to stream"""
+    token = _current_stream.set(stream)
+    try:
+        yield stream
+    finally:
+        _current_stream.reset(token)
+
+
+def emit(event, **data):
+    """Send an event to the current request's stream, if it has one"""
+    stream = _current_stream.get()
+    if stream is not None:
+        stream.emit(event, data)
+
+
+def emit_step(step):
+    """CrewAI step callback: one event per agent thought, tool call or final answer"""
+    if _current_stream.get() is None:
+        return
+    tool = getattr(step, "tool", None)
+    if tool is not None:
+        emit("tool_call", tool=tool, tool_input=_clip(getattr(step, "tool_input", "")),
+             thought=_clip(getattr(step, "thought", "")))
+    elif hasattr(step, "output"):
+        emit("agent_finish", thought=_clip(getattr(step, "thought", "")), output=_clip(step.output))
+    elif hasattr(step, "result"):
+        emit("tool_result", result=_clip(step.result))
+    else:
+        emit("agent_step", text=_clip(getattr(step, "text", step)))
+
+
+def emit_task(task_output, stage=None):
+    """Event for a finished crew task"""
+    emit("task_completed", stage=stage, agent=getattr(task_output, "agent", None),
+         output=_clip(getattr(task_output, "raw", task_output)))
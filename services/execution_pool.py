@@ -0,0 +1,313 @@
+import contextlib
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from io import StringIO
+import pandas as pd
+from services.charts import capture_figures
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Pool size and per-execution limits
+EXECUTION_WORKERS = int(os.getenv("EXECUTION_WORKERS", "4"))
+EXECUTION_TIMEOUT_SECONDS = float(os.getenv("EXECUTION_TIMEOUT_SECONDS", "60"))
+EXECUTION_MEMORY_LIMIT_MB = int(os.getenv("EXECUTION_MEMORY_LIMIT_MB", "2048"))
+
+# Frames sent back from an execution unless the caller names others; every
+# other frame the code made stays in the worker instead of being pickled.
+# The code generation prompt asks for the answer table in `result`.
+RESULT_TABLE_NAMES = ("result",)
+
+
+class ExecutionResult:
+    """Outcome of running one piece of generated code in a worker"""
+
+    def __init__(self, output="", errors="", error=None, result_text=None, tables=None,
+                 duration_ms=0.0, timed_out=False, figures=None):
+        self.output = output
+        self.errors = errors
+        self.error = error
+        self.result_text = result_text
+        self.tables = tables or {}
+        self.duration_ms = duration_ms
+        self.timed_out = timed_out
+        # Figures the code left open, as capture_figures() returns them
+        self.figures = figures or []
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        """The dict format returned by execute_analysis_code()"""
+        if not self.ok:
+            # The traceback's line numbers point into the generated code, which helps repair it
+            return {"error": self.error, "traceback": self.errors} if self.errors else {"error": self.error}
+        results = dict(self.tables)
+        if self.result_text is not None:
+            results["result"] = self.result_text
+        results["output"] = self.output
+        if self.figures:
+            results["charts"] = [figure["id"] for figure in self.figures]
+        return results
+
+
+def execute_code(code, namespace, table_names=RESULT_TABLE_NAMES):
+    """Run code in the given namespace, capturing its output and the named DataFrames it produced
+
+    Only frames named in table_names that the code created or reassigned
+    are returned. Output is redirected with contextlib, which swaps
+    sys.stdout for the whole process; that is safe here because each
+    worker process runs one execution at a time.
+    """
+    initial_vars = dict(namespace)
+    out, err = StringIO(), StringIO()
+    start_time = time.perf_counter()
+    error = None
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            exec(code, namespace)
+    except MemoryError:
+        error = "MemoryError: execution exceeded the worker memory limit"
+    except BaseException as e:
+        error = f"{type(e).__name__}: {str(e)}"
+        err.write(traceback.format_exc())
+
+    # Requested frames the code created or reassigned (the conventional result variable by default)
+    tables = {}
+    for name in table_names:
+        value = namespace.get(name)
+        if name in initial_vars and initial_vars[name] is value:
+            continue
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            tables[name] = value
+    result_text = str(namespace["result"]) if "result" in namespace and "result" not in tables else None
+    # Figures are handed to the chart renderer instead of staying in pyplot's global state
+    figures = capture_figures() if error is None else []
+    if error is not None and "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close("all")
+    return ExecutionResult(
+        output=out.getvalue(),
+        errors=err.getvalue(),
+        error=error,
+        result_text=result_text,
+        tables=tables,
+        duration_ms=round((time.perf_counter() - start_time) * 1000, 1),
+        figures=figures,
+    )
+
+
+def _address_space_bytes():
+    """Current virtual memory size of this process, or None if unknown"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _worker_main(conn, namespace_factory, memory_limit_mb):
+    """Loop in a forked worker: receive (code, version), execute it, send back an ExecutionResult"""
+    if resource is not None and memory_limit_mb:
+        # The limit is on top of what the worker inherited from the parent
+        current = _address_space_bytes()
+        if current is not None:
+            limit = current + memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        code, version, table_names = message
+        result = execute_code(code, namespace_factory(version), table_names)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # Some result frames could not be pickled; send the text output only
+            result.tables = {}
+            result.figures = []
+            result.errors += f"\nResult tables dropped: {str(e)}"
+            conn.send(result)
+
+
+class _Forker:
+    """One thread that does all of the pool's forking
+
+    A fork copies only the forking thread, so any lock held at that moment
+    stays locked in the child for good. Forking from request threads would
+    happen at arbitrary points of their own work (inside the crew, sqlite
+    or logging), with their own locks held; this thread does nothing but
+    fork, so it never holds one. Locks other threads hold at the instant
+    of the fork are still copied locked: the child only runs
+    _worker_main(), which takes none of the server's locks, and Python
+    re-initialises its import and logging locks after a fork.
+    """
+
+    def __init__(self):
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="execution-forker", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            build, done = request
+            try:
+                done.set_result(build())
+            except BaseException as e:
+                done.set_exception(e)
+
+    def run(self, build):
+        """Call build() on the forking thread and return its result"""
+        done = Future()
+        self._requests.put((build, done))
+        return done.result()
+
+    def stop(self):
+        self._requests.put(None)
+
+
+class _Worker:
+    def __init__(self, context, namespace_factory, memory_limit_mb, versions):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, namespace_factory, memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        # Dataset versions that were in memory when this worker was forked
+        self.versions = frozenset(versions)
+
+    def stop(self, kill=False):
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class ExecutionPool:
+    """Pre-forked worker processes that execute generated code in isolation
+
+    Workers are forked after the datasets are loaded, so they share the
+    DataFrames' pages with the server copy-on-write and pay no start-up
+    cost per call. Each execution has its own stdout/stderr, a wall-clock
+    timeout (the worker is killed and replaced when it expires) and an
+    address-space limit. Code runs against a given dataset version
+    (namespace_factory(version)); a worker forked before that version
+    existed is replaced the next time it is picked.
+    """
+
+    def __init__(self, namespace_factory, version=lambda: None, live_versions=None, size=EXECUTION_WORKERS,
+                 timeout=EXECUTION_TIMEOUT_SECONDS, memory_limit_mb=EXECUTION_MEMORY_LIMIT_MB):
+        # version returns the current dataset version and live_versions every
+        # version still in use, all of which a new worker can serve
+        self._namespace_factory = namespace_factory
+        self._version = version
+        self._live_versions = live_versions or (lambda: {version()})
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._context = multiprocessing.get_context("fork") if self.supported() else None
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._forker = None
+        self._forker_lock = threading.Lock()
+        self.started = False
+
+    @staticmethod
+    def supported():
+        return "fork" in multiprocessing.get_all_start_methods()
+
+    def _spawn(self):
+        versions = self._live_versions() | {self._version()}
+        with self._forker_lock:
+            if self._forker is None:
+                self._forker = _Forker()
+            forker = self._forker
+        return forker.run(
+            lambda: _Worker(self._context, self._namespace_factory, self.memory_limit_mb, versions)
+        )
+
+    def start(self):
+        """Fork the workers; call after the datasets are loaded"""
+        with self._lock:
+            if self.started or not self.supported():
+                return
+            for _ in range(self.size):
+                worker = self._spawn()
+                self._workers.append(worker)
+                self._idle.put(worker)
+            self.started = True
+
+    def _replace(self, worker, kill=False):
+        worker.stop(kill=kill)
+        new_worker = self._spawn()
+        with self._lock:
+            self._workers = [w for w in self._workers if w is not worker] + [new_worker]
+        return new_worker
+
+    def run(self, code, timeout=None, version=None, table_names=RESULT_TABLE_NAMES):
+        """Execute code against a dataset version (the current one by default) and return an ExecutionResult
+
+        Only the frames in table_names are sent back from the worker.
+        """
+        version = version or self._version()
+        if not self.supported():
+            # No fork (e.g. Windows): run in-process without isolation or timeout
+            return execute_code(code, self._namespace_factory(version), table_names)
+        if not self.started:
+            self.start()
+        timeout = timeout or self.timeout
+        worker = self._idle.get()
+        try:
+            if version not in worker.versions or not worker.process.is_alive():
+                worker = self._replace(worker)
+            worker.conn.send((code, version, tuple(table_names)))
+            if not worker.conn.poll(timeout):
+                worker = self._replace(worker, kill=True)
+                return ExecutionResult(
+                    error=f"TimeoutError: execution exceeded {timeout:g} seconds",
+                    duration_ms=round(timeout * 1000, 1),
+                    timed_out=True,
+                )
+            return worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # The worker died mid-execution (e.g. killed by the OS)
+            worker = self._replace(worker, kill=True)
+            return ExecutionResult(error=f"Execution worker exited unexpectedly: {str(e)}")
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self.started = False
+            while not self._idle.empty():
+                self._idle.get_nowait()
+        for worker in workers:
+            worker.stop()
+        with self._forker_lock:
+            forker, self._forker = self._forker, None
+        if forker is not None:
+            forker.stop()
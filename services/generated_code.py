@@ -0,0 +1,199 @@
+import ast
+import difflib
+import json
+import os
+import re
+import pandas as pd
+from services.event_stream import emit
+
+FENCED_CODE_PATTERN = re.compile(r"```(?:python|py)?[ \t]*\n(.*?)```", re.DOTALL)
+
+
+def _parses(code):
+    try:
+        ast.parse(code)
+        return True
+    except SyntaxError:
+        return False
+
+
+def _code_from_mapping(text):
+    """The 'code' value of a JSON or Python dict literal in the text, if any"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    literal = text[start:end + 1]
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            value = parse(literal)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+        if isinstance(value, dict) and isinstance(value.get("code"), str):
+            return value["code"]
+    return None
+
+
+def extract_code(output):
+    """Pull the generated program out of the Code Generator's final answer
+
+    The task asks for a dict with a 'code' key, but models also answer with
+    fenced code blocks or bare code; each form is tried in turn. Returns
+    None when no code is found.
+    """
+    text = str(getattr(output, "raw", output)).strip()
+    code = _code_from_mapping(text)
+    if code is not None:
+        return code
+    blocks = FENCED_CODE_PATTERN.findall(text)
+    if blocks:
+        # The longest block is the program; shorter ones tend to be usage snippets
+        return max(blocks, key=len).strip()
+    return text if text and _parses(text) else None
+
+
+# Rounds of local fixes tried before a failing program goes back to the model
+LOCAL_REPAIR_ROUNDS = int(os.getenv("LOCAL_REPAIR_ROUNDS", "3"))
+
+# Minimum similarity for a guessed column name to be replaced by a real one
+COLUMN_MATCH_CUTOFF = 0.6
+
+# Error messages naming a missing column: KeyError: 'x', "Column(s) ['x'] do not exist",
+# "None of [Index(['x'], ...)] are in the [columns]" and "... object has no attribute 'x'"
+MISSING_COLUMN_PATTERNS = [
+    re.compile(r"^KeyError: ['\"](?P<names>[^'\"]+)['\"]"),
+    re.compile(r"Columns?\(s\) \[(?P<names>[^\]]+)\] do not exist"),
+    re.compile(r"None of \[Index\(\[(?P<names>[^\]]+)\]"),
+    re.compile(r"\[(?P<names>[^\]]+)\] not in index"),
+]
+MISSING_ATTRIBUTE_PATTERN = re.compile(r"'(?:DataFrame|Series|DataFrameGroupBy)' object has no attribute '(?P<name>\w+)'")
+
+# Errors caused by categorical, nullable boolean or numeric-as-text columns
+DTYPE_ERROR_PATTERN = re.compile(
+    r"Categorical|categor|boolean value of NA|NAType|unsupported operand type|"
+    r"not supported between instances of|could not convert string to float|"
+    r"can only concatenate str|Unable to parse string|agg function failed",
+    re.IGNORECASE,
+)
+
+# Prepended to code that failed on a dtype: plain object, bool and numeric columns
+COERCE_DTYPES_PRELUDE = '''
+def __coerce_frame(df):
+    df = df.copy(deep=False)
+    for column in df.columns:
+        dtype = df[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+        elif str(dtype) == "boolean":
+            df[column] = df[column].fillna(False).astype(bool)
+        elif dtype == object:
+            numeric = pd.to_numeric(df[column], errors="coerce")
+            if numeric.notna().sum() == df[column].notna().sum() > 0:
+                df[column] = numeric
+    return df
+'''.lstrip()
+
+
+def known_columns(namespace):
+    """Column names of every DataFrame in an execution namespace"""
+    columns = set()
+    for value in (namespace or {}).values():
+        if isinstance(getattr(value, "columns", None), pd.Index):
+            columns.update(str(column) for column in value.columns)
+    return columns
+
+
+def unescape_code(code):
+    """Undo double escaping: literal \\n and \\t between statements, and escaped quotes"""
+    if "\\n" not in code or _parses(code):
+        return code
+    unescaped = code.replace("\\r\\n", "\n").replace("\\n", "\n").replace("\\t", "\t").replace('\\"', '"')
+    return unescaped if _parses(unescaped) else code
+
+
+def _closest_column(name, columns):
+    """The real column a guessed name most likely meant, ignoring case, spaces and underscores"""
+    def squash(value):
+        return re.sub(r"[\s_]+", "", value).lower()
+
+    squashed = {squash(column): column for column in columns}
+    if squash(name) in squashed:
+        return squashed[squash(name)]
+    matches = difflib.get_close_matches(squash(name), list(squashed), n=1, cutoff=COLUMN_MATCH_CUTOFF)
+    return squashed[matches[0]] if matches else None
+
+
+def _missing_columns(error):
+    for pattern in MISSING_COLUMN_PATTERNS:
+        match = pattern.search(error)
+        if match:
+            return [name.strip().strip("'\"") for name in match.group("names").split(",") if name.strip()]
+    return []
+
+
+def _fix_column_names(code, error, columns):
+    fixed = code
+    for name in _missing_columns(error):
+        replacement = _closest_column(name, columns)
+        if replacement is not None and replacement != name:
+            fixed = re.sub(r"(['\"])" + re.escape(name) + r"\1", lambda match: match.group(1) + replacement
+                           + match.group(1), fixed)
+    match = MISSING_ATTRIBUTE_PATTERN.search(error)
+    if match and match.group("name") not in columns:
+        replacement = _closest_column(match.group("name"), columns)
+        if replacement is not None:
+            fixed = re.sub(r"\." + re.escape(match.group("name")) + r"\b(?!\s*\()", f"[{replacement!r}]", fixed)
+    return fixed
+
+
+def _coerce_dtypes(code, error, frame_names):
+    if not DTYPE_ERROR_PATTERN.search(error) or "__coerce_frame" in code:
+        return code
+    used = [name for name in frame_names if re.search(r"\b" + re.escape(name) + r"\b", code)]
+    if not used:
+        return code
+    assignments = "".join(f"{name} = __coerce_frame({name})\n" for name in used)
+    return COERCE_DTYPES_PRELUDE + assignments + code
+
+
+def repair_code(code, error, namespace):
+    """One round of local fixes for code that failed with error
+
+    Returns (code, fixes); fixes is empty when no fix applies, in which
+    case only the model can repair the code.
+    """
+    frame_names = [name for name, value in (namespace or {}).items() if isinstance(value, pd.DataFrame)]
+    fixes = []
+    for fix, apply in (
+        ("unescape", lambda current: unescape_code(current)),
+        ("column_names", lambda current: _fix_column_names(current, error, known_columns(namespace))),
+        ("coerce_dtypes", lambda current: _coerce_dtypes(current, error, frame_names)),
+    ):
+        repaired = apply(code)
+        if repaired != code:
+            code = repaired
+            fixes.append(fix)
+            if fix == "unescape":
+                # The escaping was the error; run it before guessing at anything else
+                break
+    return code, fixes
+
+
+def run_with_repair(code, executor, namespace, rounds=LOCAL_REPAIR_ROUNDS):
+    """Run code, applying local fixes and re-running while it fails
+
+    executor returns an ExecutionResult. Returns (outcome, code, fixes),
+    where code is the last version run and fixes lists every fix applied.
+    """
+    code = unescape_code(code)
+    outcome = executor(code)
+    applied = []
+    for _ in range(rounds):
+        if outcome.ok:
+            break
+        repaired, fixes = repair_code(code, outcome.error, namespace)
+        if not fixes:
+            break
+        code, applied = repaired, applied + fixes
+        emit("local_repair", fixes=fixes, error=outcome.error)
+        outcome = executor(code)
+    return outcome, code, applied
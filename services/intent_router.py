@@ -0,0 +1,307 @@
+import re
+import pandas as pd
+from data.out_of_core import ChunkedTable
+
+# Words that carry no meaning for routing beyond what the matched terms provide
+FILLER_WORDS = {
+    "a", "an", "the", "of", "by", "across", "per", "for", "each", "every", "and", "in",
+    "on", "at", "with", "to", "me", "all", "different", "various", "wise", "what", "is",
+    "are", "show", "find", "get", "give", "list", "analyze", "analyse", "identify",
+    "compare", "calculate", "compute", "display", "please", "group", "grouped", "overall",
+    "current", "there", "which", "our", "values", "value",
+}
+
+LOAN_TABLE = "Loan_Customer_Summary"
+PAYMENT_TABLE = "Loan_Payment_Summary"
+
+# Words that only say which table the question is about
+ENTITY_WORDS = {
+    "loan": LOAN_TABLE,
+    "loans": LOAN_TABLE,
+    "payment": PAYMENT_TABLE,
+    "payments": PAYMENT_TABLE,
+    "transaction": PAYMENT_TABLE,
+    "transactions": PAYMENT_TABLE,
+}
+
+AGGREGATION_WORDS = {
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "total": "sum", "sum": "sum",
+    "median": "median",
+    "maximum": "max", "max": "max", "highest": "max", "largest": "max",
+    "minimum": "min", "min": "min", "lowest": "min", "smallest": "min",
+    "count": "count", "number": "count", "many": "count", "how": "count",
+    "distribution": "count", "breakdown": "count", "split": "count",
+    "pattern": "count", "patterns": "count",
+}
+
+# Words after which the dimensions become the rows of the answer
+GROUPING_WORDS = {"by", "across", "per", "each"}
+
+# Words that group by a following column but filter on a following value:
+# "for each branch" groups, "for MH" and "for NPA loans" filter
+QUALIFYING_WORDS = {"for"}
+
+NPA_COLUMN = "NPA"
+MEASURE_TYPES = {"decimal"}
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def _column_phrases(column):
+    """Phrases users write for a column: "BranchName" -> "branch name", "branch\""""
+    words = re.findall(r"[A-Z]+(?![a-z])|[A-Z][a-z]*|[a-z]+|\d+", column)
+    words = [word.lower() for word in words]
+    phrases = [tuple(words)]
+    # "LoanAmount" must not claim the bare word "loan", which names the table
+    if len(words) > 1 and words[-1] in ("name", "amount") and " ".join(words[:-1]) not in ENTITY_WORDS:
+        phrases.append(tuple(words[:-1]))
+    return phrases
+
+
+def _token_matches(token, word):
+    return token == word or token == word + "s" or token == word + "es"
+
+
+class IntentRouter:
+    """Answer common aggregation questions with pandas instead of the crew
+
+    Terms are derived from views_schema.json: decimal columns are measures,
+    enumerated and categorical columns are dimensions, and their values are
+    filters. Boolean columns are dimensions, or filters on True after
+    "for". A query is routed only when every word in it is understood;
+    anything else returns None and goes to run_analysis().
+    """
+
+    def __init__(self, schema, frames, cube=None, cube_table=LOAN_TABLE):
+        # frames maps schema table names to their DataFrames (or ChunkedTables
+        # streamed out of core); the optional aggregate cube answers loan
+        # rollups without scanning the rows
+        self.frames = frames
+        self.cube = cube
+        self.cube_table = cube_table
+        self._terms = []
+        self._boolean_columns = set()
+        for table, table_schema in schema.items():
+            df = frames.get(table)
+            if df is None:
+                continue
+            if isinstance(df, ChunkedTable):
+                # Column kinds and filter values come from the leading rows
+                df = df.head()
+            by_lower = {column.lower(): column for column in df.columns}
+            for name, spec in table_schema.get("columns", {}).items():
+                column = by_lower.get(name.lower())
+                if column is None:
+                    continue
+                if spec.get("type") in MEASURE_TYPES:
+                    kind = "measure"
+                elif "possible values" in spec or isinstance(df[column].dtype, pd.CategoricalDtype):
+                    kind = "dimension"
+                else:
+                    continue
+                if column == "LoanId":
+                    continue
+                if pd.api.types.is_bool_dtype(df[column].dtype):
+                    self._boolean_columns.add(column)
+                for phrase in _column_phrases(column):
+                    self._terms.append((phrase, kind, column, None))
+                if kind == "dimension" and isinstance(df[column].dtype, pd.CategoricalDtype):
+                    for value in df[column].cat.categories:
+                        if isinstance(value, str) and _words(value):
+                            self._terms.append((tuple(_words(value)), "filter", column, value))
+        # Longest phrases first so "loan amount" wins over "loan"
+        self._terms.sort(key=lambda term: -len(term[0]))
+
+    def _match_term(self, tokens, position):
+        for phrase, kind, column, value in self._terms:
+            end = position + len(phrase)
+            if end > len(tokens):
+                continue
+            if all(_token_matches(tokens[position + i], word) for i, word in enumerate(phrase)):
+                return end, kind, column, value
+        return None
+
+    def plan(self, query):
+        """Parse a query into an aggregation plan, or None if it is not fully understood"""
+        tokens = _words(query)
+        dimensions, row_dimensions, measures, filters = [], [], [], {}
+        aggregation, table_hint, grouping, qualifying = None, None, False, False
+        position = 0
+        while position < len(tokens):
+            token = tokens[position]
+            matched = self._match_term(tokens, position)
+            if matched is not None:
+                position, kind, column, value = matched
+                if qualifying and kind == "dimension":
+                    if column in self._boolean_columns:
+                        kind, value = "filter", True
+                    else:
+                        grouping = True
+                qualifying = False
+                if kind == "measure" and column not in measures:
+                    measures.append(column)
+                elif kind == "dimension" and column not in dimensions:
+                    dimensions.append(column)
+                    if grouping:
+                        row_dimensions.append(column)
+                elif kind == "filter":
+                    filters[column] = value
+                continue
+            if token in AGGREGATION_WORDS:
+                aggregation = aggregation or AGGREGATION_WORDS[token]
+                qualifying = False
+            elif token in ENTITY_WORDS:
+                table_hint = table_hint or ENTITY_WORDS[token]
+                qualifying = False
+            elif token not in FILLER_WORDS:
+                return None
+            if token in GROUPING_WORDS:
+                grouping = True
+            elif token in QUALIFYING_WORDS:
+                qualifying = True
+            position += 1
+
+        aggregation = aggregation or "count"
+        if len(measures) > 1 or not dimensions or (aggregation != "count" and not measures):
+            return None
+        npa = NPA_COLUMN in dimensions and len(dimensions) > 1 and aggregation == "count"
+        if npa:
+            dimensions.remove(NPA_COLUMN)
+            row_dimensions = [column for column in row_dimensions if column != NPA_COLUMN]
+
+        columns = set(dimensions) | set(measures) | set(filters) | ({NPA_COLUMN} if npa else set())
+        tables = [table for table, df in self.frames.items() if columns <= set(df.columns)]
+        if not tables:
+            return None
+        # "payments by branch" must not quietly count loans because only the loan table has branches
+        if table_hint is not None and table_hint not in tables:
+            return None
+        table = table_hint or tables[0]
+        return {
+            "table": table,
+            "aggregation": "npa" if npa else aggregation,
+            "measure": measures[0] if measures else None,
+            # Dimensions named after "by"/"across" become rows, the rest columns
+            "rows": row_dimensions or dimensions,
+            "columns": [column for column in dimensions if column not in row_dimensions] if row_dimensions else [],
+            "filters": filters,
+        }
+
+    def answer(self, query):
+        """Return (title, DataFrame) for a routed query, or None to fall back to the crew"""
+        plan = self.plan(query)
+        if plan is None:
+            return None
+        table = self._aggregate_cube(plan)
+        if table is None and isinstance(self.frames[plan["table"]], ChunkedTable):
+            table = self._aggregate_chunked(self.frames[plan["table"]], plan)
+        if table is None:
+            df = self.frames[plan["table"]]
+            for column, value in plan["filters"].items():
+                # isin leaves out missing values, which a boolean mask cannot hold
+                df = df[df[column].isin([value])]
+            table = self._aggregate_frame(df, plan)
+        return self._describe(plan), self._shape(table, plan)
+
+    @staticmethod
+    def _npa_amount(plan, columns):
+        amount = plan["measure"] or "OutstandingAmount"
+        return amount if amount in columns else None
+
+    def _aggregate_frame(self, df, plan):
+        """Aggregates indexed by the plan's keys, computed from the rows"""
+        keys = plan["rows"] + plan["columns"]
+        measure = plan["measure"]
+        aggregation = plan["aggregation"]
+        grouped = df.groupby(keys, observed=True)
+        table = grouped.size().to_frame("count")
+        if aggregation == "npa":
+            npa = df[NPA_COLUMN].fillna(False).astype(bool)
+            by = [df[key] for key in keys]
+            table["npa_count"] = npa.groupby(by, observed=True).sum()
+            amount = self._npa_amount(plan, df.columns)
+            if amount:
+                table[f"npa_{amount}"] = df[amount].where(npa, 0).groupby(by, observed=True).sum()
+        elif measure:
+            function = "sum" if aggregation == "count" else aggregation
+            table[f"{function}_{measure}"] = grouped[measure].agg(function)
+        return table
+
+    def _aggregate_chunked(self, source, plan):
+        """The same aggregates streamed over a ChunkedTable with mergeable partials"""
+        keys = plan["rows"] + plan["columns"]
+        measure = plan["measure"]
+        aggregation = plan["aggregation"]
+        aggregations = {"count": (keys[0], "size")}
+        transform = None
+        if aggregation == "npa":
+            amount = self._npa_amount(plan, source.columns)
+            aggregations["npa_count"] = ("__npa__", "sum")
+            if amount:
+                aggregations[f"npa_{amount}"] = ("__npa_amount__", "sum")
+
+            def transform(chunk):
+                npa = chunk[NPA_COLUMN].fillna(False).astype(bool)
+                chunk = chunk.assign(__npa__=npa)
+                if amount:
+                    chunk["__npa_amount__"] = chunk[amount].where(npa, 0)
+                return chunk
+        elif measure:
+            function = "sum" if aggregation == "count" else aggregation
+            aggregations[f"{function}_{measure}"] = (measure, function)
+        return source.aggregate(aggregations, by=keys, filters=plan["filters"], transform=transform)
+
+    def _aggregate_cube(self, plan):
+        """The same aggregates rolled up from the loan cube, or None if it cannot answer"""
+        aggregation = plan["aggregation"]
+        if self.cube is None or plan["table"] != self.cube_table or aggregation not in ("count", "sum", "mean", "npa"):
+            return None
+        keys = plan["rows"] + plan["columns"]
+        measure = plan["measure"]
+        amount = self._npa_amount(plan, self.cube.measures) if aggregation == "npa" else None
+        dimensions = keys + ([NPA_COLUMN] if aggregation == "npa" else [])
+        if not self.cube.covers(dimensions, [column for column in (measure, amount) if column], plan["filters"]):
+            return None
+
+        # The cube keeps missing keys as their own cells; groupby on rows drops them
+        totals = self.cube.rollup(keys, plan["filters"]).dropna(subset=keys).set_index(keys)
+        table = totals[["count"]].copy()
+        if aggregation == "npa":
+            npa_cells = self.cube.rollup(keys, {**plan["filters"], NPA_COLUMN: True}).dropna(subset=keys).set_index(keys)
+            table["npa_count"] = npa_cells["count"].reindex(table.index, fill_value=0)
+            if amount:
+                table[f"npa_{amount}"] = npa_cells[f"sum_{amount}"].reindex(table.index, fill_value=0)
+        elif measure:
+            function = "sum" if aggregation == "count" else aggregation
+            table[f"{function}_{measure}"] = totals[f"{function}_{measure}"]
+        return table
+
+    @staticmethod
+    def _shape(table, plan):
+        """Add derived columns and pivot any non-row dimensions into columns"""
+        aggregation = plan["aggregation"]
+        if aggregation == "npa":
+            table.insert(2, "npa_rate_pct", table["npa_count"] / table["count"] * 100)
+        elif plan["columns"]:
+            column = "count" if aggregation == "count" else f"{aggregation}_{plan['measure']}"
+            table = table[column].unstack(plan["columns"], fill_value=0 if aggregation == "count" else None)
+        elif aggregation == "count":
+            table.insert(1, "share_pct", table["count"] / table["count"].sum() * 100)
+        return table.round(2).reset_index()
+
+    @staticmethod
+    def _describe(plan):
+        if plan["aggregation"] == "npa":
+            title = "NPA loans and rate"
+        elif plan["aggregation"] == "count":
+            title = "Count" + (f" and total {plan['measure']}" if plan["measure"] else "")
+        else:
+            title = f"{plan['aggregation'].capitalize()} {plan['measure']}"
+        title += " by " + ", ".join(plan["rows"] + plan["columns"])
+        if plan["filters"]:
+            title += " where " + ", ".join(f"{column} = {value}" for column, value in plan["filters"].items())
+        return title
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Concurrency limits for analysis jobs
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", "4"))
+ANALYSIS_MAX_QUEUE = int(os.getenv("ANALYSIS_MAX_QUEUE", "32"))
+
+# How long finished jobs stay available for polling
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while every worker and queue slot is taken"""
+
+
+class Job:
+    """State of one submitted analysis"""
+
+    def __init__(self, args):
+        self.id = uuid.uuid4().hex
+        self.args = args
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Run a blocking worker function on a bounded thread pool
+
+    At most max_workers jobs run at once and at most max_pending wait
+    behind them; further submissions raise QueueFullError so callers can
+    apply backpressure instead of queueing without limit.
+    """
+
+    def __init__(self, worker, max_workers=ANALYSIS_MAX_WORKERS, max_pending=ANALYSIS_MAX_QUEUE,
+                 retention_seconds=JOB_RETENTION_SECONDS):
+        self._worker = worker
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._jobs = {}
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, *args):
+        """Queue a job for the worker and return it"""
+        with self._lock:
+            self._prune()
+            if self._active >= self.max_workers + self.max_pending:
+                raise QueueFullError("Analysis queue is full, retry later")
+            job = Job(args)
+            self._jobs[job.id] = job
+            self._active += 1
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            try:
+                job.result = self._worker(*job.args)
+                status = "succeeded"
+            except Exception as e:
+                job.error = str(e)
+                status = "failed"
+            job.finished_at = time.time()
+            # Set last, so a job that reads as done always has finished_at
+            job.status = status
+        finally:
+            with self._lock:
+                self._active -= 1
+        return job
+
+    def _prune(self):
+        # Called with the lock held
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.done and job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            queued = sum(1 for job in self._jobs.values() if job.status == "queued")
+        return {
+            "running": running,
+            "queued": queued,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
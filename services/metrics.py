@@ -0,0 +1,139 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+# Default latency buckets in seconds; analyses range from milliseconds to minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Token-count buckets per stage
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a fixed set of label names"""
+
+    def __init__(self, name, description, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = dict(zip(self.label_names, key))
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': f'{bound:g}'})} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "analysis_stage_seconds", "Latency of each analysis stage in seconds", ("stage",)
+)
+STAGE_TOKENS = Histogram(
+    "analysis_stage_tokens", "LLM tokens used by each analysis stage", ("stage", "kind"), TOKEN_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "analysis_request_seconds", "End-to-end analysis latency by serving path", ("served_by",)
+)
+
+REGISTRY = [STAGE_SECONDS, STAGE_TOKENS, REQUEST_SECONDS]
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Spans and token counts recorded while serving one request"""
+
+    def __init__(self):
+        self.spans = []
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, seconds):
+        with self._lock:
+            self.spans.append({"stage": stage, "ms": round(seconds * 1000, 2)})
+
+    def add_tokens(self, stage, usage):
+        with self._lock:
+            self.tokens[stage] = dict(usage)
+
+    def to_dict(self):
+        with self._lock:
+            return {"spans": list(self.spans), "tokens": dict(self.tokens)}
+
+
+_current_trace = contextvars.ContextVar("analysis_trace", default=None)
+
+
+@contextlib.contextmanager
+def start_trace():
+    """Collect the spans of the current request (in this thread) into a Trace"""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def record_stage(stage, seconds):
+    """Record an already measured stage duration"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, seconds)
+
+
+def record_tokens(stage, usage):
+    """Record token counts (prompt/completion/total) attributed to a stage"""
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        if kind in usage:
+            STAGE_TOKENS.observe(usage[kind], stage=stage, kind=kind)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_tokens(stage, usage)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time a block and record it as a stage"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start_time)
@@ -0,0 +1,162 @@
+import io
+import os
+import threading
+import weakref
+from data.schema_dtypes import CUSTOMER_SUMMARY_TABLE, PAYMENT_SUMMARY_TABLE, load_schema
+
+# Upper bound on the dataset description added to the Code Generator task
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "900"))
+
+# Rough characters per token of English and code for OpenAI-style tokenizers
+CHARS_PER_TOKEN = 4
+
+# Variables the tables are exposed as in the execution namespace
+FRAME_NAMES = {CUSTOMER_SUMMARY_TABLE: "loan_df", PAYMENT_SUMMARY_TABLE: "payment_df"}
+CHUNKED_FRAME_NAMES = {CUSTOMER_SUMMARY_TABLE: "loan_df", PAYMENT_SUMMARY_TABLE: "payment_table"}
+
+# Detail levels tried in order until the description fits the budget
+DETAIL_LEVELS = [
+    {"descriptions": True, "statistics": True, "max_values": 12},
+    {"descriptions": False, "statistics": True, "max_values": 12},
+    {"descriptions": False, "statistics": False, "max_values": 6},
+    {"descriptions": False, "statistics": False, "max_values": 3},
+]
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _number(value):
+    """Short rendering of a statistic: 3 significant figures, no float noise"""
+    if value != value:
+        return "nan"
+    if float(value).is_integer() and abs(value) < 1e7:
+        return str(int(value))
+    return f"{value:.3g}"
+
+
+def _schema_columns(schema, table):
+    """Schema column specs keyed by lower-cased name (the schema's casing differs from the CSVs')"""
+    return {name.lower(): spec for name, spec in schema.get(table, {}).get("columns", {}).items()}
+
+
+def _describe_column(column, profile, spec, detail):
+    parts = [f"- {column} {profile['column_types'].get(column, '?')}"]
+    statistics = profile["statistics"].get(column)
+    if detail["statistics"] and statistics:
+        parts.append(f"{_number(statistics['min'])}..{_number(statistics['max'])}, "
+                     f"mean {_number(statistics['mean'])}")
+    values = profile["unique_values"].get(column)
+    distinct = profile["distinct_counts"].get(column)
+    if values is None and spec.get("possible values"):
+        values = spec["possible values"]
+    if values is not None:
+        listed = ", ".join(str(value) for value in values[:detail["max_values"]])
+        more = f" +{len(values) - detail['max_values']} more" if len(values) > detail["max_values"] else ""
+        parts.append(f"values: {listed}{more}")
+    elif distinct is not None:
+        approximate = "~" if distinct["approximate"] else ""
+        parts.append(f"{approximate}{distinct['count']:,} distinct")
+    missing = profile["missing_values"].get(column, 0)
+    if missing:
+        parts.append(f"{missing:,} missing")
+    if detail["descriptions"] and spec.get("description"):
+        parts.append(spec["description"].rstrip("."))
+    return "; ".join(parts)
+
+
+def render_context(profile, schema, frame_names, detail):
+    lines = []
+    for table, table_profile in profile.items():
+        name = frame_names.get(table, table)
+        header = f"{name} ({table_profile['rows']:,} rows)"
+        description = schema.get(table, {}).get("table_description")
+        if detail["descriptions"] and description:
+            header += f": {description}"
+        lines.append(header)
+        specs = _schema_columns(schema, table)
+        for column in table_profile["columns"]:
+            lines.append(_describe_column(column, table_profile, specs.get(column.lower(), {}), detail))
+    return "\n".join(lines)
+
+
+def inspection_tokens(frames):
+    """Tokens of the df.info() and df.head() output the model used to read back each query"""
+    text = []
+    for df in frames:
+        buffer = io.StringIO()
+        df.info(buf=buffer)
+        text.append(buffer.getvalue())
+        text.append(df.head().to_string())
+    return estimate_tokens("\n".join(text))
+
+
+class DatasetContext:
+    """Compact dataset description for one snapshot and what it saves per query"""
+
+    def __init__(self, text, tokens, inspection_tokens):
+        self.text = text
+        self.tokens = tokens
+        # Tokens of the runtime inspection output this description replaces
+        self.inspection_tokens = inspection_tokens
+
+    @property
+    def tokens_saved(self):
+        # A lower bound: the inspection output is also resent on every later turn
+        return max(0, self.inspection_tokens - self.tokens)
+
+    def usage_metrics(self):
+        """Tokens this description saves a query, in the crew's usage_metrics fields"""
+        return {"total_tokens": self.tokens_saved, "prompt_tokens": self.tokens_saved,
+                "completion_tokens": 0, "successful_requests": 0}
+
+
+class PromptContextBuilder:
+    """Merge the views schema with a snapshot's profile into a token-budgeted description
+
+    The description lists every column with its dtype, range or values and
+    schema description, dropping detail level by level until it fits the
+    budget. It is built once per snapshot and dropped with it.
+    """
+
+    def __init__(self, schema=None, token_budget=PROMPT_CONTEXT_TOKENS):
+        self.schema = schema or load_schema()
+        self.token_budget = token_budget
+        self._contexts = weakref.WeakKeyDictionary()
+        # One lock per snapshot, so building one version never holds up requests on another
+        self._locks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def build(self, profile, frames, chunked=False):
+        frame_names = CHUNKED_FRAME_NAMES if chunked else FRAME_NAMES
+        text = ""
+        for detail in DETAIL_LEVELS:
+            text = render_context(profile, self.schema, frame_names, detail)
+            if estimate_tokens(text) <= self.token_budget:
+                break
+        else:
+            # Even the terse form is too long; keep whole lines up to the budget
+            lines, kept = text.splitlines(), []
+            for line in lines:
+                if estimate_tokens("\n".join(kept + [line])) > self.token_budget:
+                    break
+                kept.append(line)
+            text = "\n".join(kept)
+        return DatasetContext(text, estimate_tokens(text), inspection_tokens(frames))
+
+    def context(self, snapshot):
+        """The DatasetContext of a DatasetSnapshot, built on first use"""
+        context = self._contexts.get(snapshot)
+        if context is not None:
+            return context
+        with self._lock:
+            snapshot_lock = self._locks.setdefault(snapshot, threading.Lock())
+        with snapshot_lock:
+            # Another request may have built it while this one waited
+            context = self._contexts.get(snapshot)
+            if context is None:
+                context = self.build(snapshot.profile(), snapshot.sample_frames(), snapshot.chunked)
+                with self._lock:
+                    self._contexts[snapshot] = context
+        return context
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Location and limits of the persistent result cache; a relative
+# RESULT_CACHE_PATH is taken from the project directory, not the cwd
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_RESULT_CACHE_PATH = ".cache/results.sqlite3"
+DEFAULT_RESULT_CACHE_MAX_ENTRIES = 500
+DEFAULT_RESULT_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Words that do not change what an analysis query asks for
+FILLER_WORDS = {"a", "an", "the", "please", "can", "you", "me", "show", "give", "tell", "kindly"}
+
+
+def normalize_query(query):
+    """Reduce a query to a canonical form so trivially different phrasings share an entry"""
+    words = re.sub(r"[^\w\s]", " ", query.lower()).split()
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+def result_cache_path():
+    """The configured cache file, read when the cache is first used so .env settings apply"""
+    path = Path(os.getenv("RESULT_CACHE_PATH", DEFAULT_RESULT_CACHE_PATH))
+    return path if path.is_absolute() else PROJECT_DIR / path
+
+
+def result_cache_limits():
+    """The configured (max_entries, ttl_seconds), read alongside the path on first use"""
+    max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", str(DEFAULT_RESULT_CACHE_MAX_ENTRIES)))
+    ttl_seconds = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(DEFAULT_RESULT_CACHE_TTL_SECONDS)))
+    return max_entries, ttl_seconds
+
+
+def to_jsonable(result):
+    """Convert a crew result into something that can be stored as JSON"""
+    if hasattr(result, "model_dump"):
+        return result.model_dump(mode="json")
+    if isinstance(result, (dict, list, str, int, float, bool)) or result is None:
+        return result
+    return str(result)
+
+
+class ResultCache:
+    """SQLite-backed cache of analysis results with LRU and TTL eviction
+
+    Entries are keyed on the normalised query plus the dataset version, so
+    a change to the CSV sources makes every older entry unreachable; those
+    entries are purged the first time the new version is seen.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl_seconds=None):
+        # The database is opened and unset settings are read on first use,
+        # so creating the cache touches no files and sees .env values
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._current_version = None
+        self._conn = None
+
+    @property
+    def conn(self):
+        """The open database, created on first use; called with the lock held"""
+        if self._conn is None:
+            max_entries, ttl_seconds = result_cache_limits()
+            if self.max_entries is None:
+                self.max_entries = max_entries
+            if self.ttl_seconds is None:
+                self.ttl_seconds = ttl_seconds
+            path = Path(self.path) if self.path else result_cache_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(path), check_same_thread=False)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    dataset_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    metrics TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+            conn.commit()
+            self.path, self._conn = str(path), conn
+        return self._conn
+
+    @staticmethod
+    def make_key(query, dataset_version):
+        raw = f"{dataset_version}\n{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _purge_other_versions(self, dataset_version):
+        # Only runs when the version changes, not on every lookup
+        if dataset_version != self._current_version:
+            self.conn.execute("DELETE FROM results WHERE dataset_version != ?", (dataset_version,))
+            self.conn.commit()
+            self._current_version = dataset_version
+
+    def get(self, query, dataset_version):
+        """Return (result, metrics) for a cached query, or None on a miss"""
+        key = self.make_key(query, dataset_version)
+        now = time.time()
+        with self._lock:
+            self._purge_other_versions(dataset_version)
+            row = self.conn.execute(
+                "SELECT result, metrics, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl_seconds:
+                if row is not None:
+                    self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, query, dataset_version, result, metrics):
+        """Store a result and evict the least recently used entries over the limit"""
+        key = self.make_key(query, dataset_version)
+        now = time.time()
+        with self._lock:
+            self._purge_other_versions(dataset_version)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, query, dataset_version, json.dumps(to_jsonable(result)),
+                 json.dumps(metrics or {}), now, now),
+            )
+            self.conn.execute(
+                "DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.conn.execute(
+                """
+                DELETE FROM results WHERE key IN (
+                    SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM results")
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
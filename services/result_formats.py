@@ -0,0 +1,138 @@
+import gzip
+import io
+import json
+import os
+from fastapi.encoders import jsonable_encoder
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+JSON_MEDIA_TYPE = "application/json"
+
+# Accept values understood for each format; the first is the one sent back
+MEDIA_TYPES = {
+    "arrow": [ARROW_STREAM_MEDIA_TYPE, "application/x-arrow-stream"],
+    "parquet": [PARQUET_MEDIA_TYPE, "application/x-parquet", "application/parquet"],
+    "json": [JSON_MEDIA_TYPE],
+}
+
+# Rows per Arrow record batch, so large tables go out without one big buffer
+ARROW_BATCH_ROWS = int(os.getenv("ARROW_BATCH_ROWS", "65536"))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+# JSON bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+def negotiate(accept, requested=None):
+    """Format ("arrow", "parquet" or "json") for an Accept header, or a format asked for by name
+
+    Media ranges are tried by q-value, then in the order given; anything
+    unrecognised (including */*) gets JSON. Raises ValueError for an
+    unknown requested format.
+    """
+    if requested:
+        if requested not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported result format {requested!r}; expected one of {list(MEDIA_TYPES)}")
+        return requested
+    ranges = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type and quality > 0:
+            ranges.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(ranges):
+        for name, media_types in MEDIA_TYPES.items():
+            if media_type in media_types:
+                return name
+    return "json"
+
+
+def _as_text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+
+def to_arrow(frame, metadata=None):
+    """An Arrow table of a result frame
+
+    Numeric columns keep their NumPy buffers (no copy when they have no
+    missing values); object columns Arrow cannot type, such as mixed
+    values, are sent as strings. metadata is added to the schema.
+    """
+    import pyarrow as pa
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        frame = frame.copy(deep=False)
+        for column in frame.columns:
+            if frame[column].dtype == object:
+                frame[column] = frame[column].map(_as_text)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    if metadata:
+        encoded = {key.encode("utf-8"): str(value).encode("utf-8") for key, value in metadata.items()}
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **encoded})
+    return table
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write target collecting what the IPC writer produces until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def arrow_stream(table, batch_rows=ARROW_BATCH_ROWS):
+    """Yield an Arrow table as an IPC stream, one record batch per chunk
+
+    Only the batch being sent is held as bytes, however large the table.
+    """
+    import pyarrow as pa
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), table.schema)
+    # The schema message goes out first so readers can start before the data arrives
+    yield sink.drain()
+    for batch in table.to_batches(max_chunksize=batch_rows):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def parquet_bytes(table, compression=PARQUET_COMPRESSION):
+    """An Arrow table as a Parquet file (the footer is written last, so it is not streamed)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression=compression)
+    return sink.getvalue().to_pybytes()
+
+
+def json_bytes(body, accept_encoding=None):
+    """A JSON body and its Content-Encoding (gzip when the client takes it and it pays off, else None)
+
+    The body goes through FastAPI's encoder first, so models such as a
+    CrewOutput keep the object shape a plain JSON response gives them.
+    """
+    # str() only for what the encoder itself cannot handle
+    data = json.dumps(jsonable_encoder(body), default=str).encode("utf-8")
+    if len(data) >= GZIP_MIN_BYTES and "gzip" in (accept_encoding or "").lower():
+        return gzip.compress(data, compresslevel=6), "gzip"
+    return data, None
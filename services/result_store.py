@@ -0,0 +1,165 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from services.currency_format import format_frame
+from services.result_cache import normalize_query
+
+# Structured results kept in memory for paging, least recently used dropped first
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "64"))
+
+# Rows per table page, by default and at most
+RESULT_PAGE_ROWS = int(os.getenv("RESULT_PAGE_ROWS", "100"))
+MAX_RESULT_PAGE_ROWS = 1000
+
+# Characters of the result text included in a structured response
+RESULT_TEXT_PREVIEW_CHARS = 4000
+
+
+def result_id_for(query, dataset_version):
+    """Stable id of the answer to a query on a dataset version, so cached answers keep their pages"""
+    return hashlib.sha1(f"{normalize_query(query)}|{dataset_version}".encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Row offset of a cursor (0 for none); raises ValueError for a malformed cursor"""
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["offset"]
+    except Exception:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return offset
+
+
+def _section(text, css_class):
+    """Inner text of the first <div class="css_class">, found without scanning the text with a regex"""
+    opening = f'<div class="{css_class}">'
+    start = text.find(opening)
+    if start == -1:
+        return ""
+    start += len(opening)
+    end = text.find("</div>", start)
+    return text[start:end if end != -1 else len(text)].strip()
+
+
+def _as_table(value):
+    """A DataFrame with a plain row index; named index levels (group keys) become leading columns"""
+    table = value.to_frame() if isinstance(value, pd.Series) else value.copy(deep=False)
+    if any(name is not None for name in table.index.names):
+        table = table.reset_index()
+    else:
+        # Row labels of a filtered frame carry no information
+        table = table.reset_index(drop=True)
+    table.columns = ["_".join(str(part) for part in column) if isinstance(column, tuple) else str(column)
+                     for column in table.columns]
+    return table
+
+
+class AnalysisResult:
+    """One answer split into parts: text, summary, insights, tables and chart references
+
+    The tables stay here as DataFrames; clients read them a page at a time
+    instead of receiving every row rendered into the result text.
+    """
+
+    def __init__(self, result_id, text, tables=None, charts=None):
+        self.result_id = result_id
+        self.text = str(text)
+        self.summary = _section(self.text, "summary")
+        self.insights = _section(self.text, "insights")
+        self.tables = {name: _as_table(value) for name, value in (tables or {}).items()}
+        # Rendered figure ids, filled in by the chart stage
+        self.charts = list(charts or [])
+
+    def page(self, name, cursor=None, limit=RESULT_PAGE_ROWS, formatted=False):
+        """One page of a table; raises KeyError for an unknown table and ValueError for a bad cursor"""
+        table = self.tables[name]
+        offset = decode_cursor(cursor)
+        limit = max(1, min(int(limit), MAX_RESULT_PAGE_ROWS))
+        rows = table.iloc[offset:offset + limit]
+        if formatted:
+            rows = format_frame(rows)
+        data = json.loads(rows.to_json(orient="split", index=False, date_format="iso"))
+        end = offset + len(rows)
+        return {
+            "table": name,
+            "columns": data["columns"],
+            "rows": data["data"],
+            "offset": offset,
+            "total_rows": len(table),
+            "next_cursor": encode_cursor(end) if end < len(table) else None,
+        }
+
+    def rows(self, name, cursor=None, limit=None):
+        """Rows of a table from a cursor, to the end unless limited; binary formats are sent unpaged
+
+        Raises KeyError for an unknown table and ValueError for a bad cursor.
+        """
+        table = self.tables[name]
+        offset = decode_cursor(cursor)
+        return table.iloc[offset:] if limit is None else table.iloc[offset:offset + max(1, int(limit))]
+
+    def primary_table(self, name=None):
+        """Name of the table an answer is sent as: name, else "result", else the first; None if it has none"""
+        if name is not None:
+            if name not in self.tables:
+                raise KeyError(name)
+            return name
+        if "result" in self.tables:
+            return "result"
+        return next(iter(self.tables), None)
+
+    def overview(self, page_rows=RESULT_PAGE_ROWS, formatted=False):
+        """Everything but the table rows past the first page of each table"""
+        return {
+            "result_id": self.result_id,
+            "summary": self.summary,
+            "insights": self.insights,
+            "text": self.text[:RESULT_TEXT_PREVIEW_CHARS],
+            "text_truncated": len(self.text) > RESULT_TEXT_PREVIEW_CHARS,
+            "tables": [
+                {"name": name, "rows": len(table), "columns": list(table.columns),
+                 "first_page": self.page(name, limit=page_rows, formatted=formatted)}
+                for name, table in self.tables.items()
+            ],
+            "charts": [{"id": chart_id, "url": f"/charts/{chart_id}"} for chart_id in self.charts],
+        }
+
+
+class ResultStore:
+    """In-memory LRU of AnalysisResults by result id"""
+
+    def __init__(self, max_entries=RESULT_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, result):
+        with self._lock:
+            self._results[result.result_id] = result
+            self._results.move_to_end(result.result_id)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def get(self, result_id):
+        with self._lock:
+            result = self._results.get(result_id)
+            if result is not None:
+                self._results.move_to_end(result_id)
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._results), "max_entries": self.max_entries}
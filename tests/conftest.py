@@ -0,0 +1,56 @@
+import os
+import sys
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Keep the tests offline, as the benchmark does
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+
+from data.schema_dtypes import (  # noqa: E402
+    CUSTOMER_SUMMARY_TABLE, PAYMENT_SUMMARY_TABLE, align_loan_key, load_schema, read_typed_csv
+)
+
+SCHEMA_PATH = os.path.join(REPO_ROOT, "schema", "views_schema.json")
+CUSTOMER_SUMMARY_PATH = os.path.join(REPO_ROOT, "csv", "customer_summary.csv")
+PAYMENT_SUMMARY_PATH = os.path.join(REPO_ROOT, "csv", "payment_summary.csv")
+
+
+@pytest.fixture(scope="session")
+def schema():
+    return load_schema(SCHEMA_PATH)
+
+
+@pytest.fixture(scope="session")
+def real_frames(schema, tmp_path_factory):
+    """The bundled loan and payment CSVs, typed as main.load_datasets() reads them"""
+    # The Feather copies go under the working directory; keep them out of the tree
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("datasets"))
+    try:
+        loan_df = read_typed_csv(CUSTOMER_SUMMARY_PATH, CUSTOMER_SUMMARY_TABLE, schema)
+        payment_df = read_typed_csv(PAYMENT_SUMMARY_PATH, PAYMENT_SUMMARY_TABLE, schema, encoding="utf-8-sig")
+    finally:
+        os.chdir(cwd)
+    return align_loan_key(loan_df, payment_df)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """main imported as the server runs it, from the project directory; startup hooks are not run"""
+    cwd = os.getcwd()
+    os.chdir(REPO_ROOT)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+@pytest.fixture()
+def client(app_module):
+    from fastapi.testclient import TestClient
+    # Not entered as a context manager, so no datasets are loaded and no pools started
+    return TestClient(app_module.app)
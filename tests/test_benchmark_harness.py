@@ -0,0 +1,134 @@
+import importlib
+import json
+import pytest
+from benchmarks.measure import percentile
+from benchmarks.replay_llm import ReplayLLM
+from conftest import REPO_ROOT
+
+QUERY = "Analyze loan distribution by customer type and branch"
+
+
+@pytest.fixture()
+def recordings(tmp_path):
+    path = tmp_path / "recordings.json"
+    path.write_text(json.dumps({
+        "default": {"Code Generator": ["Final Answer: default"], "Code Executor": ["Final Answer: default"]},
+        "queries": {
+            QUERY: {
+                "Code Generator": ["Thought: run it\nAction: Code Interpreter\nAction Input: {}",
+                                   "Final Answer: generated"],
+                "Code Executor": ["Final Answer: {observation}"],
+            },
+        },
+    }))
+    return str(path)
+
+
+@pytest.fixture()
+def benchmark(tmp_path, monkeypatch):
+    # The module points its caches at a temp dir through the environment on import
+    for name in ("RESULT_CACHE_PATH", "CODE_TEMPLATES_PATH"):
+        monkeypatch.setenv(name, str(tmp_path / name))
+    return importlib.import_module("benchmarks.offline_benchmark")
+
+
+def test_replay_follows_the_conversation(recordings):
+    llm = ReplayLLM(recordings)
+    system = {"role": "system", "content": "You are Code Generator. Write code."}
+    user = {"role": "user", "content": f"Query: {QUERY}\nAction Input: expected"}
+    assert "Action: Code Interpreter" in llm.call([system, user])
+    assistant = {"role": "assistant", "content": "Action: Code Interpreter"}
+    assert llm.call([system, user, assistant]) == "Final Answer: generated"
+    # Past the last recorded turn the final completion repeats
+    assert llm.call([system, user, assistant, assistant]) == "Final Answer: generated"
+    assert llm.calls == 3
+
+
+def test_replay_without_tools_gives_the_final_answer(recordings):
+    llm = ReplayLLM(recordings)
+    messages = [{"role": "system", "content": "You are Code Generator."}, {"role": "user", "content": QUERY}]
+    assert llm.call(messages) == "Final Answer: generated"
+
+
+def test_replay_echoes_the_last_observation(recordings):
+    llm = ReplayLLM(recordings)
+    messages = [{"role": "system", "content": "You are Code Executor."},
+                {"role": "user", "content": f"{QUERY}\nAction Input: {{}}\nObservation: first\nObservation: 42 rows"}]
+    assert llm.call(messages) == "Final Answer: 42 rows"
+
+
+def test_replay_falls_back_to_the_default(recordings):
+    assert ReplayLLM(recordings).call("You are Code Executor. Something else") == "Final Answer: default"
+
+
+def test_recorded_completions_cover_the_example_queries(app_module):
+    with open(f"{REPO_ROOT}/benchmarks/recorded_completions.json", encoding="utf-8") as f:
+        recordings = json.load(f)
+    # The benchmark sends the queries main() lists
+    assert set(app_module.EXAMPLE_QUERIES) <= set(recordings["queries"])
+    for query in app_module.EXAMPLE_QUERIES:
+        assert set(recordings["queries"][query]) == set(recordings["default"])
+
+
+def test_replay_reports_usage_to_token_callbacks(recordings):
+    from crewai.agents.agent_builder.utilities.base_token_process import TokenProcess
+    from crewai.utilities.token_counter_callback import TokenCalcHandler
+    tokens = TokenProcess()
+    completion = ReplayLLM(recordings).call(f"You are Code Generator. {QUERY}", callbacks=[TokenCalcHandler(tokens)])
+    summary = tokens.get_summary()
+    assert summary.successful_requests == 1
+    assert summary.prompt_tokens > 0 and summary.completion_tokens == -(-len(completion) // 4)
+    assert summary.total_tokens == summary.prompt_tokens + summary.completion_tokens
+
+
+def test_percentile_is_nearest_rank():
+    assert percentile([], 95) == 0.0
+    assert percentile(list(range(1, 101)), 50) == 50
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([5], 99) == 5
+
+
+def test_error_answers_count_as_errors(benchmark):
+    for answer in ("An error occurred: name 'x' is not defined", {"raw": "Error in generated code: boom"}):
+        with pytest.raises(RuntimeError):
+            benchmark.check_answer(answer)
+    benchmark.check_answer({"raw": "result: 42"})
+    benchmark.check_answer("Totals by branch")
+
+
+def test_crew_only_bypasses_router_cache_and_templates(benchmark, app_module):
+    originals = app_module.run_router, app_module.run_template, app_module.result_cache
+    with benchmark.crew_only(app_module):
+        assert app_module.run_router("total loans", None) is None
+        assert app_module.run_template("total loans", None) is None
+        assert app_module.result_cache.get("total loans", "v1") is None
+    assert (app_module.run_router, app_module.run_template, app_module.result_cache) == originals
+
+
+def test_summary_and_regressions(benchmark):
+    samples = [{"ms": ms, "served_by": "crew", "tokens": 100, "error": None,
+                "spans": [{"stage": "crew", "ms": ms / 2}]} for ms in (10.0, 20.0, 30.0)]
+    samples.append({"ms": 5.0, "served_by": "error", "tokens": 0, "error": "RuntimeError: x", "spans": []})
+    summary = benchmark.summarise(samples, wall_seconds=1.0)
+    assert summary["requests"] == 4 and summary["errors"] == 1
+    assert summary["p50_ms"] == 20.0 and summary["throughput_rps"] == 3.0
+    assert summary["stages"]["crew"]["count"] == 3
+    assert summary["served_by"] == {"crew": 3, "error": 1}
+
+    baseline = {"run_analysis@c1": {**summary, "p95_ms": 20.0, "errors": 0}}
+    regressions = benchmark.compare_with_baseline({"run_analysis@c1": summary}, baseline)
+    assert any("p95" in regression for regression in regressions)
+    assert any("errors" in regression for regression in regressions)
+    assert benchmark.compare_with_baseline({"run_analysis@c1": summary}, {"run_analysis@c1": summary}) == []
+
+
+def test_mode_comparison_says_which_way_it_goes(benchmark):
+    base = {"p50_ms": 100.0, "p95_ms": 200.0, "mean_tokens": 1000.0}
+    results = {"run_analysis@c1": base,
+               "run_analysis[direct]@c1": {"p50_ms": 60.0, "p95_ms": 441.0, "mean_tokens": 250.0}}
+    saved = benchmark.compare_modes(results, ["agents", "direct"])["direct@c1"]
+    assert saved["p95_ms_saved"] == -241.0 and saved["tokens_saved"] == 750.0
+    line = benchmark.describe_savings("direct@c1", saved)
+    assert line == ("direct@c1 vs agents: p50 40.0 ms faster, p95 241.0 ms slower, "
+                    "750.0 tokens fewer per query (75.0 % fewer)")
+    assert "--" not in line
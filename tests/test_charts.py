@@ -0,0 +1,70 @@
+import os
+import pickle
+import time
+from matplotlib.figure import Figure
+from services.charts import CHART_FORMATS, ChartRenderer, figure_digest
+
+
+def _captured(values):
+    figure = Figure()
+    figure.add_subplot().plot(values)
+    return {"id": figure_digest(figure), "figure": pickle.dumps(figure)}
+
+
+def _render(renderer, captured):
+    [chart_id] = renderer.submit([captured])
+    assert renderer.get(chart_id) is not None
+    return chart_id
+
+
+def _age(renderer, chart_id, seconds):
+    past = time.time() - seconds
+    for chart_format in CHART_FORMATS:
+        os.utime(renderer._path(chart_id, chart_format), (past, past))
+
+
+def test_least_recently_used_chart_is_evicted(tmp_path):
+    renderer = ChartRenderer(cache_dir=str(tmp_path), max_entries=2)
+    try:
+        first = _render(renderer, _captured([1, 2, 3]))
+        second = _render(renderer, _captured([3, 2, 1]))
+        _age(renderer, first, 20)
+        _age(renderer, second, 10)
+        # Reading the older chart makes it the most recently used
+        assert renderer.get(first) is not None
+        third = _render(renderer, _captured([2, 2, 2]))
+        assert renderer.get(second) is None
+        assert renderer.get(first) is not None and renderer.get(third) is not None
+        assert sorted(os.listdir(tmp_path)) == sorted(f"{chart_id}.{chart_format}" for chart_id in (first, third)
+                                                      for chart_format in CHART_FORMATS)
+        assert renderer.stats()["evicted"] == 1
+    finally:
+        renderer.shutdown()
+
+
+def test_expired_charts_are_removed_on_start(tmp_path):
+    renderer = ChartRenderer(cache_dir=str(tmp_path))
+    try:
+        old = _render(renderer, _captured([1, 2, 3]))
+        recent = _render(renderer, _captured([3, 2, 1]))
+        _age(renderer, old, 3600)
+    finally:
+        renderer.shutdown()
+    restarted = ChartRenderer(cache_dir=str(tmp_path), ttl_seconds=60)
+    try:
+        assert restarted.get(old) is None
+        assert restarted.get(recent) is not None
+    finally:
+        restarted.shutdown()
+
+
+def test_cache_hit_does_not_render_again(tmp_path):
+    renderer = ChartRenderer(cache_dir=str(tmp_path))
+    try:
+        captured = _captured([1, 2, 3])
+        _render(renderer, captured)
+        _render(renderer, captured)
+        assert renderer.stats()["rendered"] == 1
+        assert renderer.stats()["cache_hits"] == 1
+    finally:
+        renderer.shutdown()
@@ -0,0 +1,99 @@
+import pandas as pd
+from services.code_templates import (
+    TemplateLibrary, build_vocabulary, code_templates_path, extract_parameters, instantiate,
+    parameterise_code
+)
+from services.result_cache import PROJECT_DIR
+
+VOCABULARY = {"BranchName": ["MH", "PN"], "PaymentMode": ["ADJUST IN", "CASH"]}
+
+
+def test_build_vocabulary_takes_categorical_strings():
+    df = pd.DataFrame({
+        "BranchName": pd.Categorical(["MH", "PN"]),
+        "LoanId": pd.Categorical(["a", "b"]),
+        "LoanAmount": [1.0, 2.0],
+    })
+    assert build_vocabulary(df) == {"BranchName": ["MH", "PN"]}
+
+
+def test_extract_parameters():
+    shape, params = extract_parameters("Loans above 1,00,000 in MH paid by ADJUST IN", VOCABULARY)
+    assert params == {"number_0": 100000, "branchname_0": "MH", "paymentmode_0": "ADJUST IN"}
+    assert "param_number_0" in shape and "param_branchname_0" in shape
+
+
+def test_string_parameters_are_templated_everywhere():
+    code = "mh = loan_df[loan_df['BranchName'] == 'MH']\nresult = f'MH: {len(mh)}'\nprint('MH')"
+    template = parameterise_code(code, {"branchname_0": "MH"})
+    assert "'MH'" not in template
+    assert instantiate(template, {"branchname_0": "PN"}).count("'PN'") == 2
+
+
+def test_numeric_threshold_in_a_comparison_is_templated():
+    code = "result = loan_df[loan_df['LoanAmount'] > 50000].head(10)"
+    template = parameterise_code(code, {"number_0": 50000})
+    assert template is not None
+    code = instantiate(template, {"number_0": 75000})
+    assert "> 75000" in code and "head(10)" in code
+
+
+def test_numeric_threshold_in_a_filter_method_is_templated():
+    code = "result = loan_df[loan_df['LoanAmount'].gt(50000)]"
+    assert parameterise_code(code, {"number_0": 50000}) is not None
+
+
+def test_number_that_is_also_an_unrelated_literal_is_not_harvested():
+    # "top 10 loans above 10": 10 is both the threshold and the head() size
+    code = "big = loan_df[loan_df['LoanAmount'] > 10]\nresult = big.nlargest(10, 'LoanAmount')"
+    assert parameterise_code(code, {"number_0": 10}) is None
+
+
+def test_number_used_only_outside_a_filter_is_not_harvested():
+    code = "result = loan_df['LoanAmount'].round(2)"
+    assert parameterise_code(code, {"number_0": 2}) is None
+
+
+def test_parameter_missing_from_code_is_not_harvested():
+    code = "result = loan_df[loan_df['BranchName'] == 'MH']"
+    assert parameterise_code(code, {"branchname_0": "MH", "paymentmode_0": "CASH"}) is None
+
+
+def test_harvest_and_match(tmp_path):
+    library = TemplateLibrary(path=tmp_path / "templates.json")
+    code = "result = loan_df[(loan_df['BranchName'] == 'MH') & (loan_df['LoanAmount'] > 50000)].head(5)"
+    assert library.harvest("loans above 50000 in MH", code, VOCABULARY)
+
+    shape, instantiated = library.match("loans above 80000 in PN", VOCABULARY)
+    assert "'PN'" in instantiated and "> 80000" in instantiated and "head(5)" in instantiated
+    assert library.match("loans above 80000", VOCABULARY) is None
+
+    # Templates survive a restart and are dropped after repeated failures
+    reloaded = TemplateLibrary(path=tmp_path / "templates.json", max_failures=2)
+    reloaded.record_result(shape, False)
+    assert reloaded.match("loans above 80000 in PN", VOCABULARY) is not None
+    reloaded.record_result(shape, False)
+    assert reloaded.match("loans above 80000 in PN", VOCABULARY) is None
+
+
+def test_harvest_skips_ambiguous_numbers(tmp_path):
+    library = TemplateLibrary(path=tmp_path / "templates.json")
+    code = "big = loan_df[loan_df['LoanAmount'] > 10]\nresult = big.head(10)"
+    assert not library.harvest("top 10 loans above 10", code, VOCABULARY)
+    assert library.stats()["templates"] == 0
+
+
+def test_template_path_is_read_on_first_use(monkeypatch, tmp_path):
+    library = TemplateLibrary()
+    path = tmp_path / "templates" / "code_templates.json"
+    monkeypatch.setenv("CODE_TEMPLATES_PATH", str(path))
+    code = "result = loan_df[loan_df['BranchName'] == 'MH']"
+    assert library.harvest("loans in MH", code, VOCABULARY)
+    assert library.path == path and path.exists()
+
+
+def test_relative_template_path_is_resolved_against_the_project(monkeypatch):
+    monkeypatch.setenv("CODE_TEMPLATES_PATH", "somewhere/code_templates.json")
+    assert code_templates_path() == PROJECT_DIR / "somewhere" / "code_templates.json"
+    monkeypatch.setenv("CODE_TEMPLATES_PATH", "/tmp/elsewhere.json")
+    assert str(code_templates_path()) == "/tmp/elsewhere.json"
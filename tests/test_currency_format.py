@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.scaling_benchmark import scalar_inr
+from services.currency_format import format_frame, format_inr, is_monetary
+
+
+@pytest.mark.parametrize("value, expected", [
+    (0, "₹0"),
+    (7, "₹7"),
+    (999, "₹999"),
+    (1000, "₹1,000"),
+    (99999, "₹99,999"),
+    (100000, "₹1,00,000"),
+    (1234567, "₹12,34,567"),
+    (123456789, "₹12,34,56,789"),
+    (10 ** 15, "₹1,00,00,00,00,00,00,000"),
+])
+def test_indian_grouping(value, expected):
+    assert format_inr([value]).tolist() == [expected]
+
+
+def test_decimals_only_when_non_zero():
+    assert format_inr([1234.5, 1234.05, 1234.004, 0.5]).tolist() == ["₹1,234.50", "₹1,234.05", "₹1,234", "₹0.50"]
+    assert format_inr([1234.567], decimals=3).tolist() == ["₹1,234.567"]
+    assert format_inr([1234.5, 999.99], decimals=0).tolist() == ["₹1,234", "₹1,000"]
+
+
+def test_negatives_keep_the_sign_before_the_rupee():
+    assert format_inr([-1234567.25, -0.5]).tolist() == ["-₹12,34,567.25", "-₹0.50"]
+    assert format_inr([-2.5e7], abbreviate=True).tolist() == ["-₹2.50 Cr"]
+
+
+def test_missing_values_stay_missing():
+    formatted = format_inr(pd.Series([1.0, np.nan, None, np.inf, "n/a"], dtype=object))
+    assert formatted.iloc[0] == "₹1"
+    assert formatted.iloc[1:].isna().all()
+
+
+def test_abbreviations():
+    values = [99999, 100000, 148500, 1234567, 9999999, 10 ** 7, 2.5e9]
+    assert format_inr(values, abbreviate=True).tolist() == [
+        "₹99,999", "₹1.00 L", "₹1.49 L", "₹12.35 L", "₹100.00 L", "₹1.00 Cr", "₹250.00 Cr"
+    ]
+    assert format_inr([1234567.89], decimals=0, abbreviate=True).tolist() == ["₹12.35 L"]
+
+
+def test_series_keeps_index_and_name():
+    values = pd.Series([1500.0, 2.5], index=["a", "b"], name="LoanAmount")
+    formatted = format_inr(values)
+    assert formatted.name == "LoanAmount" and list(formatted.index) == ["a", "b"]
+    assert format_inr(values.iloc[:0]).tolist() == []
+
+
+def test_matches_the_scalar_formatter():
+    rng = np.random.default_rng(0)
+    values = np.round(rng.lognormal(10, 3, 5000), 2)
+    assert format_inr(values).tolist() == [scalar_inr(value) for value in values]
+
+
+def test_format_frame_formats_only_amounts():
+    frame = pd.DataFrame({"BranchName": ["A"], "sum_LoanAmount": [150000.0], "loan_count": [3],
+                          "OutstandingAmount": [12.5], "NPA": [True]})
+    formatted = format_frame(frame)
+    assert formatted.iloc[0].tolist() == ["A", "₹1,50,000", 3, "₹12.50", True]
+    assert not is_monetary("amount_ratio")
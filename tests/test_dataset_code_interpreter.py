@@ -0,0 +1,36 @@
+import pandas as pd
+from services.execution_pool import ExecutionResult
+from services.metrics import start_trace
+from tools.dataset_code_interpreter import DatasetCodeInterpreterTool
+
+CODE = "result = loan_df['LoanAmount'].sum()"
+
+
+def test_tool_runs_with_the_frames_in_scope():
+    successes = []
+    tool = DatasetCodeInterpreterTool(namespace={"loan_df": pd.DataFrame({"LoanAmount": [100, 250]})},
+                                      on_success=successes.append)
+    # Through the agent-facing entry point, not run_code_unsafe()
+    with start_trace() as trace:
+        assert tool.run(code=CODE, libraries_used=["pandas"]) == 350
+    assert successes == [CODE]
+    assert "tool_call:code_interpreter" in [span["stage"] for span in trace.to_dict()["spans"]]
+
+
+def test_pooled_tool_uses_the_bound_executor():
+    calls = []
+
+    def executor(code):
+        calls.append(code)
+        return ExecutionResult(result_text="350")
+
+    # As create_pooled_crew() builds it, bound to a request afterwards
+    tool = DatasetCodeInterpreterTool()
+    tool.namespace, tool.executor = {"loan_df": pd.DataFrame({"LoanAmount": [100, 250]})}, executor
+    assert tool.run(code=CODE, libraries_used=[]) == "350"
+    assert calls == [CODE]
+
+
+def test_tool_reports_errors():
+    tool = DatasetCodeInterpreterTool(namespace={})
+    assert tool.run(code=CODE, libraries_used=[]).startswith("An error occurred: name 'loan_df'")
@@ -0,0 +1,119 @@
+import os
+import shutil
+import pytest
+from conftest import CUSTOMER_SUMMARY_PATH, PAYMENT_SUMMARY_PATH
+from data.dataset_store import DatasetStore
+from data.schema_dtypes import (
+    CUSTOMER_SUMMARY_TABLE, PAYMENT_SUMMARY_TABLE, align_loan_key, read_appended_rows, read_typed_csv
+)
+
+BASE_PAYMENT_LINES = 200
+
+
+@pytest.fixture()
+def sources(tmp_path, monkeypatch):
+    """Copies of the loan export and the first payment rows, with the columnar caches kept beside them"""
+    monkeypatch.chdir(tmp_path)
+    loans = tmp_path / "customer_summary.csv"
+    shutil.copy(CUSTOMER_SUMMARY_PATH, loans)
+    with open(PAYMENT_SUMMARY_PATH, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    payments = tmp_path / "payment_summary.csv"
+    payments.write_bytes(b"".join(lines[:BASE_PAYMENT_LINES + 1]))
+    return str(loans), str(payments), lines[BASE_PAYMENT_LINES + 1:]
+
+
+def _append(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def _store(schema, loans, payments):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        loan_df = read_typed_csv(loans, CUSTOMER_SUMMARY_TABLE, schema)
+        payment_df = read_typed_csv(payments, PAYMENT_SUMMARY_TABLE, schema, encoding="utf-8-sig")
+        return align_loan_key(loan_df, payment_df)
+
+    def read_payment_rows(offset):
+        return read_appended_rows(payments, PAYMENT_SUMMARY_TABLE, offset, schema, encoding="utf-8-sig")
+
+    store = DatasetStore(loader, [loans, payments], payment_path=payments, read_payment_rows=read_payment_rows)
+    assert store.load()
+    return store, loads
+
+
+def test_appended_rows_stop_at_the_last_complete_line(schema, sources):
+    _, payments, new_lines = sources
+    offset = os.path.getsize(payments)
+    partial = new_lines[2][:10]
+    _append(payments, b"".join(new_lines[:2]) + partial)
+    rows, end_offset = read_appended_rows(payments, PAYMENT_SUMMARY_TABLE, offset, schema, encoding="utf-8-sig")
+    assert len(rows) == 2
+    assert end_offset == offset + len(new_lines[0]) + len(new_lines[1])
+    # The rest of the row is read once it is complete
+    _append(payments, new_lines[2][10:])
+    rows, final_offset = read_appended_rows(payments, PAYMENT_SUMMARY_TABLE, end_offset, schema,
+                                            encoding="utf-8-sig")
+    assert len(rows) == 1
+    assert final_offset == os.path.getsize(payments)
+    assert str(rows["TransactionAmount"].dtype) == "float64"
+
+
+def test_refresh_appends_only_the_new_payment_rows(schema, sources):
+    loans, payments, new_lines = sources
+    store, loads = _store(schema, loans, payments)
+    before = store.current()
+    total_before = before.loan_payments.loan_payment_summary["total_amount"].sum()
+    _append(payments, b"".join(new_lines[:5]))
+    version = store.refresh_if_stale()
+    after = store.current()
+    assert version == after.version != before.version
+    # Appended, not reloaded
+    assert len(loads) == 1
+    assert len(after.payment_df) == BASE_PAYMENT_LINES + 5
+    assert after.append_state[0] == os.path.getsize(payments)
+    added = after.payment_df["TransactionAmount"].iloc[BASE_PAYMENT_LINES:].sum()
+    assert after.loan_payments.loan_payment_summary["total_amount"].sum() == pytest.approx(total_before + added)
+    # A request holding the earlier snapshot keeps its rows
+    assert len(before.payment_df) == BASE_PAYMENT_LINES
+    assert store.refresh_if_stale() == version and len(loads) == 1
+
+
+def test_partial_row_waits_for_the_next_refresh(schema, sources):
+    loans, payments, new_lines = sources
+    store, loads = _store(schema, loans, payments)
+    _append(payments, new_lines[0] + new_lines[1][:5])
+    store.refresh_if_stale()
+    assert len(store.current().payment_df) == BASE_PAYMENT_LINES + 1
+    _append(payments, new_lines[1][5:])
+    store.refresh_if_stale()
+    assert len(store.current().payment_df) == BASE_PAYMENT_LINES + 2
+    assert len(loads) == 1
+
+
+def test_rewritten_payments_are_reloaded(schema, sources):
+    loans, payments, new_lines = sources
+    store, loads = _store(schema, loans, payments)
+    with open(payments, "rb") as f:
+        data = f.read()
+    # Same size, earlier bytes changed: not an append
+    first_row = data.index(b"\n") + 1
+    changed = data[:first_row] + data[first_row:].replace(b"CASH", b"HSAC", 1)
+    with open(payments, "wb") as f:
+        f.write(changed + new_lines[0])
+    store.refresh_if_stale()
+    assert len(loads) == 2
+    assert len(store.current().payment_df) == BASE_PAYMENT_LINES + 1
+
+
+def test_changed_loans_force_a_reload(schema, sources):
+    loans, payments, new_lines = sources
+    store, loads = _store(schema, loans, payments)
+    stat = os.stat(loans)
+    os.utime(loans, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    _append(payments, new_lines[0])
+    store.refresh_if_stale()
+    assert len(loads) == 2
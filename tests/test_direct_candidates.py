@@ -0,0 +1,84 @@
+import threading
+from crew import crew_orchestrator
+from services.event_stream import emit, streaming
+from services.execution_pool import ExecutionResult
+from services.metrics import start_trace
+from services.prompt_context import DatasetContext
+
+
+class RecordingStream:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, data):
+        self.events.append((event, data))
+
+
+def test_only_the_winning_candidate_reaches_the_request(monkeypatch):
+    loser_started, loser_done = threading.Event(), threading.Event()
+    loser_outcomes = []
+
+    def fake_generate_and_run(query, loading_instructions, namespace, executor, dataset_context, cancelled):
+        if query == "q":
+            loser_started.wait(5)
+            outcome = executor("winner")
+            return outcome, "winner", None, {"total_tokens": 10}
+        # The loser is still generating when the winner finishes
+        loser_started.set()
+        cancelled.wait(5)
+        emit("late_event")
+        loser_outcomes.append(executor("loser"))
+        loser_done.set()
+        return loser_outcomes[-1], "loser", loser_outcomes[-1].error, {"total_tokens": 5}
+
+    monkeypatch.setattr(crew_orchestrator, "_generate_and_run", fake_generate_and_run)
+    executed, answer_executions = [], []
+
+    def executor(code):
+        executed.append(code)
+        return ExecutionResult(output=code, result_text=code)
+
+    stream = RecordingStream()
+    with streaming(stream):
+        result, metrics = crew_orchestrator._run_direct(
+            "q", "", {}, None, executor, None, candidates=2, on_execution=answer_executions.append
+        )
+    assert loser_done.wait(5)
+
+    assert result == "winner"
+    assert [execution.output for execution in answer_executions] == ["winner"]
+    # The loser neither ran its code nor reached the stream after the winner was chosen
+    assert executed == ["winner"]
+    assert loser_outcomes[0].error == crew_orchestrator.CANDIDATE_CANCELLED
+    assert "late_event" not in [event for event, _ in stream.events]
+    assert metrics["candidates"] == 2
+
+
+def test_single_candidate_passes_its_outcome(monkeypatch):
+    def fake_generate_and_run(query, loading_instructions, namespace, executor, dataset_context, cancelled):
+        emit("generated")
+        return executor("code"), "code", None, {}
+
+    monkeypatch.setattr(crew_orchestrator, "_generate_and_run", fake_generate_and_run)
+    answer_executions, stream = [], RecordingStream()
+    with streaming(stream):
+        crew_orchestrator._run_direct(
+            "q", "", {}, None, lambda code: ExecutionResult(output=code), None, on_execution=answer_executions.append
+        )
+    assert len(answer_executions) == 1
+    assert [event for event, _ in stream.events] == ["generated"]
+
+
+def test_context_tokens_are_returned_with_the_metrics(monkeypatch):
+    def fake_generate_and_run(query, loading_instructions, namespace, executor, dataset_context, cancelled):
+        return executor("code"), "code", None, {"total_tokens": 10}
+
+    monkeypatch.setattr(crew_orchestrator, "_generate_and_run", fake_generate_and_run)
+    context = DatasetContext("loan_df: 3 columns", tokens=100, inspection_tokens=400)
+    with start_trace() as trace:
+        _, metrics = crew_orchestrator._run_direct(
+            "q", "", {}, None, lambda code: ExecutionResult(output=code), context, candidates=1
+        )
+    assert (metrics["context_tokens"], metrics["context_tokens_saved"]) == (100, 300)
+    # The savings are still reported as their own token stage
+    assert trace.to_dict()["tokens"][crew_orchestrator.CONTEXT_SAVINGS_STAGE]["prompt_tokens"] == 300
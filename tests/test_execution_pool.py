@@ -0,0 +1,81 @@
+import os
+import threading
+import pandas as pd
+import pytest
+from conftest import REPO_ROOT
+from services import execution_pool
+from services.execution_pool import RESULT_TABLE_NAMES, ExecutionPool, execute_code
+
+pytestmark = pytest.mark.skipif(not ExecutionPool.supported(), reason="needs fork")
+
+
+def namespace_factory(version):
+    return {"pd": pd, "df": pd.DataFrame({"x": [1, 2, 3]}), "version": version}
+
+
+def test_execute_code_returns_only_requested_frames():
+    code = "scratch = df[df.x > 1]\nother = df.x * 2\nresult = scratch.sum()"
+    outcome = execute_code(code, namespace_factory(None))
+    assert set(outcome.tables) == {"result"}
+    outcome = execute_code(code, namespace_factory(None), table_names=("result", "other"))
+    assert set(outcome.tables) == {"result", "other"}
+
+
+def test_execute_code_skips_unchanged_frames_and_keeps_text_result():
+    outcome = execute_code("result = len(df)\nprint('hi')", namespace_factory(None), table_names=("df", "result"))
+    assert outcome.tables == {}
+    assert outcome.result_text == "3" and outcome.output == "hi\n"
+
+
+def test_execute_code_reports_errors():
+    outcome = execute_code("1 / 0", namespace_factory(None))
+    assert outcome.error.startswith("ZeroDivisionError") and "Traceback" in outcome.errors
+
+
+@pytest.fixture
+def fork_threads(monkeypatch):
+    names = []
+    worker_init = execution_pool._Worker.__init__
+
+    def recording_init(self, *args, **kwargs):
+        names.append(threading.current_thread().name)
+        worker_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(execution_pool._Worker, "__init__", recording_init)
+    return names
+
+
+def test_pool_runs_code_and_forks_only_from_the_forker_thread(fork_threads):
+    versions = {"current": "v1"}
+    pool = ExecutionPool(namespace_factory, version=lambda: versions["current"], size=1, timeout=5)
+    try:
+        pool.start()
+        outcome = pool.run("result = df[df.x > 1]\nextra = df")
+        assert outcome.ok and list(outcome.tables) == ["result"]
+        assert outcome.tables["result"]["x"].tolist() == [2, 3]
+
+        # A new version replaces the worker, from a request thread's point of view
+        versions["current"] = "v2"
+        results = []
+        thread = threading.Thread(target=lambda: results.append(pool.run("result = version")))
+        thread.start()
+        thread.join(10)
+        assert results[0].result_text == "v2"
+
+        timed_out = pool.run("while True: pass", timeout=0.5)
+        assert timed_out.timed_out
+        assert pool.run("result = 1").result_text == "1"
+    finally:
+        pool.shutdown()
+    assert len(fork_threads) >= 3
+    assert set(fork_threads) == {"execution-forker"}
+
+
+@pytest.mark.parametrize("mode", ["agents", "direct"])
+def test_generation_prompt_asks_for_the_returned_table(mode):
+    from benchmarks.replay_llm import ReplayLLM
+    from crew.crew_orchestrator import create_analysis_crew
+    crew = create_analysis_crew(llm=ReplayLLM(os.path.join(REPO_ROOT, "benchmarks", "recorded_completions.json")),
+                                mode=mode)
+    # Only the frames in RESULT_TABLE_NAMES come back from a worker, so the model must use that name
+    assert all(f"variable named `{name}`" in crew.tasks[0].description for name in RESULT_TABLE_NAMES)
@@ -0,0 +1,73 @@
+import pytest
+from data.aggregate_cube import AggregateCube
+from services.intent_router import LOAN_TABLE, PAYMENT_TABLE, IntentRouter
+
+
+@pytest.fixture(scope="module")
+def router(schema, real_frames):
+    loan_df, payment_df = real_frames
+    return IntentRouter(schema, {LOAN_TABLE: loan_df, PAYMENT_TABLE: payment_df})
+
+
+@pytest.mark.parametrize("query", [
+    "number of payments by branch",
+    "how many transactions by branch",
+    "payment count by scheme",
+    "count of loans by payment mode",
+])
+def test_table_named_in_query_without_the_columns_goes_to_crew(router, query):
+    assert router.plan(query) is None
+    assert router.answer(query) is None
+
+
+def test_loan_count_by_branch_counts_loans(router, real_frames):
+    loan_df, _ = real_frames
+    plan = router.plan("number of loans by branch")
+    assert plan["table"] == LOAN_TABLE
+    assert plan["rows"] == ["BranchName"]
+    title, table = router.answer("number of loans by branch")
+    assert title == "Count by BranchName"
+    assert table["count"].sum() == loan_df["BranchName"].notna().sum()
+
+
+def test_payment_count_by_mode_counts_payments(router, real_frames):
+    _, payment_df = real_frames
+    plan = router.plan("number of payments by payment mode")
+    assert plan["table"] == PAYMENT_TABLE
+    _, table = router.answer("number of payments by payment mode")
+    assert table["count"].sum() == payment_df["PaymentMode"].notna().sum()
+
+
+def test_query_without_table_word_uses_table_with_the_columns(router):
+    assert router.plan("total loan amount by branch")["table"] == LOAN_TABLE
+    assert router.plan("total transaction amount by payment mode")["table"] == PAYMENT_TABLE
+
+
+def test_unknown_words_go_to_crew(router):
+    assert router.plan("which customers are likely to default next quarter") is None
+
+
+def test_cube_matches_rows(schema, real_frames):
+    loan_df, payment_df = real_frames
+    frames = {LOAN_TABLE: loan_df, PAYMENT_TABLE: payment_df}
+    with_cube = IntentRouter(schema, frames, cube=AggregateCube.from_frame(loan_df))
+    without_cube = IntentRouter(schema, frames)
+    query = "average loan amount by branch"
+    assert with_cube.answer(query)[1].equals(without_cube.answer(query)[1])
+
+
+def test_for_a_boolean_column_filters_instead_of_grouping(router, real_frames):
+    # A single overall figure is not a table the router builds
+    assert router.plan("average loan amount for NPA loans") is None
+    plan = router.plan("loan count by branch for NPA loans")
+    assert (plan["aggregation"], plan["rows"], plan["filters"]) == ("count", ["BranchName"], {"NPA": True})
+    loan_df, _ = real_frames
+    _, table = router.answer("loan count by branch for NPA loans")
+    assert table["count"].sum() == (loan_df["NPA"].fillna(False) & loan_df["BranchName"].notna()).sum()
+
+
+def test_for_a_value_filters_and_for_a_column_groups(router):
+    plan = router.plan("average loan amount by scheme for MH")
+    assert (plan["rows"], plan["filters"]) == (["SchemeName"], {"BranchName": "MH"})
+    assert router.plan("total loan amount for each branch")["rows"] == ["BranchName"]
+    assert router.plan("average loan amount for branch")["rows"] == ["BranchName"]
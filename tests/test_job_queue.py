@@ -0,0 +1,76 @@
+import threading
+import time
+import pytest
+from services.job_queue import Job, JobQueue, QueueFullError
+
+
+def test_job_runs_and_reports_result():
+    queue = JobQueue(lambda x: x * 2, max_workers=1)
+    job = queue.submit(21)
+    job.future.result(5)
+    assert job.status == "succeeded" and job.result == 42
+    assert job.finished_at >= job.started_at
+    queue.shutdown()
+
+
+def test_failed_job_keeps_error():
+    def worker():
+        raise RuntimeError("boom")
+
+    queue = JobQueue(worker, max_workers=1)
+    job = queue.submit()
+    job.future.result(5)
+    assert job.status == "failed" and job.error == "boom"
+    assert job.finished_at is not None
+    queue.shutdown()
+
+
+def test_full_queue_raises():
+    release = threading.Event()
+    queue = JobQueue(lambda: release.wait(5), max_workers=1, max_pending=1)
+    jobs = [queue.submit(), queue.submit()]
+    with pytest.raises(QueueFullError):
+        queue.submit()
+    release.set()
+    for job in jobs:
+        job.future.result(5)
+    # Slots are freed once jobs finish
+    queue.submit().future.result(5)
+    queue.shutdown()
+
+
+def test_finished_jobs_expire():
+    queue = JobQueue(lambda: None, max_workers=1, retention_seconds=0)
+    job = queue.submit()
+    job.future.result(5)
+    time.sleep(0.01)
+    queue.submit().future.result(5)
+    assert queue.get(job.id) is None
+    queue.shutdown()
+
+
+def test_prune_tolerates_job_marked_done_before_finished_at():
+    queue = JobQueue(lambda: None, max_workers=1, retention_seconds=0)
+    # A job caught between its status and finished_at being set by another thread
+    job = Job(())
+    job.status = "succeeded"
+    queue._jobs[job.id] = job
+    queue.submit().future.result(5)
+    assert queue.get(job.id) is job
+    queue.shutdown()
+
+
+def test_done_job_always_has_finished_at(monkeypatch):
+    seen = []
+
+    class WatchedJob(Job):
+        def __setattr__(self, name, value):
+            if name == "status" and value in ("succeeded", "failed"):
+                seen.append(self.finished_at)
+            super().__setattr__(name, value)
+
+    monkeypatch.setattr("services.job_queue.Job", WatchedJob)
+    queue = JobQueue(lambda: None, max_workers=1)
+    queue.submit().future.result(5)
+    assert seen and all(finished_at is not None for finished_at in seen)
+    queue.shutdown()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import PAYMENT_SUMMARY_PATH
+from data.out_of_core import ChunkedAggregation, ChunkedTable, DistinctSketch, QuantileSketch
+from data.schema_dtypes import PAYMENT_SUMMARY_TABLE
+
+
+@pytest.fixture()
+def values():
+    rng = np.random.default_rng(0)
+    return np.concatenate([rng.lognormal(3, 1.5, 20000), -rng.lognormal(1, 1, 5000), np.zeros(500)])
+
+
+@pytest.mark.parametrize("q", [0.01, 0.1, 0.5, 0.9, 0.99])
+def test_quantiles_within_relative_accuracy(values, q):
+    sketch = QuantileSketch().update(values)
+    exact = np.quantile(values, q, method="lower")
+    assert sketch.quantile(q) == pytest.approx(exact, rel=sketch.relative_accuracy * 1.01, abs=1e-9)
+
+
+def test_merged_quantile_sketches_match_one_sketch(values):
+    whole = QuantileSketch().update(values)
+    merged = QuantileSketch().update(values[::2]).merge(QuantileSketch().update(values[1::2]))
+    assert merged.count == whole.count
+    for q in (0.05, 0.5, 0.95):
+        assert merged.quantile(q) == whole.quantile(q)
+
+
+def test_distinct_estimate_and_merge():
+    first = DistinctSketch().update(np.arange(0, 60000))
+    second = DistinctSketch().update(np.arange(40000, 100000))
+    assert first.estimate() == pytest.approx(60000, rel=0.03)
+    # Overlapping values are counted once after merging
+    assert first.merge(second).estimate() == pytest.approx(100000, rel=0.03)
+    assert DistinctSketch().update(["a", "b", "b", None]).estimate() == 2
+
+
+def test_merged_chunk_aggregations_match_pandas(real_frames):
+    _, payment_df = real_frames
+    aggregations = {"payments": ("TransactionAmount", "size"), "total": ("TransactionAmount", "sum"),
+                    "average": ("TransactionAmount", "mean"), "spread": ("TransactionAmount", "std"),
+                    "largest": ("TransactionAmount", "max"), "loans": ("LoanId", "nunique")}
+    halves = [ChunkedAggregation(aggregations, by="PaymentMode") for _ in range(2)]
+    for start in range(0, len(payment_df), 1000):
+        halves[(start // 1000) % 2].update(payment_df.iloc[start:start + 1000])
+    result = halves[0].merge(halves[1]).result().sort_index()
+    grouped = payment_df.groupby("PaymentMode", observed=True)
+    assert list(result.index) == sorted(grouped.groups)
+    expected = grouped.agg(payments=("TransactionAmount", "size"), total=("TransactionAmount", "sum"),
+                           average=("TransactionAmount", "mean"), spread=("TransactionAmount", "std"),
+                           largest=("TransactionAmount", "max")).sort_index()
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False, check_names=False,
+                                  check_categorical=False, check_index_type=False)
+    exact_loans = grouped["LoanId"].nunique().sort_index()
+    assert np.allclose(result["loans"], exact_loans, rtol=0.02)
+
+
+def test_chunked_table_matches_in_memory(schema, real_frames, tmp_path, monkeypatch):
+    _, payment_df = real_frames
+    # Columnar caches are written under the working directory
+    monkeypatch.chdir(tmp_path)
+    table = ChunkedTable(PAYMENT_SUMMARY_PATH, PAYMENT_SUMMARY_TABLE, schema, chunk_rows=500, encoding="utf-8-sig")
+    assert len(table) == len(payment_df)
+    result = table.aggregate({"total": ("TransactionAmount", "sum"), "median": ("TransactionAmount", "median")},
+                             by="TransactionType")
+    grouped = payment_df.groupby("TransactionType", observed=True)["TransactionAmount"]
+    for key, total in grouped.sum().items():
+        assert result.loc[key, "total"] == pytest.approx(total)
+        median = grouped.get_group(key).quantile(0.5, interpolation="lower")
+        assert result.loc[key, "median"] == pytest.approx(median, rel=0.011, abs=1e-9)
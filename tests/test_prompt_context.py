@@ -0,0 +1,80 @@
+import threading
+import time
+from data.dataset_profile import profile_frame
+from data.schema_dtypes import CUSTOMER_SUMMARY_TABLE, PAYMENT_SUMMARY_TABLE
+from services.prompt_context import PromptContextBuilder, estimate_tokens
+
+
+class Snapshot:
+    def __init__(self, frames, chunked=False):
+        self.frames = frames
+        self.chunked = chunked
+
+    def profile(self):
+        return {CUSTOMER_SUMMARY_TABLE: profile_frame(self.frames[0]), PAYMENT_SUMMARY_TABLE: profile_frame(self.frames[1])}
+
+    def sample_frames(self):
+        return self.frames
+
+
+def test_context_fits_the_budget_and_names_the_frames(schema, real_frames):
+    context = PromptContextBuilder(schema, token_budget=900).context(Snapshot(real_frames))
+    assert context.tokens == estimate_tokens(context.text) <= 900
+    assert "loan_df (4,954 rows)" in context.text and "payment_df" in context.text
+    assert "BranchName" in context.text and "PaymentMode" in context.text
+
+
+def test_savings_are_reported_in_usage_fields(schema, real_frames):
+    context = PromptContextBuilder(schema).context(Snapshot(real_frames))
+    usage = context.usage_metrics()
+    assert set(usage) == {"total_tokens", "prompt_tokens", "completion_tokens", "successful_requests"}
+    assert usage["prompt_tokens"] == usage["total_tokens"] == context.tokens_saved > 0
+    assert usage["completion_tokens"] == 0
+
+
+class SlowBuilder(PromptContextBuilder):
+    def __init__(self, schema):
+        super().__init__(schema)
+        self.builds = []
+
+    def build(self, profile, frames, chunked=False):
+        self.builds.append(threading.current_thread().name)
+        time.sleep(0.3)
+        return "context"
+
+
+class FakeSnapshot:
+    chunked = False
+
+    def profile(self):
+        return {}
+
+    def sample_frames(self):
+        return []
+
+
+def _in_threads(builder, snapshots):
+    results = []
+    threads = [threading.Thread(target=lambda s=s: results.append(builder.context(s))) for s in snapshots]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def test_same_snapshot_is_built_once(schema):
+    builder, snapshot = SlowBuilder(schema), FakeSnapshot()
+    results, _ = _in_threads(builder, [snapshot] * 4)
+    assert results == ["context"] * 4
+    assert len(builder.builds) == 1
+
+
+def test_different_snapshots_build_in_parallel(schema):
+    builder = SlowBuilder(schema)
+    snapshots = [FakeSnapshot() for _ in range(4)]
+    _, elapsed = _in_threads(builder, snapshots)
+    assert len(builder.builds) == 4
+    # Serialised builds would take at least 4 x 0.3 s
+    assert elapsed < 0.9
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import time
+from services import result_cache
+from services.result_cache import ResultCache, normalize_query, result_cache_path
+from tests.conftest import REPO_ROOT
+
+
+def test_normalize_query():
+    assert normalize_query("Please show me the NPA rate, by branch!") == "npa rate by branch"
+    assert ResultCache.make_key("NPA rate by branch", "v1") == ResultCache.make_key("show the npa rate by branch", "v1")
+    assert ResultCache.make_key("NPA rate by branch", "v1") != ResultCache.make_key("NPA rate by branch", "v2")
+
+
+def test_cache_is_created_on_first_use(tmp_path):
+    path = tmp_path / "cache" / "results.sqlite3"
+    cache = ResultCache(path=str(path))
+    assert not path.exists()
+    assert cache.get("query", "v1") is None
+    assert path.exists()
+
+
+def test_relative_path_is_resolved_against_the_project(monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_PATH", "somewhere/results.sqlite3")
+    assert result_cache_path() == result_cache.PROJECT_DIR / "somewhere" / "results.sqlite3"
+    monkeypatch.setenv("RESULT_CACHE_PATH", "/tmp/elsewhere.sqlite3")
+    assert str(result_cache_path()) == "/tmp/elsewhere.sqlite3"
+
+
+def test_limits_are_read_on_first_use(monkeypatch, tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"))
+    monkeypatch.setenv("RESULT_CACHE_MAX_ENTRIES", "1")
+    monkeypatch.setenv("RESULT_CACHE_TTL_SECONDS", "60")
+    cache.put("first", "v1", "a", {})
+    cache.put("second", "v1", "b", {})
+    stats = cache.stats()
+    assert (stats["entries"], stats["max_entries"], stats["ttl_seconds"]) == (1, 1, 60)
+
+
+def test_get_put_and_version_purge(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"))
+    cache.put("NPA rate by branch", "v1", {"raw": "answer"}, {"total_tokens": 10})
+    assert cache.get("show the npa rate by branch", "v1") == ({"raw": "answer"}, {"total_tokens": 10})
+    # A new dataset version makes the old entries unreachable and purges them
+    assert cache.get("NPA rate by branch", "v2") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_ttl_and_lru_eviction(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"), max_entries=2, ttl_seconds=60)
+    for query in ("a1", "b2", "c3"):
+        cache.put(query, "v1", query, {})
+        time.sleep(0.01)
+    assert cache.get("a1", "v1") is None
+    assert cache.get("c3", "v1") == ("c3", {})
+
+    expired = ResultCache(path=str(tmp_path / "expired.sqlite3"), ttl_seconds=0)
+    expired.put("q", "v1", "answer", {})
+    time.sleep(0.01)
+    assert expired.get("q", "v1") is None
+
+
+def test_importing_main_does_not_create_the_cache(tmp_path):
+    path = tmp_path / "cache" / "results.sqlite3"
+    env = dict(os.environ, RESULT_CACHE_PATH=str(path))
+    subprocess.run([sys.executable, "-c", "import main"], cwd=REPO_ROOT, env=env, check=True, capture_output=True)
+    assert not path.parent.exists()
@@ -0,0 +1,72 @@
+import gzip
+import io
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from starlette.requests import Request
+from services.result_formats import ARROW_STREAM_MEDIA_TYPE, JSON_MEDIA_TYPE, PARQUET_MEDIA_TYPE
+from services.result_store import AnalysisResult, encode_cursor
+
+RESULT_ID = "endpoint-formats"
+
+
+@pytest.fixture()
+def stored(app_module):
+    frame = pd.DataFrame({"branch": [f"B{i}" for i in range(3000)], "amount": [i * 1.5 for i in range(3000)]})
+    result = AnalysisResult(RESULT_ID, "x" * 5000, {"result": frame, "other": frame.head(2)})
+    return app_module.result_store.put(result)
+
+
+def _request(accept=None, accept_encoding=None):
+    headers = [(b"accept", accept.encode())] if accept else []
+    if accept_encoding:
+        headers.append((b"accept-encoding", accept_encoding.encode()))
+    return Request({"type": "http", "method": "POST", "path": "/analyze", "headers": headers})
+
+
+def test_table_as_arrow_stream(client, stored):
+    response = client.get(f"/results/{RESULT_ID}/tables/result", headers={"Accept": ARROW_STREAM_MEDIA_TYPE},
+                          params={"cursor": encode_cursor(1000)})
+    assert response.headers["content-type"] == ARROW_STREAM_MEDIA_TYPE
+    assert response.headers["x-total-rows"] == "3000" and response.headers["x-tables"] == "result,other"
+    table = pa.ipc.open_stream(response.content).read_all()
+    # Binary formats send every row from the cursor, with numbers kept binary
+    assert table.num_rows == 2000 and table.schema.field("amount").type == pa.float64()
+    assert table.schema.metadata[b"result_id"] == RESULT_ID.encode()
+
+
+def test_table_as_parquet_by_name(client, stored):
+    response = client.get(f"/results/{RESULT_ID}/tables/other", params={"format": "parquet"})
+    assert response.headers["content-type"] == PARQUET_MEDIA_TYPE
+    assert 'filename="other.parquet"' in response.headers["content-disposition"]
+    assert pq.read_table(io.BytesIO(response.content)).to_pandas().equals(stored.tables["other"])
+
+
+def test_unknown_format_is_rejected(client, stored):
+    assert client.get(f"/results/{RESULT_ID}/tables/result", params={"format": "csv"}).status_code == 400
+
+
+def test_json_page_is_gzipped_when_accepted(client, stored):
+    response = client.get(f"/results/{RESULT_ID}/tables/result", params={"limit": 500},
+                          headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+    assert len(response.json()["rows"]) == 500
+
+
+def test_analyze_body_negotiation(app_module, stored):
+    body = {"result_id": RESULT_ID, "result": "text"}
+    arrow = app_module.negotiated_response(body, _request(ARROW_STREAM_MEDIA_TYPE))
+    assert arrow.media_type == ARROW_STREAM_MEDIA_TYPE and arrow.headers["x-table-name"] == "result"
+    other = app_module.negotiated_response(body, _request(PARQUET_MEDIA_TYPE), table="other")
+    assert other.headers["x-table-name"] == "other"
+    assert app_module.negotiated_response(body, _request(PARQUET_MEDIA_TYPE), table="missing").status_code == 404
+    # JSON clients, and answers that were never stored, get the JSON body
+    plain = app_module.negotiated_response(body, _request("application/json", "gzip"))
+    assert plain.media_type == JSON_MEDIA_TYPE and json.loads(plain.body) == body
+    unstored = app_module.negotiated_response({"result_id": "unknown"}, _request(ARROW_STREAM_MEDIA_TYPE))
+    assert unstored.media_type == JSON_MEDIA_TYPE
+    large = app_module.negotiated_response({**body, "result": "y" * 5000}, _request(None, "gzip"))
+    assert json.loads(gzip.decompress(large.body))["result"] == "y" * 5000
@@ -0,0 +1,78 @@
+import gzip
+import io
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from crewai.crews.crew_output import CrewOutput
+from fastapi.encoders import jsonable_encoder
+from services.result_formats import arrow_stream, json_bytes, negotiate, parquet_bytes, to_arrow
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "json"),
+    ("*/*", "json"),
+    ("application/json", "json"),
+    ("application/vnd.apache.arrow.stream", "arrow"),
+    ("application/x-parquet", "parquet"),
+    ("application/json;q=0.5, application/vnd.apache.arrow.stream", "arrow"),
+    ("application/vnd.apache.parquet;q=0.2, application/json;q=0.9", "json"),
+    ("application/vnd.apache.arrow.stream;q=0, application/x-parquet", "parquet"),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_negotiate_requested_format_wins_and_is_checked():
+    assert negotiate("application/json", "parquet") == "parquet"
+    with pytest.raises(ValueError):
+        negotiate(None, "csv")
+
+
+def test_json_bytes_keeps_model_shape():
+    body = {"result": CrewOutput(raw="answer"), "served_by": "crew"}
+    data, encoding = json_bytes(body)
+    assert encoding is None
+    # Same object shape as FastAPI's own JSON response, not a flattened string
+    assert json.loads(data) == jsonable_encoder(body)
+    assert json.loads(data)["result"]["raw"] == "answer"
+
+
+def test_json_bytes_gzips_large_bodies_for_clients_that_accept_it():
+    body = {"result": "x" * 5000}
+    data, encoding = json_bytes(body, "gzip, deflate")
+    assert encoding == "gzip"
+    assert json.loads(gzip.decompress(data)) == body
+    assert json_bytes({"result": "small"}, "gzip")[1] is None
+    assert json_bytes(body, "br")[1] is None
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "BranchName": pd.Categorical(["MH", "PN", "MH"]),
+        "count": [3, 1, 2],
+        "sum_LoanAmount": [5000.5, 31500.0, None],
+        "mixed": ["a", 1, None],
+    })
+
+
+def test_arrow_stream_round_trip_keeps_numeric_types(frame):
+    table = to_arrow(frame, {"result_id": "abc"})
+    data = b"".join(arrow_stream(table, batch_rows=2))
+    read = pa.ipc.open_stream(io.BytesIO(data)).read_all()
+    assert read.schema.field("count").type == pa.int64()
+    assert read.schema.field("sum_LoanAmount").type == pa.float64()
+    assert read.schema.metadata[b"result_id"] == b"abc"
+    result = read.to_pandas()
+    assert result["count"].tolist() == [3, 1, 2]
+    # Values Arrow cannot type together are sent as text, missing ones stay missing
+    assert result["mixed"].iloc[:2].tolist() == ["a", "1"]
+    assert pd.isna(result["mixed"].iloc[2])
+
+
+def test_parquet_round_trip(frame):
+    read = pq.read_table(io.BytesIO(parquet_bytes(to_arrow(frame)))).to_pandas()
+    assert read["sum_LoanAmount"].iloc[0] == 5000.5
+    assert read["BranchName"].astype(str).tolist() == ["MH", "PN", "MH"]
@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+from services.result_store import (
+    MAX_RESULT_PAGE_ROWS, AnalysisResult, ResultStore, decode_cursor, encode_cursor, result_id_for
+)
+
+TEXT = '<div class="summary">Totals by branch</div><div class="insights">Chennai leads</div>'
+
+
+@pytest.fixture()
+def result():
+    by_branch = pd.DataFrame({"branch": [f"B{i}" for i in range(25)], "total": range(25)}).set_index("branch")
+    return AnalysisResult("abc", TEXT, {"result": by_branch, "amounts": pd.Series([1.5, 2.5], name="amount")})
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(None) == 0
+    assert decode_cursor(encode_cursor(1234)) == 1234
+    for cursor in ("not-a-cursor", encode_cursor(-1), encode_cursor("5")):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+def test_pages_walk_the_whole_table(result):
+    rows, cursor, offsets = [], None, []
+    while True:
+        page = result.page("result", cursor, limit=10)
+        offsets.append(page["offset"])
+        rows.extend(page["rows"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert offsets == [0, 10, 20]
+    assert page["columns"] == ["branch", "total"] and page["total_rows"] == 25
+    assert rows == [[f"B{i}", i] for i in range(25)]
+
+
+def test_page_limits_and_errors(result):
+    assert len(result.page("result", limit=0)["rows"]) == 1
+    assert result.page("result", limit=MAX_RESULT_PAGE_ROWS * 10)["next_cursor"] is None
+    assert result.page("result", encode_cursor(100))["rows"] == []
+    with pytest.raises(KeyError):
+        result.page("missing")
+    with pytest.raises(ValueError):
+        result.page("result", "bad")
+
+
+def test_rows_from_a_cursor(result):
+    assert list(result.rows("result", encode_cursor(20))["total"]) == [20, 21, 22, 23, 24]
+    assert len(result.rows("result", encode_cursor(5), limit=3)) == 3
+
+
+def test_overview_splits_the_answer(result):
+    overview = result.overview(page_rows=5)
+    assert overview["summary"] == "Totals by branch" and overview["insights"] == "Chennai leads"
+    tables = {table["name"]: table for table in overview["tables"]}
+    assert tables["result"]["rows"] == 25 and len(tables["result"]["first_page"]["rows"]) == 5
+    assert tables["amounts"]["columns"] == ["amount"]
+    assert result.primary_table() == "result"
+
+
+def test_result_id_ignores_query_spacing_and_case():
+    assert result_id_for("Total  loans", "v1") == result_id_for("total loans", "v1") != result_id_for("total loans", "v2")
+
+
+def test_store_drops_least_recently_used():
+    store = ResultStore(max_entries=2)
+    for result_id in ("a", "b"):
+        store.put(AnalysisResult(result_id, ""))
+    store.get("a")
+    store.put(AnalysisResult("c", ""))
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+
+
+def test_table_endpoint_pages_with_cursors(app_module, client, result):
+    app_module.result_store.put(result)
+    first = client.get("/results/abc/tables/result", params={"limit": 20}).json()
+    assert len(first["rows"]) == 20
+    second = client.get("/results/abc/tables/result", params={"cursor": first["next_cursor"], "limit": 20}).json()
+    assert second["offset"] == 20 and len(second["rows"]) == 5 and second["next_cursor"] is None
+    assert client.get("/results/abc/tables/result", params={"cursor": "bad"}).status_code == 400
+    assert client.get("/results/abc/tables/missing").status_code == 404
+    assert client.get("/results/unknown/tables/result").status_code == 404
@@ -0,0 +1,42 @@
+import warnings
+import pandas as pd
+from data.schema_dtypes import (
+    CUSTOMER_SUMMARY_TABLE, EXTRA_CATEGORICAL_COLUMNS, TEXT_DTYPE, compile_read_options, memory_report,
+    read_typed_csv
+)
+from tests.conftest import CUSTOMER_SUMMARY_PATH
+
+
+def test_dates_without_a_schema_format_stay_strings(schema):
+    header = pd.read_csv(CUSTOMER_SUMMARY_PATH, nrows=0).columns.tolist()
+    options = compile_read_options(schema[CUSTOMER_SUMMARY_TABLE], header, EXTRA_CATEGORICAL_COLUMNS)
+    assert options["parse_dates"] == []
+    assert "date_format" not in options
+    assert options["dtype"]["LoanDisbursementDate"] == TEXT_DTYPE
+    # Not in the schema, caught by the column name
+    assert options["dtype"]["LoanMaturityDate"] == TEXT_DTYPE
+
+
+def test_dates_with_a_schema_format_are_parsed_with_it():
+    table_schema = {"columns": {"PaidOn": {"type": "datetime", "format": "%d/%m/%Y"}}}
+    options = compile_read_options(table_schema, ["PaidOn"])
+    assert options["parse_dates"] == ["PaidOn"]
+    assert options["date_format"] == {"PaidOn": "%d/%m/%Y"}
+
+
+def test_loan_csv_reads_typed_without_warnings(schema, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        typed = read_typed_csv(CUSTOMER_SUMMARY_PATH, CUSTOMER_SUMMARY_TABLE, schema)
+    for column in ("CustomerName", "JewellerName", "BranchName", "SchemeName", "LoanId"):
+        assert isinstance(typed[column].dtype, pd.CategoricalDtype), column
+    for column in ("ReferenceNo", "LoanDisbursementDate"):
+        assert typed[column].dtype == TEXT_DTYPE, column
+    assert typed["NPA"].dtype == "boolean"
+    # Numeric enumerations compare as numbers, not strings
+    assert (typed["CustomerType"] == 1).any()
+
+    untyped = pd.read_csv(CUSTOMER_SUMMARY_PATH)
+    untyped = untyped.astype({column: object for column in untyped.select_dtypes(["object", "string"]).columns})
+    assert memory_report(untyped, typed).loc["TOTAL", "ratio"] > 3
@@ -0,0 +1,33 @@
+import pandas as pd
+from conftest import CUSTOMER_SUMMARY_PATH, REPO_ROOT
+from data.schema_dtypes import CUSTOMER_SUMMARY_TABLE
+from data.synthetic_data import generate_datasets, load_schemes
+
+
+def test_schemes_cover_every_real_scheme(schema):
+    schemes = load_schemes(schema, CUSTOMER_SUMMARY_PATH)
+    real = pd.read_csv(CUSTOMER_SUMMARY_PATH, usecols=["SchemeId", "SchemeName"]).dropna().drop_duplicates()
+    assert dict(zip(real["SchemeName"], real["SchemeId"].astype(int))) == schemes
+    assert schemes["gudipadwa"] == 83
+    # Most used first, so the skewed draw favours the real leaders
+    assert list(schemes)[0] == "ER3"
+
+
+def test_schema_enumerated_schemes_are_added(schema):
+    table = schema[CUSTOMER_SUMMARY_TABLE]
+    columns = dict(table["columns"])
+    columns["SchemeName"] = {**columns.get("SchemeName", {}), "possible values": ["ER3", "NewScheme"]}
+    extended = {**schema, CUSTOMER_SUMMARY_TABLE: {**table, "columns": columns}}
+    schemes = load_schemes(extended, CUSTOMER_SUMMARY_PATH)
+    assert schemes["ER3"] == 60
+    assert schemes["NewScheme"] == max(schemes.values())
+
+
+def test_small_dataset_has_every_scheme(schema, monkeypatch):
+    # The catalogue is read from the export relative to the project, as the benchmarks run it
+    monkeypatch.chdir(REPO_ROOT)
+    schemes = load_schemes(schema, CUSTOMER_SUMMARY_PATH)
+    loans, payments = generate_datasets(100, seed=1, schema=schema)
+    assert set(loans["SchemeName"]) == set(schemes)
+    assert all(schemes[name] == scheme_id for name, scheme_id in zip(loans["SchemeName"], loans["SchemeId"]))
+    assert set(payments["LoanId"]) <= set(loans["LoanId"])
@@ -0,0 +1,60 @@
+from typing import Any, Callable, Dict, Optional
+from pydantic import Field
+from crewai_tools import CodeInterpreterTool
+from services.currency_format import format_frame
+from services.generated_code import run_with_repair
+from services.metrics import span
+
+
+class DatasetCodeInterpreterTool(CodeInterpreterTool):
+    """Code interpreter that runs code with the preloaded DataFrames in scope"""
+
+    # The base tool only calls run_code_unsafe() in unsafe mode; otherwise
+    # it runs the code in Docker, where the frames do not exist
+    unsafe_mode: bool = True
+    namespace: Dict[str, Any] = Field(default_factory=dict)
+    # Called with the code after every run that completes without raising
+    on_success: Optional[Callable[[str], None]] = None
+    # Runs the code out of process (e.g. ExecutionPool.run) and returns an ExecutionResult
+    executor: Optional[Callable[[str], Any]] = None
+
+    def run_code_unsafe(self, code, libraries_used):
+        with span("tool_call:code_interpreter"):
+            return self._run_code(code)
+
+    def _run_code(self, code):
+        if self.executor is not None:
+            return self._run_with_executor(code)
+        # Only the allowed analysis libraries are used, and they are already
+        # installed, so skip the per-call pip install of the base tool
+        # A single dict keeps functions defined by the code able to see the frames
+        exec_globals = dict(self.namespace)
+        try:
+            exec(code, exec_globals)
+            if self.on_success is not None:
+                self.on_success(code)
+            return exec_globals.get("result", "No result variable found.")
+        except Exception as e:
+            return f"An error occurred: {str(e)}"
+
+    def _run_with_executor(self, code):
+        # Common slips (escaped newlines, near-miss column names, dtypes) are
+        # fixed here instead of costing the agent another turn
+        outcome, code, _ = run_with_repair(code, self.executor, self.namespace)
+        if not outcome.ok:
+            return f"An error occurred: {outcome.error}"
+        if self.on_success is not None:
+            self.on_success(code)
+        return describe_outcome(outcome)
+
+
+def describe_outcome(outcome):
+    """What the agent sees of a successful ExecutionResult"""
+    # Unlike the in-process path the printed output is captured, so the
+    # agent also sees what the code printed
+    if outcome.result_text is not None:
+        return outcome.result_text
+    if "result" in outcome.tables:
+        # Amount columns rendered as rupees in one vectorised pass per column
+        return format_frame(outcome.tables["result"]).to_string()
+    return outcome.output or "No result variable found."